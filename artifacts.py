@@ -0,0 +1,215 @@
+"""
+故障现场采集模块
+出错时快速抓取截图和 DOM 快照，由后台队列压缩写盘，并控制目录总大小
+"""
+
+import asyncio
+import gzip
+import io
+import logging
+from collections import deque
+from datetime import datetime
+from pathlib import Path
+from typing import Optional
+
+from playwright.async_api import Page
+
+logger = logging.getLogger(__name__)
+
+# WebP 需要 Pillow 转码（Playwright 只能输出 PNG/JPEG）
+try:
+    from PIL import Image
+    PIL_AVAILABLE = True
+except ImportError:
+    PIL_AVAILABLE = False
+
+# 被视为采集产物、参与磁盘配额管理的文件后缀
+ARTIFACT_SUFFIXES = (".png", ".jpg", ".jpeg", ".webp", ".html", ".gz")
+
+
+class ArtifactCollector:
+    """故障现场采集器 - 页面侧只做一次快速抓取，压缩和写盘都在后台完成"""
+
+    def __init__(self, config):
+        """
+        初始化采集器
+
+        Args:
+            config: 配置对象，包含截图目录、格式、质量和磁盘配额
+        """
+        self.config = config
+        self.directory = Path(config.SCREENSHOT_DIR)
+        self.image_format = config.SCREENSHOT_FORMAT.lower()
+        self.quality = config.SCREENSHOT_QUALITY
+        self.max_bytes = int(config.SCREENSHOT_DIR_MAX_MB * 1024 * 1024)
+
+        if self.image_format == "webp" and not PIL_AVAILABLE:
+            logger.warning("未安装 Pillow，无法输出 WebP 截图，改用 JPEG")
+            self.image_format = "jpeg"
+
+        self.queue: Optional[asyncio.Queue] = None
+        self.worker: Optional[asyncio.Task] = None
+
+        # 已有产物 (路径, 大小)，按修改时间从旧到新排列
+        self.files = deque()
+        self.total_bytes = 0
+        self.saved_count = 0
+        self._scanned = False
+
+    def start(self):
+        """启动后台写盘任务（需要在事件循环中调用）"""
+        if self.worker and not self.worker.done():
+            return
+        self.queue = asyncio.Queue(maxsize=self.config.ARTIFACT_QUEUE_SIZE)
+        self.worker = asyncio.create_task(self._worker_loop())
+
+    async def capture(self, page: Page, name: str):
+        """
+        抓取页面截图和 DOM 快照并放入写盘队列
+
+        页面侧抓取受 ARTIFACT_CAPTURE_TIMEOUT 限制，不会拖慢出错后的恢复流程
+
+        Args:
+            page: Playwright Page 对象
+            name: 文件名前缀
+        """
+        if page is None:
+            return
+
+        self.start()
+
+        try:
+            screenshot, dom = await asyncio.wait_for(
+                asyncio.gather(
+                    page.screenshot(type="jpeg", quality=self.quality, full_page=False),
+                    self._grab_dom(page),
+                ),
+                timeout=self.config.ARTIFACT_CAPTURE_TIMEOUT
+            )
+        except Exception as e:
+            logger.error(f"抓取故障现场失败: {e}")
+            return
+
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S_%f")
+        try:
+            self.queue.put_nowait((f"{name}_{timestamp}", screenshot, dom))
+        except asyncio.QueueFull:
+            logger.warning(f"采集队列已满，丢弃截图: {name}")
+
+    async def _grab_dom(self, page: Page) -> Optional[str]:
+        """抓取 DOM 快照（未开启时返回 None）"""
+        if not self.config.SAVE_DOM_SNAPSHOT:
+            return None
+        return await page.content()
+
+    async def close(self):
+        """等待队列写完（最多 ARTIFACT_CAPTURE_TIMEOUT 秒）并停止后台任务"""
+        if not self.worker:
+            return
+
+        try:
+            await asyncio.wait_for(self.queue.join(), timeout=self.config.ARTIFACT_CAPTURE_TIMEOUT)
+        except asyncio.TimeoutError:
+            logger.warning(f"仍有 {self.queue.qsize()} 个截图未写入，放弃")
+
+        self.worker.cancel()
+        try:
+            await self.worker
+        except asyncio.CancelledError:
+            pass
+        self.worker = None
+
+    async def _worker_loop(self):
+        """后台写盘循环"""
+        loop = asyncio.get_event_loop()
+
+        while True:
+            stem, screenshot, dom = await self.queue.get()
+            try:
+                await loop.run_in_executor(None, self._write_artifact, stem, screenshot, dom)
+            except Exception as e:
+                logger.error(f"保存截图失败: {e}")
+            finally:
+                self.queue.task_done()
+
+    def _write_artifact(self, stem: str, screenshot: bytes, dom: Optional[str]):
+        """
+        在线程池中压缩并写入一组产物，然后执行磁盘配额淘汰
+
+        Args:
+            stem: 文件名（不含后缀）
+            screenshot: JPEG 截图数据
+            dom: DOM 快照，可为 None
+        """
+        self.directory.mkdir(parents=True, exist_ok=True)
+        if not self._scanned:
+            self._scan_existing()
+
+        if self.image_format == "webp":
+            image = Image.open(io.BytesIO(screenshot))
+            buffer = io.BytesIO()
+            image.save(buffer, format="WEBP", quality=self.quality)
+            screenshot = buffer.getvalue()
+            image_path = self.directory / f"{stem}.webp"
+        else:
+            image_path = self.directory / f"{stem}.jpg"
+
+        image_path.write_bytes(screenshot)
+        self._track(image_path)
+
+        if dom is not None:
+            dom_path = self.directory / f"{stem}.html.gz"
+            dom_path.write_bytes(gzip.compress(dom.encode("utf-8")))
+            self._track(dom_path)
+
+        self.saved_count += 1
+        logger.info(f"📸 截图已保存: {image_path}")
+
+        self._evict()
+
+    def _scan_existing(self):
+        """统计目录中已有的产物（按修改时间从旧到新）"""
+        existing = [
+            path for path in self.directory.iterdir()
+            if path.is_file() and path.suffix.lower() in ARTIFACT_SUFFIXES
+        ]
+        existing.sort(key=lambda path: path.stat().st_mtime)
+        for path in existing:
+            self._track(path)
+        self._scanned = True
+
+    def _track(self, path: Path):
+        """登记新产物"""
+        size = path.stat().st_size
+        self.files.append((path, size))
+        self.total_bytes += size
+
+    def _evict(self):
+        """超出磁盘配额时从最旧的产物开始删除"""
+        evicted = 0
+        while self.total_bytes > self.max_bytes and len(self.files) > 1:
+            path, size = self.files.popleft()
+            try:
+                path.unlink()
+            except FileNotFoundError:
+                pass
+            except OSError as e:
+                logger.debug(f"删除旧截图 {path} 失败: {e}")
+            self.total_bytes -= size
+            evicted += 1
+
+        if evicted:
+            logger.debug(f"截图目录超出配额，已删除 {evicted} 个最旧的文件")
+
+    def get_statistics(self) -> dict:
+        """
+        获取采集统计信息
+
+        Returns:
+            dict: 统计信息
+        """
+        return {
+            "artifacts_saved": self.saved_count,
+            "artifact_bytes": self.total_bytes,
+            "artifacts_pending": self.queue.qsize() if self.queue else 0,
+        }
@@ -100,6 +100,24 @@ class Config:
 
     ]
 
+    # 播放列表文件 - 每行一个 href，运行时逐行流式读取，设置后替代 VIDEO_HREF_LIST
+    # 适合上千个视频的大列表，可用 --playlist 参数覆盖
+    PLAYLIST_FILE = ""
+
+    # 课程目录页 - 用于 `python main.py discover` 自动生成播放列表（按课程顺序排列）
+    # 例如: ["/ybdy/list?c_id=1", "/ybdy/list?c_id=2"]
+    COURSE_CATALOG_HREFS = []
+
+    # 目录页中播放链接的选择器
+    CATALOG_PLAY_LINK_SELECTOR = "a[href*='/ybdy/play']"
+
+    # 同时抓取的目录页数
+    DISCOVERY_CONCURRENCY = 2
+
+    # 自动发现的播放列表文件（旁边的 .meta.json 记录各目录页的修改标记和链接列表哈希；
+    # 播放链接由脚本渲染的目录页无法用修改标记判断变化，每次都会重新渲染）
+    DISCOVERED_PLAYLIST_FILE = "./.cache/playlist.txt"
+
     # ===== 选择器配置 (需要根据实际网站修改) =====
     # 视频播放器选择器
     VIDEO_PLAYER_SELECTOR = "video"
@@ -134,6 +152,20 @@ class Config:
         "[class*='close']"
     ]
 
+    # 弹窗规则表（所有弹窗都由 PopupHandler 按此表处理）
+    # selectors: 选择器配置项名或选择器列表; action: click 点击 / escape 按 ESC / report 只报告
+    # phases: 生效阶段 entry 进入视频页 / playback 播放中 / complete 检测播放完成 / after_complete 播放完成后
+    # cooldown: 同一规则两次动作的最小间隔(秒)，点击过的元素在此期间不会再次点击; priority: 大的先匹配
+    # snapshot: HAR 录制时动作前保存的 DOM 快照类型
+    POPUP_RULES = [
+        {"name": "complete", "selectors": "COMPLETE_POPUP_SELECTOR", "action": "report",
+         "phases": ["complete"], "cooldown": 0, "priority": 100, "snapshot": "complete"},
+        {"name": "continue", "selectors": "CONTINUE_BUTTON_SELECTORS", "action": "click",
+         "phases": ["playback"], "cooldown": 3, "priority": 50, "snapshot": "dialog"},
+        {"name": "dismiss", "selectors": "POPUP_CLOSE_SELECTORS", "action": "click",
+         "phases": ["entry", "after_complete"], "cooldown": 3, "priority": 10},
+    ]
+
     # ===== 浏览器配置 =====
     # 是否使用无头模式 (False=显示浏览器窗口，推荐False以便手动登录)
     HEADLESS = False
@@ -142,32 +174,177 @@ class Config:
     VIEWPORT_WIDTH = 1280
     VIEWPORT_HEIGHT = 720
 
+    # 虚拟显示器 (仅 Linux): 非无头模式下用 Xvfb 代替真实显示器，只对启动的浏览器生效
+    # "auto" 没有 DISPLAY 时启动 / "on" 总是启动 / "off" 不启动
+    VIRTUAL_DISPLAY = "auto"
+    # 虚拟屏幕色深，16 位比 24 位省内存
+    VIRTUAL_DISPLAY_DEPTH = 16
+
     # User-Agent
     USER_AGENT = "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36"
 
     # ===== 行为配置 =====
-    # 弹窗检测间隔 (秒)
+    # 弹窗检测间隔 (秒): 播放中的弹窗由页面推送唤醒检测，兜底轮询在没有弹窗时
+    # 从 POPUP_CHECK_INTERVAL 逐次加倍到 POPUP_CHECK_INTERVAL_MAX
     POPUP_CHECK_INTERVAL = 3
+    POPUP_CHECK_INTERVAL_MAX = 60
 
     # 视频完成后等待时间 (秒)
     VIDEO_COMPLETE_WAIT = 5
 
-    # 单个视频最大播放时间 (秒, 防止卡死)
+    # 单个视频最大播放时间 (秒, 防止卡死)，仅在视频时长未知时使用
     MAX_VIDEO_DURATION = 7200  # 1小时
 
+    # 已知视频时长时的超时 (秒):
+    #   时长 * VIDEO_TIMEOUT_FACTOR + VIDEO_TIMEOUT_SLACK + 已处理弹窗数 * VIDEO_TIMEOUT_POPUP_ALLOWANCE
+    # 时长优先取页面上 video.duration，其次取时长缓存
+    VIDEO_TIMEOUT_FACTOR = 1.2
+    VIDEO_TIMEOUT_SLACK = 180
+    VIDEO_TIMEOUT_POPUP_ALLOWANCE = 60
+
+    # ===== 时长预扫描配置 =====
+    # 是否在开始播放前预扫描所有视频的时长（只加载元数据），用于估算总耗时和单个视频超时
+    PRESCAN_ENABLED = False
+
+    # 预扫描同时打开的页面数，以及单个页面的超时 (秒)
+    PRESCAN_CONCURRENCY = 3
+    PRESCAN_PAGE_TIMEOUT = 30
+
+    # 视频时长缓存文件（播放过程中读到的时长也会写入）
+    DURATION_CACHE_FILE = "./.cache/durations.json"
+
+    # 估算剩余时间时每个视频的额外开销 (秒)：启动浏览器、登录、打开页面等
+    VIDEO_OVERHEAD_ESTIMATE = 60
+
     # 点击播放后等待视频启动的时间 (秒)
     PLAY_START_WAIT = 2
 
+    # 播放完成检测间隔 (秒)：间隔 = 剩余播放时间 * VIDEO_CHECK_REMAINING_FRACTION，
+    # 限制在 [VIDEO_CHECK_INTERVAL_MIN, VIDEO_CHECK_INTERVAL_MAX]；暂停或时长未知时使用默认值
+    # 视频结束、暂停、跳转等媒体事件会立即触发检测
+    VIDEO_CHECK_INTERVAL_DEFAULT = 5
+    VIDEO_CHECK_INTERVAL_MIN = 2
+    VIDEO_CHECK_INTERVAL_MAX = 120
+    VIDEO_CHECK_REMAINING_FRACTION = 0.5
+
+    # ===== 无人值守配置 =====
+    # 是否允许交互式输入 (False=所有 input() 提示都使用默认策略，适合过夜运行)
+    INTERACTIVE = True
+
+    # 视频失败后的处理策略: "ask"=询问, "continue"=继续下一个, "stop"=停止, "retry"=重试
+    FAILURE_POLICY = "ask"
+
+    # FAILURE_POLICY="retry" 时每个视频的最大重试次数
+    FAILURE_MAX_RETRIES = 2
+
+    # 重试退避: 第 N 次重试前等待 RETRY_BASE_DELAY * RETRY_BACKOFF_FACTOR^(N-1) 秒，
+    # 最多 RETRY_MAX_DELAY 秒；等待期间会先播放队列中的其他视频
+    RETRY_BASE_DELAY = 30
+    RETRY_BACKOFF_FACTOR = 2.0
+    RETRY_MAX_DELAY = 600
+
+    # 单个视频会话内按错误类型恢复（重新加载/重新登录/等待网络等）的最大次数
+    ERROR_RECOVERY_MAX_ATTEMPTS = 2
+
+    # 网络不可用时的检测间隔和最长等待时间 (秒)
+    NETWORK_RETRY_WAIT = 15
+    NETWORK_RECOVERY_TIMEOUT = 300
+
+    # 免责声明确认记录文件 (存在时跳过免责声明确认)
+    DISCLAIMER_ACK_FILE = "./.disclaimer_accepted"
+
     # ===== 调试配置 =====
     # 是否启用详细日志
     VERBOSE_LOGGING = True
 
+    # 日志文件（文本）和结构化日志文件（JSON Lines，设为空字符串则不输出）
+    LOG_FILE = "video_automation.log"
+    LOG_JSON_FILE = "video_automation.jsonl"
+
+    # 日志文件轮转：单个文件最大字节数和保留的历史文件数
+    LOG_MAX_BYTES = 10 * 1024 * 1024
+    LOG_BACKUP_COUNT = 5
+
+    # 播放进度日志的输出间隔 (秒)
+    LOG_PROGRESS_INTERVAL = 30
+
     # 是否保存截图 (出错时)
     SAVE_SCREENSHOTS = True
 
     # 截图保存目录
     SCREENSHOT_DIR = "./screenshots"
 
+    # 截图格式 ("jpeg" 或 "webp"，webp 需要安装 Pillow) 和压缩质量 (1-100)
+    SCREENSHOT_FORMAT = "jpeg"
+    SCREENSHOT_QUALITY = 60
+
+    # 是否在截图旁保存 DOM 快照 (gzip 压缩的 HTML)
+    SAVE_DOM_SNAPSHOT = True
+
+    # 截图目录磁盘配额 (MB)，超出后从最旧的文件开始删除
+    SCREENSHOT_DIR_MAX_MB = 200
+
+    # 出错时抓取页面现场的最长时间 (秒)，以及后台写盘队列长度
+    ARTIFACT_CAPTURE_TIMEOUT = 5
+    ARTIFACT_QUEUE_SIZE = 20
+
+    # 是否持续录制 Playwright trace（只保留最近几分钟，视频失败或卡住时才保存）
+    TRACE_ENABLED = False
+
+    # trace 保存目录
+    TRACE_DIR = "./traces"
+
+    # 每个 trace 分块的时长 (秒) 和环形缓冲区保留的时长 (分钟)
+    TRACE_CHUNK_SECONDS = 60
+    TRACE_BUFFER_MINUTES = 5
+
+    # 每个分块附带一张低频截图的 JPEG 质量
+    TRACE_SCREENSHOT_QUALITY = 30
+
+    # 播放位置超过该时间 (秒) 未变化视为卡住
+    VIDEO_STALL_TIMEOUT = 120
+
+    # 是否开启本地指标端点 (Prometheus 格式，http://METRICS_HOST:METRICS_PORT/metrics)
+    METRICS_ENABLED = False
+    METRICS_HOST = "127.0.0.1"
+    METRICS_PORT = 9464
+
+    # 本地控制 socket，运行中可用 `python main.py ctl ...` 追加视频、暂停/继续、跳过、查看状态
+    # 仅支持 Linux / macOS，留空则不开启
+    CONTROL_SOCKET = "./.cache/control.sock"
+
+    # 收到 Ctrl+C / SIGTERM 后关闭页面、上下文和浏览器的最长时间 (秒)，超时则强制结束浏览器进程
+    SHUTDOWN_TIMEOUT = 20
+    # 退出时保存运行进度；尚未完成的视频写入剩余播放列表，可用 --playlist 接着播放
+    PROGRESS_FILE = "./.cache/progress.json"
+    REMAINING_PLAYLIST_FILE = "./.cache/remaining.txt"
+
+    # 通过 CDP 统计每个视频的流量（字节数、请求数，按资源类型和域名汇总），写入运行报告和进度文件
+    NETWORK_ACCOUNTING = True
+
+    # 运行历史数据库（SQLite），记录每次运行每个视频的耗时、开销、失败类型和资源占用，
+    # 用 python main.py report 对比；留空则不记录
+    RUN_HISTORY_DB = "./.cache/history.db"
+
+    # HAR 录制/回放: "record" 录制每个视频会话到 HAR_BUNDLE_DIR，"replay" 离线回放录制内容，留空则关闭
+    # 录制结束后会去掉 Cookie / Authorization / Set-Cookie 和登录请求的请求体（含密码、验证码）
+    HAR_MODE = ""
+    HAR_BUNDLE_DIR = "./har"
+    # 每个视频的 HAR 保留的媒体分段上限 (MB)，超出部分在会话结束后从 HAR 中删除；
+    # 录制过程中整个会话的媒体仍会先完整写入磁盘，录制时需要预留相应的空间
+    HAR_MEDIA_MAX_MB = 50
+    # 回放时录制中没有的请求: "abort" 直接失败（完全离线），"fallback" 走真实网络
+    HAR_REPLAY_NOT_FOUND = "abort"
+
+    # 选择器漂移检测: 会话开始时在登录页和视频页上检查选择器，匹配到的元素与基线不符时立即停止并给出差异
+    SELECTOR_DRIFT_CHECK = True
+    # 等待页面加载并渲染出选择器所指元素的最长时间 (秒)，到期仍未出现按页面慢处理，不判定为漂移
+    SELECTOR_DRIFT_TIMEOUT = 10
+    # 页面快照语料库（文件名含 login / play_page / dialog / complete，可直接使用 HAR 录制包的 dom/ 目录）
+    SELECTOR_CORPUS_DIR = "./selector_corpus"
+    # 每个选择器上次匹配到的元素指纹，用于给出差异
+    SELECTOR_BASELINE_FILE = "./selector_corpus/baseline.json"
+
     # ===== 自动登录配置 =====
     # 是否启用自动登录
     AUTO_LOGIN_ENABLED = True
@@ -0,0 +1,218 @@
+"""
+配置加载模块
+在 config.py 的默认值之上依次叠加 TOML 配置文件、.env 文件和环境变量，
+按默认值的类型校验并转换每一项
+"""
+
+import json
+import logging
+import os
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+from dotenv import dotenv_values
+
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+try:
+    import tomllib
+except ImportError:  # Python < 3.11
+    try:
+        import tomli as tomllib
+    except ImportError:
+        tomllib = None
+
+# 环境变量 / .env 中配置项的前缀，例如 VA_LOGIN_PASSWORD
+ENV_PREFIX = "VA_"
+
+# 默认配置文件（存在时自动加载）
+DEFAULT_CONFIG_FILE = "config.toml"
+DEFAULT_ENV_FILE = ".env"
+
+# 取值范围受限的配置项
+CHOICES = {
+    "FAILURE_POLICY": ("ask", "continue", "stop", "retry"),
+    "SCREENSHOT_FORMAT": ("jpeg", "webp"),
+    "HAR_MODE": ("", "record", "replay"),
+    "HAR_REPLAY_NOT_FOUND": ("abort", "fallback"),
+    "VIRTUAL_DISPLAY": ("auto", "on", "off"),
+}
+
+# 必须大于 0 的配置项（其余数值项只要求不小于 0）
+POSITIVE = {
+    "MAX_VIDEO_DURATION",
+    "SELECTOR_DRIFT_TIMEOUT",
+    "POPUP_CHECK_INTERVAL",
+    "POPUP_CHECK_INTERVAL_MAX",
+    "VIDEO_CHECK_INTERVAL_DEFAULT",
+    "VIDEO_CHECK_INTERVAL_MIN",
+    "VIDEO_CHECK_INTERVAL_MAX",
+    "TRACE_CHUNK_SECONDS",
+    "PRESCAN_CONCURRENCY",
+    "DISCOVERY_CONCURRENCY",
+    "SHUTDOWN_TIMEOUT",
+    "ARTIFACT_QUEUE_SIZE",
+}
+
+TRUE_STRINGS = ("1", "true", "yes", "on")
+FALSE_STRINGS = ("0", "false", "no", "off", "")
+
+
+class ConfigError(ValueError):
+    """配置无效"""
+
+
+def _schema() -> Dict[str, Any]:
+    """从 Config 类的大写属性生成 {配置项: 默认值}"""
+    return {
+        name: getattr(Config, name)
+        for name in dir(Config)
+        if name.isupper() and not name.startswith("_")
+    }
+
+
+def _coerce(name: str, value: Any, default: Any, source: str) -> Any:
+    """
+    按默认值的类型校验并转换配置值（字符串来自 .env/环境变量，其余来自 TOML）
+
+    Args:
+        name: 配置项名称
+        value: 原始值
+        default: 默认值（决定期望类型）
+        source: 来源描述，用于错误信息
+
+    Returns:
+        转换后的值
+    """
+    def fail(expected: str):
+        raise ConfigError(f"{source}: {name} 应为{expected}，实际为 {value!r}")
+
+    if isinstance(default, bool):
+        if isinstance(value, bool):
+            return value
+        if isinstance(value, str) and value.strip().lower() in TRUE_STRINGS + FALSE_STRINGS:
+            return value.strip().lower() in TRUE_STRINGS
+        fail("布尔值")
+
+    if isinstance(default, (int, float)):
+        if isinstance(value, bool):
+            fail("数字")
+        if isinstance(value, str):
+            try:
+                value = float(value) if any(c in value for c in ".eE") else int(value)
+            except ValueError:
+                fail("数字")
+        if not isinstance(value, (int, float)):
+            fail("数字")
+        # 默认值为整数的配置项（视口尺寸、秒数、次数等）不接受小数，1280.0 这样的写法转为整数
+        if isinstance(default, int):
+            if isinstance(value, float):
+                if not value.is_integer():
+                    fail("整数")
+                value = int(value)
+        if value < 0 or (name in POSITIVE and value <= 0):
+            fail("正数" if name in POSITIVE else "非负数")
+        return value
+
+    if isinstance(default, list):
+        if isinstance(value, str):
+            text = value.strip()
+            if text.startswith("["):
+                try:
+                    value = json.loads(text)
+                except ValueError:
+                    fail("JSON 数组或逗号分隔的列表")
+            else:
+                value = [item.strip() for item in text.split(",") if item.strip()]
+        # 规则表等由对象组成的列表（如 POPUP_RULES）
+        item_type, description = (dict, "对象列表") if default and isinstance(default[0], dict) else (str, "字符串列表")
+        if not isinstance(value, list) or not all(isinstance(item, item_type) for item in value):
+            fail(description)
+        return value
+
+    if not isinstance(value, str):
+        fail("字符串")
+    if name in CHOICES and value not in CHOICES[name]:
+        fail(f" {'/'.join(CHOICES[name])} 之一")
+    return value
+
+
+def _flatten(table: dict) -> Dict[str, Any]:
+    """TOML 中的分组表（如 [browser]）只用于组织，展开为平铺的配置项"""
+    flat = {}
+    for key, value in table.items():
+        if isinstance(value, dict):
+            flat.update(_flatten(value))
+        else:
+            flat[key.upper()] = value
+    return flat
+
+
+def _read_toml(path: Path) -> Dict[str, Any]:
+    """读取 TOML 配置文件"""
+    if tomllib is None:
+        raise ConfigError(f"读取 {path} 需要 Python 3.11+ 或安装 tomli")
+    try:
+        with path.open("rb") as f:
+            return _flatten(tomllib.load(f))
+    except tomllib.TOMLDecodeError as e:
+        raise ConfigError(f"{path}: TOML 格式错误: {e}") from e
+
+
+def _prefixed(values: Dict[str, Optional[str]]) -> Dict[str, str]:
+    """提取带 ENV_PREFIX 前缀的变量并去掉前缀"""
+    return {
+        key[len(ENV_PREFIX):].upper(): value
+        for key, value in values.items()
+        if key.upper().startswith(ENV_PREFIX) and value is not None
+    }
+
+
+def load_config(config_file: Optional[str] = None, env_file: Optional[str] = None) -> Config:
+    """
+    加载分层配置：config.py 默认值 < TOML 文件 < .env 文件 < 环境变量
+
+    Args:
+        config_file: TOML 配置文件路径；为 None 时若存在 config.toml 则自动加载
+        env_file: .env 文件路径；为 None 时若存在 .env 则自动加载
+
+    Returns:
+        Config: 叠加并校验后的配置对象
+    """
+    schema = _schema()
+    config = Config()
+    layers = []
+
+    toml_path = Path(config_file or DEFAULT_CONFIG_FILE)
+    if config_file and not toml_path.is_file():
+        raise ConfigError(f"配置文件不存在: {toml_path}")
+    if toml_path.is_file():
+        layers.append((str(toml_path), _read_toml(toml_path), True))
+
+    env_path = Path(env_file or DEFAULT_ENV_FILE)
+    if env_file and not env_path.is_file():
+        raise ConfigError(f".env 文件不存在: {env_path}")
+    if env_path.is_file():
+        layers.append((str(env_path), _prefixed(dotenv_values(env_path)), True))
+
+    # 环境变量中可能有其他程序使用同样前缀的变量，未知项只警告
+    layers.append(("环境变量", _prefixed(dict(os.environ)), False))
+
+    for source, values, strict in layers:
+        unknown = sorted(set(values) - set(schema))
+        if unknown:
+            if strict:
+                raise ConfigError(f"{source}: 未知配置项 {', '.join(unknown)}")
+            logger.warning(f"{source}: 忽略未知配置项 {', '.join(unknown)}")
+            for name in unknown:
+                values.pop(name)
+
+        for name, value in values.items():
+            setattr(config, name, _coerce(name, value, schema[name], source))
+
+        if values:
+            logger.debug(f"已加载配置 {source}: {', '.join(sorted(values))}")
+
+    return config
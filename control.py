@@ -0,0 +1,171 @@
+"""
+控制接口模块
+通过本地 Unix socket 操控正在运行的自动化会话：追加视频、暂停/继续、跳过当前视频、查看状态
+
+协议: 每个连接发送一行 JSON 请求，返回一行 JSON 响应
+    {"cmd": "enqueue", "hrefs": ["/ybdy/play?v_id=1"]}
+    {"cmd": "pause"} / {"cmd": "resume"} / {"cmd": "skip"} / {"cmd": "state"}
+"""
+
+import asyncio
+import json
+import logging
+import os
+import socket
+from pathlib import Path
+from typing import Any, Dict
+
+logger = logging.getLogger(__name__)
+
+# 支持的命令
+COMMANDS = ("enqueue", "pause", "resume", "skip", "state")
+
+# 单条请求的最大长度（字节）
+MAX_REQUEST_BYTES = 1024 * 1024
+
+
+class ControlServer:
+    """本地控制端点 - 只监听 Unix socket，文件权限限制为当前用户"""
+
+    def __init__(self, automator, path: str):
+        """
+        Args:
+            automator: 被控制的 VideoAutomator
+            path: Unix socket 路径
+        """
+        self.automator = automator
+        self.path = Path(path)
+        self.server = None
+
+    async def start(self):
+        """启动控制端点；平台不支持或已有会话在监听时抛出 OSError"""
+        if not hasattr(asyncio, "start_unix_server"):
+            raise OSError("当前平台不支持 Unix socket")
+
+        if self.path.exists():
+            if _socket_alive(self.path):
+                raise OSError(f"已有会话在监听 {self.path}")
+            # 上次运行异常退出留下的 socket 文件
+            self.path.unlink()
+
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.server = await asyncio.start_unix_server(
+            self._handle, path=str(self.path), limit=MAX_REQUEST_BYTES
+        )
+        os.chmod(self.path, 0o600)
+        logger.info(f"🎛️  控制端点已启动: {self.path}")
+
+    async def stop(self):
+        """停止控制端点并删除 socket 文件"""
+        if self.server:
+            self.server.close()
+            await self.server.wait_closed()
+            self.server = None
+            try:
+                self.path.unlink()
+            except OSError:
+                pass
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        """处理单个控制请求"""
+        try:
+            line = await asyncio.wait_for(reader.readline(), timeout=5)
+            try:
+                request = json.loads(line)
+                if not isinstance(request, dict):
+                    raise ValueError("请求必须是 JSON 对象")
+                response = self.dispatch(request)
+            except ValueError as e:
+                response = {"ok": False, "error": str(e)}
+
+            writer.write(json.dumps(response, ensure_ascii=False).encode("utf-8") + b"\n")
+            await writer.drain()
+        except Exception as e:
+            logger.debug(f"处理控制请求时出错: {e}")
+        finally:
+            writer.close()
+
+    def dispatch(self, request: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        执行一条控制命令
+
+        Args:
+            request: 请求对象
+
+        Returns:
+            Dict: 响应对象，ok 表示是否执行成功
+        """
+        cmd = request.get("cmd")
+        if cmd not in COMMANDS:
+            return {"ok": False, "error": f"未知命令: {cmd!r}，可用命令: {', '.join(COMMANDS)}"}
+
+        logger.info(f"🎛️  收到控制命令: {cmd}")
+
+        if cmd == "enqueue":
+            hrefs = request.get("hrefs")
+            if not isinstance(hrefs, list) or not all(isinstance(h, str) for h in hrefs):
+                return {"ok": False, "error": "enqueue 需要 hrefs 字符串列表"}
+            hrefs = [h.strip() for h in hrefs if h.strip()]
+            if not hrefs:
+                return {"ok": False, "error": "hrefs 为空"}
+            indices = self.automator.enqueue(hrefs)
+            return {"ok": True, "video_indices": indices}
+
+        if cmd == "pause":
+            self.automator.pause()
+            return {"ok": True, "paused": True}
+
+        if cmd == "resume":
+            self.automator.resume()
+            return {"ok": True, "paused": False}
+
+        if cmd == "skip":
+            skipped = self.automator.skip_current()
+            if skipped is None:
+                return {"ok": False, "error": "当前没有正在播放的视频"}
+            return {"ok": True, "skipped": skipped}
+
+        return {"ok": True, "state": self.automator.get_state()}
+
+
+def _socket_alive(path: Path) -> bool:
+    """socket 文件是否有进程在监听"""
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.settimeout(1)
+        sock.connect(str(path))
+        return True
+    except OSError:
+        return False
+    finally:
+        sock.close()
+
+
+def send_command(path: str, request: Dict[str, Any], timeout: float = 10) -> Dict[str, Any]:
+    """
+    向运行中的会话发送一条控制命令（同步客户端，供命令行使用）
+
+    Args:
+        path: Unix socket 路径
+        request: 请求对象
+        timeout: 超时时间(秒)
+
+    Returns:
+        Dict: 响应对象
+    """
+    if not hasattr(socket, "AF_UNIX"):
+        raise OSError("当前平台不支持 Unix socket")
+
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.settimeout(timeout)
+        sock.connect(path)
+        sock.sendall(json.dumps(request, ensure_ascii=False).encode("utf-8") + b"\n")
+
+        chunks = []
+        while True:
+            chunk = sock.recv(65536)
+            if not chunk:
+                break
+            chunks.append(chunk)
+
+    return json.loads(b"".join(chunks))
@@ -0,0 +1,242 @@
+"""
+播放列表发现模块
+登录后爬取课程目录页，按课程顺序提取播放链接并写入缓存的播放列表文件；
+再次发现时只重新抓取发生变化的目录页
+"""
+
+import asyncio
+import hashlib
+import json
+import logging
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import urlsplit
+
+from playwright.async_api import BrowserContext
+
+logger = logging.getLogger(__name__)
+
+
+class PlaylistDiscovery:
+    """播放列表发现器 - 目录页的修改标记保存在播放列表旁的 .meta.json 中"""
+
+    def __init__(self, config, output_path: str):
+        """
+        初始化发现器
+
+        Args:
+            config: 配置对象
+            output_path: 播放列表输出路径
+        """
+        self.config = config
+        self.output_path = Path(output_path)
+        self.meta_path = self.output_path.with_name(self.output_path.name + ".meta.json")
+        self.meta: Dict[str, dict] = self._load_meta()
+
+    def _load_meta(self) -> Dict[str, dict]:
+        """加载上次发现时各目录页的修改标记和提取结果"""
+        if not self.meta_path.is_file():
+            return {}
+        try:
+            return json.loads(self.meta_path.read_text(encoding="utf-8"))
+        except (OSError, ValueError) as e:
+            logger.warning(f"播放列表元数据读取失败，将全部重新抓取: {e}")
+            return {}
+
+    def _catalog_url(self, catalog_href: str) -> str:
+        return f"{self.config.VIDEO_SITE_URL.rstrip('/')}{catalog_href}"
+
+    async def _fetch_stamp(
+        self, context: BrowserContext, catalog_href: str, conditional: bool
+    ) -> Tuple[Optional[dict], bytes]:
+        """
+        请求目录页并生成修改标记 (ETag / Last-Modified / 内容哈希)
+
+        标记基于原始 HTTP 响应，只对服务端渲染的目录页有效；
+        客户端渲染的目录页由 discover() 识别后不再做条件请求
+
+        Args:
+            context: 已登录的浏览器上下文
+            catalog_href: 目录页相对路径
+            conditional: 是否与上次的标记比较（发送条件请求头）
+
+        Returns:
+            (新的修改标记, 原始 HTML)；conditional 且目录页未变化时修改标记为 None
+        """
+        cached = self.meta.get(catalog_href) if conditional else None
+        headers = {}
+        if cached:
+            if cached.get("etag"):
+                headers["If-None-Match"] = cached["etag"]
+            if cached.get("last_modified"):
+                headers["If-Modified-Since"] = cached["last_modified"]
+
+        response = await context.request.get(self._catalog_url(catalog_href), headers=headers)
+        if cached and response.status == 304:
+            return None, b""
+
+        body = await response.body()
+        stamp = {
+            "etag": response.headers.get("etag"),
+            "last_modified": response.headers.get("last-modified"),
+            "sha256": hashlib.sha256(body).hexdigest(),
+        }
+        if cached and cached.get("sha256") == stamp["sha256"]:
+            return None, body
+        return stamp, body
+
+    async def _extract_hrefs(self, context: BrowserContext, catalog_href: str) -> Optional[List[str]]:
+        """
+        渲染目录页并按页面顺序提取播放链接
+
+        Args:
+            context: 已登录的浏览器上下文
+            catalog_href: 目录页相对路径
+
+        Returns:
+            List[str]: 相对路径 href 列表，等待播放链接超时时返回 None
+        """
+        page = await context.new_page()
+        try:
+            await page.goto(self._catalog_url(catalog_href), wait_until="networkidle")
+            try:
+                await page.wait_for_selector(self.config.CATALOG_PLAY_LINK_SELECTOR, timeout=10000)
+            except Exception:
+                logger.warning(f"目录页 {catalog_href} 中没有找到播放链接")
+                return None
+
+            raw_hrefs = await page.eval_on_selector_all(
+                self.config.CATALOG_PLAY_LINK_SELECTOR,
+                "elements => elements.map(el => el.getAttribute('href'))"
+            )
+        finally:
+            await page.close()
+
+        return [self._to_relative(href) for href in raw_hrefs if href]
+
+    @staticmethod
+    def _client_rendered(body: bytes, hrefs: List[str]) -> bool:
+        """原始 HTML 中找不到任何一个播放链接时，视为由脚本渲染的目录页"""
+        html = body.decode("utf-8", errors="replace").replace("&amp;", "&")
+        return not any(href in html for href in hrefs)
+
+    def _to_relative(self, href: str) -> str:
+        """把绝对 URL 转换为相对于站点根目录的 href"""
+        parts = urlsplit(href)
+        if not parts.scheme:
+            return href if href.startswith("/") else f"/{href}"
+        path = parts.path or "/"
+        return f"{path}?{parts.query}" if parts.query else path
+
+    async def discover(
+        self,
+        context: BrowserContext,
+        catalog_hrefs: List[str],
+        concurrency: int = 2,
+        full: bool = False
+    ) -> List[str]:
+        """
+        发现播放列表并写入文件
+
+        Args:
+            context: 已登录的浏览器上下文
+            catalog_hrefs: 目录页相对路径列表（按课程顺序）
+            concurrency: 同时抓取的目录页数
+            full: 是否忽略修改标记，全部重新抓取
+
+        Returns:
+            List[str]: 按课程顺序排列、去重后的 href 列表
+        """
+        semaphore = asyncio.Semaphore(max(1, concurrency))
+        stats = {"changed": 0, "unchanged": 0, "failed": 0}
+
+        async def process(catalog_href: str):
+            async with semaphore:
+                cached = self.meta.get(catalog_href)
+                # 客户端渲染的目录页原始 HTML 不随目录变化，修改标记不可信，每次都重新渲染
+                conditional = not full and cached is not None and not cached.get("client_rendered")
+                try:
+                    stamp, body = await self._fetch_stamp(context, catalog_href, conditional)
+                except Exception as e:
+                    logger.debug(f"获取修改标记失败 {catalog_href}: {e}")
+                    stamp, body = {}, b""
+
+                if stamp is None:
+                    stats["unchanged"] += 1
+                    logger.info(f"  {catalog_href}: 未变化，使用缓存")
+                    return
+
+                try:
+                    hrefs = await self._extract_hrefs(context, catalog_href)
+                except Exception as e:
+                    # 单个目录页打开失败不影响其他目录页
+                    logger.warning(f"  {catalog_href}: 打开目录页失败: {e}")
+                    hrefs = None
+                if hrefs is None:
+                    # 不保存新的修改标记（否则下次会被当作未变化），本次沿用上次的结果
+                    stats["failed"] += 1
+                    previous = self.meta.get(catalog_href, {}).get("hrefs", [])
+                    logger.warning(f"  {catalog_href}: 提取失败，沿用上次的 {len(previous)} 个视频")
+                    return
+
+                # 以提取出的链接列表判断目录是否变化
+                hrefs_sha256 = hashlib.sha256("\n".join(hrefs).encode("utf-8")).hexdigest()
+                if cached and cached.get("hrefs_sha256") == hrefs_sha256:
+                    stats["unchanged"] += 1
+                    logger.info(f"  {catalog_href}: 链接未变化 ({len(hrefs)} 个视频)")
+                else:
+                    stats["changed"] += 1
+                    logger.info(f"  {catalog_href}: 发现 {len(hrefs)} 个视频")
+
+                if body:
+                    client_rendered = self._client_rendered(body, hrefs)
+                else:
+                    client_rendered = bool(cached and cached.get("client_rendered"))
+                if client_rendered and not (cached and cached.get("client_rendered")):
+                    logger.info(f"  {catalog_href}: 播放链接由脚本渲染，之后每次都重新渲染该目录页")
+
+                self.meta[catalog_href] = {
+                    **stamp,
+                    "hrefs": hrefs,
+                    "hrefs_sha256": hrefs_sha256,
+                    "client_rendered": client_rendered,
+                    "fetched_at": datetime.now().isoformat(timespec="seconds"),
+                }
+
+        await asyncio.gather(*(process(href) for href in catalog_hrefs))
+
+        # 按目录页顺序合并并去重（保持课程顺序）
+        playlist = []
+        seen = set()
+        for catalog_href in catalog_hrefs:
+            for href in self.meta.get(catalog_href, {}).get("hrefs", []):
+                if href not in seen:
+                    seen.add(href)
+                    playlist.append(href)
+
+        self._write(catalog_hrefs, playlist)
+        logger.info(
+            f"播放列表已写入 {self.output_path}: {len(playlist)} 个视频 "
+            f"(有变化 {stats['changed']} 页，未变化 {stats['unchanged']} 页，失败 {stats['failed']} 页)"
+        )
+        return playlist
+
+    def _write(self, catalog_hrefs: List[str], playlist: List[str]):
+        """写入播放列表文件（每个目录页一段，注释中记录修改标记）和元数据"""
+        self.output_path.parent.mkdir(parents=True, exist_ok=True)
+
+        lines = [f"# 自动发现于 {datetime.now().isoformat(timespec='seconds')}，共 {len(playlist)} 个视频"]
+        written = set()
+        for catalog_href in catalog_hrefs:
+            entry = self.meta.get(catalog_href, {})
+            stamp = entry.get("last_modified") or entry.get("etag") or entry.get("sha256", "")[:12]
+            lines.append("")
+            lines.append(f"# 目录: {catalog_href} (抓取于 {entry.get('fetched_at', '-')}, 标记 {stamp or '-'})")
+            for href in entry.get("hrefs", []):
+                if href not in written:
+                    written.add(href)
+                    lines.append(href)
+
+        self.output_path.write_text("\n".join(lines) + "\n", encoding="utf-8")
+        self.meta_path.write_text(json.dumps(self.meta, ensure_ascii=False, indent=2), encoding="utf-8")
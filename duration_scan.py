@@ -0,0 +1,235 @@
+"""
+时长预扫描模块
+只加载元数据读取每个视频的时长，结果按 href 缓存到磁盘，用于估算总耗时和单个视频的超时
+"""
+
+import asyncio
+import json
+import logging
+import math
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional
+
+from playwright.async_api import BrowserContext
+
+logger = logging.getLogger(__name__)
+
+
+class DurationCache:
+    """视频时长磁盘缓存 - {href: {"duration": 秒, "scanned_at": 时间}}"""
+
+    def __init__(self, path: str):
+        """
+        初始化缓存
+
+        Args:
+            path: 缓存文件路径
+        """
+        self.path = Path(path)
+        self.entries: Dict[str, dict] = {}
+        self.load()
+
+    def load(self):
+        """从磁盘加载缓存（文件不存在或损坏时为空）"""
+        if not self.path.is_file():
+            return
+        try:
+            self.entries = json.loads(self.path.read_text(encoding="utf-8"))
+        except (OSError, ValueError) as e:
+            logger.warning(f"时长缓存读取失败，忽略: {e}")
+            self.entries = {}
+
+    def save(self):
+        """写回磁盘（先写临时文件再替换，避免中断时损坏）"""
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.path.with_suffix(self.path.suffix + ".tmp")
+        tmp_path.write_text(json.dumps(self.entries, ensure_ascii=False, indent=2), encoding="utf-8")
+        tmp_path.replace(self.path)
+
+    def get(self, href: str) -> Optional[float]:
+        """获取缓存的时长（秒），旧缓存中的非有限值（直播流的 Infinity）视为未知"""
+        entry = self.entries.get(href)
+        if not entry or not math.isfinite(entry["duration"]):
+            return None
+        return entry["duration"]
+
+    def set(self, href: str, duration: float):
+        """记录时长（忽略非有限值）"""
+        if not math.isfinite(duration):
+            return
+        self.entries[href] = {
+            "duration": round(duration, 1),
+            "scanned_at": datetime.now().isoformat(timespec="seconds"),
+        }
+
+    def durations(self, hrefs: Iterable[str]) -> Dict[str, float]:
+        """返回给定 href 中已知时长的部分"""
+        result = {}
+        for href in hrefs:
+            duration = self.get(href)
+            if duration is not None:
+                result[href] = duration
+        return result
+
+
+async def read_duration(
+    context: BrowserContext,
+    url: str,
+    timeout: float,
+    player_selector: str = "video"
+) -> Optional[float]:
+    """
+    打开视频页面，等待元数据加载后读取 duration，然后立即关闭页面
+
+    Args:
+        context: 已登录的浏览器上下文
+        url: 视频页面完整 URL
+        timeout: 超时时间(秒)
+        player_selector: 播放器选择器（VIDEO_PLAYER_SELECTOR）
+
+    Returns:
+        float: 时长(秒)，读取失败返回 None
+    """
+    page = await context.new_page()
+    try:
+        await page.goto(url, wait_until="domcontentloaded", timeout=timeout * 1000)
+        handle = await page.wait_for_function(
+            """
+            selector => {
+                const video = document.querySelector(selector);
+                if (!video) return null;
+                video.preload = 'metadata';
+                return isFinite(video.duration) && video.duration > 0 ? video.duration : null;
+            }
+            """,
+            arg=player_selector,
+            timeout=timeout * 1000,
+            polling=500
+        )
+        return await handle.json_value()
+    except Exception as e:
+        logger.debug(f"读取时长失败 {url}: {e}")
+        return None
+    finally:
+        await page.close()
+
+
+async def scan_durations(
+    context: BrowserContext,
+    base_url: str,
+    hrefs: List[str],
+    cache: DurationCache,
+    concurrency: int = 3,
+    timeout: float = 30,
+    player_selector: str = "video"
+) -> Dict[str, float]:
+    """
+    并发读取未缓存视频的时长并写入缓存
+
+    Args:
+        context: 已登录的浏览器上下文
+        base_url: 网站基础 URL
+        hrefs: 视频 href 列表
+        cache: 时长缓存
+        concurrency: 同时打开的页面数
+        timeout: 单个页面的超时时间(秒)
+        player_selector: 播放器选择器（VIDEO_PLAYER_SELECTOR）
+
+    Returns:
+        Dict[str, float]: 所有已知时长（含缓存）
+    """
+    missing = [href for href in dict.fromkeys(hrefs) if cache.get(href) is None]
+    logger.info(f"时长预扫描: {len(hrefs) - len(missing)} 个已缓存，{len(missing)} 个待扫描")
+
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+
+    # 图片和字体不影响读取元数据，直接拦截以节省带宽
+    async def block_heavy(route):
+        if route.request.resource_type in ("image", "font"):
+            await route.abort()
+        else:
+            await route.continue_()
+
+    async def scan_one(href: str):
+        async with semaphore:
+            url = f"{base_url.rstrip('/')}{href}"
+            duration = await read_duration(context, url, timeout, player_selector)
+            if duration:
+                cache.set(href, duration)
+                logger.info(f"  {href}: {format_seconds(duration)}")
+            else:
+                logger.warning(f"  {href}: 无法读取时长")
+
+    if missing:
+        await context.route("**/*", block_heavy)
+        try:
+            await asyncio.gather(*(scan_one(href) for href in missing))
+        finally:
+            await context.unroute("**/*", block_heavy)
+        cache.save()
+
+    return cache.durations(hrefs)
+
+
+class EtaEstimator:
+    """剩余时间估算 - 基于预扫描的时长和每个视频的固定开销"""
+
+    def __init__(self, durations: Dict[str, float], overhead_per_video: float):
+        """
+        Args:
+            durations: {href: 时长}
+            overhead_per_video: 每个视频的额外开销估计(秒)，包括启动、登录、打开页面等
+        """
+        self.durations = durations
+        self.overhead_per_video = overhead_per_video
+
+    def duration_of(self, href: str) -> Optional[float]:
+        """已知时长，未知返回 None"""
+        return self.durations.get(href)
+
+    def _average(self) -> float:
+        if not self.durations:
+            return 0.0
+        return sum(self.durations.values()) / len(self.durations)
+
+    def estimate(self, hrefs: Iterable[str]) -> float:
+        """
+        估算播放一组视频所需的时间（未知时长按已知平均值计算）
+
+        Args:
+            hrefs: 视频 href 列表
+
+        Returns:
+            float: 秒
+        """
+        average = self._average()
+        total = 0.0
+        for href in hrefs:
+            total += self.durations.get(href, average) + self.overhead_per_video
+        return total
+
+    def remaining(self, current_remaining: float, queued_hrefs: Iterable[str]) -> float:
+        """
+        估算整个播放列表的剩余时间
+
+        Args:
+            current_remaining: 当前视频的剩余播放时间(秒)
+            queued_hrefs: 队列中尚未开始的视频
+
+        Returns:
+            float: 秒
+        """
+        return max(0.0, current_remaining) + self.estimate(queued_hrefs)
+
+
+def format_seconds(seconds: float) -> str:
+    """把秒数格式化为 1h02m03s"""
+    seconds = int(seconds)
+    hours, rest = divmod(seconds, 3600)
+    minutes, secs = divmod(rest, 60)
+    if hours:
+        return f"{hours}h{minutes:02d}m{secs:02d}s"
+    if minutes:
+        return f"{minutes}m{secs:02d}s"
+    return f"{secs}s"
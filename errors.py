@@ -0,0 +1,139 @@
+"""
+错误分类模块
+把播放过程中的异常归类为具体的错误类型，每种类型对应最快的恢复方式
+"""
+
+from playwright.async_api import Error as PlaywrightError
+from playwright.async_api import TimeoutError as PlaywrightTimeoutError
+
+# ===== 恢复动作 =====
+# 重新打开视频页面
+RECOVERY_RELOAD = "reload"
+# 重新登录后再打开视频页面
+RECOVERY_RELOGIN = "relogin"
+# 等待网络恢复后再打开视频页面
+RECOVERY_WAIT_NETWORK = "wait_network"
+# 在同一上下文中新建页面（渲染进程崩溃）
+RECOVERY_NEW_PAGE = "new_page"
+# 关闭整个浏览器，由重试队列重新启动
+RECOVERY_RESTART_BROWSER = "restart_browser"
+# 放弃：重试也不会成功（如选择器失效）
+RECOVERY_ABORT = "abort"
+
+# 网络不可用时 Chrome 报告的错误码
+NETWORK_ERROR_CODES = (
+    "net::ERR_INTERNET_DISCONNECTED",
+    "net::ERR_NAME_NOT_RESOLVED",
+    "net::ERR_NETWORK_CHANGED",
+    "net::ERR_CONNECTION_REFUSED",
+    "net::ERR_CONNECTION_RESET",
+    "net::ERR_CONNECTION_CLOSED",
+    "net::ERR_CONNECTION_TIMED_OUT",
+    "net::ERR_TIMED_OUT",
+    "net::ERR_ADDRESS_UNREACHABLE",
+    "net::ERR_PROXY_CONNECTION_FAILED",
+)
+
+
+class VideoAutomationError(Exception):
+    """播放错误基类 - 未识别的错误按原有方式处理（重启浏览器）"""
+
+    kind = "unknown"
+    recovery = RECOVERY_RESTART_BROWSER
+    # 是否值得放回重试队列
+    retryable = True
+
+
+class NavigationTimeoutError(VideoAutomationError):
+    """页面导航或加载超时"""
+
+    kind = "navigation_timeout"
+    recovery = RECOVERY_RELOAD
+
+
+class LoggedOutError(VideoAutomationError):
+    """登录状态失效（被重定向到登录页）"""
+
+    kind = "logged_out"
+    recovery = RECOVERY_RELOGIN
+
+
+class PlayerMissingError(VideoAutomationError):
+    """视频页面已打开但找不到播放器"""
+
+    kind = "player_missing"
+    recovery = RECOVERY_RELOAD
+
+
+class SelectorDriftError(VideoAutomationError):
+    """配置的选择器在页面上已不再匹配（网站改版）"""
+
+    kind = "selector_drift"
+    recovery = RECOVERY_ABORT
+    retryable = False
+
+
+class RendererCrashError(VideoAutomationError):
+    """页面渲染进程崩溃"""
+
+    kind = "renderer_crash"
+    recovery = RECOVERY_NEW_PAGE
+
+
+class NetworkDownError(VideoAutomationError):
+    """网络不可用"""
+
+    kind = "network_down"
+    recovery = RECOVERY_WAIT_NETWORK
+
+
+class PlaybackTimeoutError(VideoAutomationError):
+    """播放时间超过按时长推算的上限仍未完成"""
+
+    kind = "playback_timeout"
+    recovery = RECOVERY_RELOAD
+
+
+class BrowserClosedError(VideoAutomationError):
+    """浏览器或上下文已被关闭"""
+
+    kind = "browser_closed"
+    recovery = RECOVERY_RESTART_BROWSER
+
+
+class ReplayMissingError(VideoAutomationError):
+    """HAR 回放模式下录制包中没有该视频"""
+
+    kind = "replay_missing"
+    recovery = RECOVERY_ABORT
+    retryable = False
+
+
+def classify_error(exc: BaseException) -> VideoAutomationError:
+    """
+    将任意异常归类为具体的错误类型
+
+    Args:
+        exc: 捕获到的异常
+
+    Returns:
+        VideoAutomationError: 分类后的错误（保留原异常作为 __cause__）
+    """
+    if isinstance(exc, VideoAutomationError):
+        return exc
+
+    message = str(exc)
+
+    if any(code in message for code in NETWORK_ERROR_CODES):
+        error = NetworkDownError(message)
+    elif isinstance(exc, PlaywrightTimeoutError):
+        error = NavigationTimeoutError(message)
+    elif isinstance(exc, PlaywrightError) and "crash" in message.lower():
+        error = RendererCrashError(message)
+    elif isinstance(exc, PlaywrightError) and "closed" in message.lower():
+        error = BrowserClosedError(message)
+    else:
+        error = VideoAutomationError(message)
+
+    error.__cause__ = exc
+    return error
@@ -0,0 +1,297 @@
+"""
+HAR 录制/回放模块
+录制模式下把每个视频会话（登录、视频页、弹窗、有上限的媒体分段）保存为 HAR 和 DOM 快照；
+回放模式下通过 route_from_har 离线提供这些响应，用于可重复的性能测试
+"""
+
+import asyncio
+import gzip
+import json
+import logging
+import re
+import zipfile
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+from playwright.async_api import BrowserContext, Page
+
+from errors import ReplayMissingError
+
+logger = logging.getLogger(__name__)
+
+# 录制包中的清单文件: {href: {"har": 文件名, "dom": [快照文件名], ...}}
+MANIFEST_FILE = "manifest.json"
+
+# 视为媒体分段的响应（受 HAR_MEDIA_MAX_MB 限制）
+MEDIA_MIME_PREFIXES = ("video/", "audio/")
+MEDIA_URL_PATTERN = re.compile(r"\.(ts|m4s|mp4|flv|webm|m4a|aac)(\?|$)", re.IGNORECASE)
+
+# 每个视频每类快照最多保存的数量（弹窗可能反复出现）
+MAX_SNAPSHOTS_PER_LABEL = 3
+
+# 录制包需要分享和回放，保存前去掉这些头中的凭据
+SENSITIVE_REQUEST_HEADERS = ("cookie", "authorization", "proxy-authorization")
+SENSITIVE_RESPONSE_HEADERS = ("set-cookie",)
+REDACTED = "[REDACTED]"
+
+
+def _is_media(entry: dict) -> bool:
+    """HAR 条目是否为媒体分段（m3u8 等播放列表体积小，不计入）"""
+    mime = entry.get("response", {}).get("content", {}).get("mimeType", "") or ""
+    if mime.startswith(MEDIA_MIME_PREFIXES):
+        return True
+    return bool(MEDIA_URL_PATTERN.search(entry.get("request", {}).get("url", "")))
+
+
+def _post_text(archive: zipfile.ZipFile, post_data: dict) -> str:
+    """请求体文本（attach 模式下可能保存为压缩包中的附件）"""
+    if post_data.get("_file"):
+        try:
+            return archive.read(post_data["_file"]).decode("utf-8", errors="replace")
+        except KeyError:
+            return ""
+    return post_data.get("text", "") or ""
+
+
+def _redact(entry: dict, archive: zipfile.ZipFile, secrets: Tuple[str, ...]) -> bool:
+    """
+    去掉 HAR 条目中的凭据：Cookie / Authorization / Set-Cookie 头、cookies 列表，
+    以及登录请求（URL 含 login 或请求体含密码）的请求体
+
+    回放时 route_from_har 对没有 postData 的 POST 条目不比较请求体，删除后仍可匹配
+
+    Returns:
+        bool: 是否有改动
+    """
+    changed = False
+    request, response = entry.get("request", {}), entry.get("response", {})
+    for message, names in ((request, SENSITIVE_REQUEST_HEADERS), (response, SENSITIVE_RESPONSE_HEADERS)):
+        for header in message.get("headers", []):
+            if header.get("name", "").lower() in names and header.get("value") != REDACTED:
+                header["value"] = REDACTED
+                changed = True
+        for cookie in message.get("cookies", []):
+            if cookie.get("value") != REDACTED:
+                cookie["value"] = REDACTED
+                changed = True
+
+    post_data = request.get("postData")
+    if post_data:
+        text = _post_text(archive, post_data)
+        if "login" in request.get("url", "").lower() or any(secret in text for secret in secrets):
+            del request["postData"]
+            changed = True
+    return changed
+
+
+def sanitize_har(har_path: Path, max_bytes: int, secrets: Tuple[str, ...] = ()) -> Tuple[int, int, int]:
+    """
+    去掉 HAR 压缩包中的凭据，并删除超出媒体字节上限的媒体条目（按请求顺序保留前面的分段）
+
+    在上下文关闭、HAR 写入之后执行，只限制最终保存的大小；录制期间的磁盘占用不受此上限约束
+
+    Args:
+        har_path: route_from_har 可用的 .zip 录制文件
+        max_bytes: 媒体内容总字节上限
+        secrets: 不允许出现在请求体中的字符串（登录密码）
+
+    Returns:
+        (保留的媒体字节数, 删除的媒体条目数, 去掉凭据的条目数)
+    """
+    secrets = tuple(secret for secret in secrets if secret)
+    with zipfile.ZipFile(har_path) as archive:
+        har_name = next(name for name in archive.namelist() if name.endswith(".har"))
+        har = json.loads(archive.read(har_name))
+
+        kept_entries = []
+        media_bytes = 0
+        dropped = 0
+        redacted = 0
+        for entry in har["log"]["entries"]:
+            if _is_media(entry):
+                content = entry["response"].get("content", {})
+                attached = content.get("_file")
+                size = archive.getinfo(attached).file_size if attached else max(content.get("size", 0), 0)
+                if media_bytes + size > max_bytes:
+                    dropped += 1
+                    continue
+                media_bytes += size
+            if _redact(entry, archive, secrets):
+                redacted += 1
+            kept_entries.append(entry)
+
+        if not dropped and not redacted:
+            return media_bytes, 0, 0
+
+        har["log"]["entries"] = kept_entries
+        referenced = set()
+        for entry in kept_entries:
+            referenced.add(entry["response"].get("content", {}).get("_file"))
+            referenced.add((entry["request"].get("postData") or {}).get("_file"))
+
+        tmp_path = har_path.with_suffix(har_path.suffix + ".tmp")
+        with zipfile.ZipFile(tmp_path, "w", compression=zipfile.ZIP_DEFLATED) as output:
+            output.writestr(har_name, json.dumps(har, ensure_ascii=False))
+            for name in archive.namelist():
+                if name != har_name and name in referenced:
+                    output.writestr(name, archive.read(name))
+
+    tmp_path.replace(har_path)
+    return media_bytes, dropped, redacted
+
+
+class HarBundle:
+    """HAR 录制包 - 每个视频一个 HAR 压缩包，外加 DOM 快照和清单"""
+
+    def __init__(self, config):
+        """
+        Args:
+            config: 配置对象（HAR_MODE、HAR_BUNDLE_DIR、HAR_MEDIA_MAX_MB、HAR_REPLAY_NOT_FOUND）
+        """
+        self.config = config
+        self.mode = config.HAR_MODE
+        self.directory = Path(config.HAR_BUNDLE_DIR)
+        self.manifest: Dict[str, dict] = {}
+        self._snapshot_counts: Dict[str, int] = {}
+        self._recording: Optional[Tuple[int, str]] = None
+
+        if self.mode:
+            self._load_manifest()
+
+    @property
+    def recording(self) -> bool:
+        return self.mode == "record"
+
+    @property
+    def replaying(self) -> bool:
+        return self.mode == "replay"
+
+    def _load_manifest(self):
+        path = self.directory / MANIFEST_FILE
+        if not path.is_file():
+            return
+        try:
+            self.manifest = json.loads(path.read_text(encoding="utf-8"))
+        except (OSError, ValueError) as e:
+            logger.warning(f"HAR 清单读取失败，忽略: {e}")
+
+    def _save_manifest(self):
+        path = self.directory / MANIFEST_FILE
+        path.write_text(json.dumps(self.manifest, ensure_ascii=False, indent=2), encoding="utf-8")
+
+    @staticmethod
+    def _har_name(video_index: int) -> str:
+        return f"video_{video_index:04d}.zip"
+
+    def context_options(self, video_index: int, href: str) -> dict:
+        """
+        录制模式下为视频会话的上下文开启 HAR 录制
+
+        Args:
+            video_index: 视频序号
+            href: 视频相对路径
+
+        Returns:
+            dict: 传给 browser.new_context 的额外参数
+        """
+        if not self.recording:
+            return {}
+
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self._recording = (video_index, href)
+        self._snapshot_counts = {}
+        self.manifest.setdefault(href, {})["dom"] = []
+        return {
+            "record_har_path": str(self.directory / self._har_name(video_index)),
+            "record_har_content": "attach",
+            "record_har_mode": "full",
+        }
+
+    async def attach(self, context: BrowserContext, href: str):
+        """
+        回放模式下让上下文的所有请求由录制的 HAR 响应
+
+        Args:
+            context: 浏览器上下文
+            href: 视频相对路径
+        """
+        if not self.replaying:
+            return
+
+        entry = self.manifest.get(href)
+        har_path = self.directory / entry["har"] if entry else None
+        if har_path is None or not har_path.is_file():
+            raise ReplayMissingError(f"录制包 {self.directory} 中没有该视频: {href}")
+
+        await context.route_from_har(har_path, not_found=self.config.HAR_REPLAY_NOT_FOUND)
+        logger.info(f"📼 回放 HAR: {har_path}")
+
+    async def snapshot(self, page: Optional[Page], label: str):
+        """
+        录制模式下保存一份 DOM 快照（每类最多 MAX_SNAPSHOTS_PER_LABEL 份）
+
+        Args:
+            page: 当前页面
+            label: 快照类型，如 login / play_page / dialog / complete
+        """
+        if not self.recording or self._recording is None or page is None:
+            return
+
+        count = self._snapshot_counts.get(label, 0)
+        if count >= MAX_SNAPSHOTS_PER_LABEL:
+            return
+        self._snapshot_counts[label] = count + 1
+
+        video_index, href = self._recording
+        name = f"video_{video_index:04d}_{label}_{count + 1}.html.gz"
+        try:
+            html = await page.content()
+            dom_dir = self.directory / "dom"
+            dom_dir.mkdir(parents=True, exist_ok=True)
+            (dom_dir / name).write_bytes(gzip.compress(html.encode("utf-8")))
+        except Exception as e:
+            logger.debug(f"保存 DOM 快照失败: {e}")
+            return
+
+        self.manifest.setdefault(href, {}).setdefault("dom", []).append(f"dom/{name}")
+
+    async def finish(self):
+        """录制模式下在上下文关闭（HAR 已写入）后去掉凭据、裁剪媒体分段并更新清单"""
+        if not self.recording or self._recording is None:
+            return
+
+        video_index, href = self._recording
+        self._recording = None
+        har_path = self.directory / self._har_name(video_index)
+        if not har_path.is_file():
+            logger.warning(f"没有生成 HAR 文件: {har_path}")
+            return
+
+        max_bytes = int(self.config.HAR_MEDIA_MAX_MB * 1024 * 1024)
+        try:
+            media_bytes, dropped, redacted = await asyncio.get_running_loop().run_in_executor(
+                None, sanitize_har, har_path, max_bytes, (self.config.LOGIN_PASSWORD,)
+            )
+        except (OSError, ValueError, KeyError, zipfile.BadZipFile) as e:
+            # 无法确认已去掉凭据，不保留这份录制
+            logger.warning(f"处理 HAR 失败，已删除 {har_path.name} 以免泄露登录凭据: {e}")
+            har_path.unlink(missing_ok=True)
+            return
+
+        entry = self.manifest.setdefault(href, {})
+        entry.update({
+            "video_index": video_index,
+            "har": har_path.name,
+            "recorded_at": datetime.now().isoformat(timespec="seconds"),
+            "media_bytes": media_bytes,
+            "media_entries_dropped": dropped,
+            "entries_redacted": redacted,
+        })
+        self._save_manifest()
+
+        size_mb = har_path.stat().st_size / 1024 / 1024
+        logger.info(
+            f"📼 已录制 HAR: {har_path} ({size_mb:.1f} MB，超出上限删除 {dropped} 个媒体分段，"
+            f"去掉 {redacted} 个条目中的凭据)"
+        )
@@ -5,44 +5,301 @@
 """
 
 import sys
+import queue
+import atexit
 import asyncio
+import argparse
+import json
 import logging
+from logging.handlers import QueueListener, RotatingFileHandler
+from datetime import datetime
 from pathlib import Path
 
 # 添加当前目录到Python路径
 sys.path.insert(0, str(Path(__file__).parent))
 
 from config import Config
-from video_automator import VideoAutomator
+from config_loader import load_config
+from control import COMMANDS, send_command
+from playlist import get_playlist, iter_playlist
+from structured_logging import ContextFilter, JsonLinesFormatter, StructuredQueueHandler
 
+# video_automator 会导入 Playwright，只在需要启动浏览器时导入（见 run_discover 和 main）
 
-def setup_logging(verbose: bool = True):
+
+def parse_args(argv=None) -> argparse.Namespace:
+    """
+    解析命令行参数
+
+    Args:
+        argv: 参数列表，为None时使用 sys.argv
+
+    Returns:
+        argparse.Namespace: 解析结果
+    """
+    parser = argparse.ArgumentParser(
+        description="视频学习网站自动化脚本",
+    )
+    parser.add_argument(
+        "--accept-disclaimer",
+        action="store_true",
+        help="确认免责声明并保存确认记录，之后运行不再询问",
+    )
+    parser.add_argument(
+        "-y", "--yes",
+        action="store_true",
+        help="无人值守模式：跳过所有交互式确认",
+    )
+    parser.add_argument(
+        "--playlist",
+        metavar="FILE",
+        help="从文件流式读取播放列表（每行一个 href），替代 VIDEO_HREF_LIST",
+    )
+    parser.add_argument(
+        "--config",
+        metavar="FILE",
+        help="TOML 配置文件（默认自动加载 config.toml）",
+    )
+    parser.add_argument(
+        "--env-file",
+        metavar="FILE",
+        help=".env 文件（默认自动加载 .env）",
+    )
+    parser.add_argument(
+        "--on-failure",
+        choices=["ask", "continue", "stop", "retry"],
+        help="视频失败后的处理策略（默认使用 config.py 中的 FAILURE_POLICY）",
+    )
+    parser.add_argument(
+        "--retries",
+        type=int,
+        metavar="N",
+        help="--on-failure retry 时每个视频的最大重试次数",
+    )
+    parser.add_argument(
+        "--prescan",
+        action="store_true",
+        help="开始前预扫描所有视频时长，估算总耗时和单个视频超时",
+    )
+    parser.add_argument(
+        "--trace",
+        action="store_true",
+        help="持续录制 Playwright trace，视频失败或卡住时保存最近几分钟",
+    )
+    parser.add_argument(
+        "--metrics-port",
+        type=int,
+        metavar="PORT",
+        help="在 127.0.0.1:PORT/metrics 开启 Prometheus 指标端点",
+    )
+    har_group = parser.add_mutually_exclusive_group()
+    har_group.add_argument(
+        "--record-har",
+        metavar="DIR",
+        help="把每个视频会话录制为 HAR 和 DOM 快照，保存到 DIR",
+    )
+    har_group.add_argument(
+        "--replay-har",
+        metavar="DIR",
+        help="离线回放 DIR 中录制的会话（用于性能测试）",
+    )
+    parser.add_argument(
+        "--check",
+        action="store_true",
+        help="只校验配置和播放列表后退出（不加载 Playwright，不启动浏览器）",
+    )
+    parser.add_argument(
+        "--log-level",
+        choices=["DEBUG", "INFO", "WARNING", "ERROR"],
+        help="日志级别（默认根据 VERBOSE_LOGGING 决定）",
+    )
+
+    subparsers = parser.add_subparsers(dest="command", metavar="COMMAND")
+
+    discover_parser = subparsers.add_parser(
+        "discover",
+        help="登录并爬取课程目录页，生成播放列表文件",
+    )
+    discover_parser.add_argument(
+        "--catalog",
+        action="append",
+        metavar="HREF",
+        help="课程目录页相对路径，可重复指定（默认使用 config.py 中的 COURSE_CATALOG_HREFS）",
+    )
+    discover_parser.add_argument(
+        "--output",
+        metavar="FILE",
+        help="播放列表输出路径（默认使用 config.py 中的 DISCOVERED_PLAYLIST_FILE）",
+    )
+    discover_parser.add_argument(
+        "--full",
+        action="store_true",
+        help="忽略缓存的修改标记，重新抓取所有目录页",
+    )
+
+    ctl_parser = subparsers.add_parser(
+        "ctl",
+        help="控制正在运行的会话：追加视频、暂停/继续、跳过当前视频、查看状态",
+    )
+    ctl_parser.add_argument(
+        "action",
+        choices=COMMANDS,
+        help="enqueue: 追加视频; pause/resume: 当前视频结束后暂停/继续; skip: 跳过当前视频; state: 输出状态",
+    )
+    ctl_parser.add_argument(
+        "hrefs",
+        nargs="*",
+        metavar="HREF",
+        help="enqueue 要追加的视频相对路径",
+    )
+    ctl_parser.add_argument(
+        "--from-file",
+        metavar="FILE",
+        help="enqueue 时从播放列表文件读取 href（每行一个）",
+    )
+    ctl_parser.add_argument(
+        "--socket",
+        metavar="PATH",
+        help="控制 socket 路径（默认使用 config.py 中的 CONTROL_SOCKET）",
+    )
+
+    report_parser = subparsers.add_parser(
+        "report",
+        help="对比最近几次运行：每视频额外开销、最慢的阶段、最常见的失败类型",
+    )
+    report_parser.add_argument(
+        "--runs",
+        type=int,
+        default=10,
+        metavar="N",
+        help="对比最近 N 次运行（默认 10）",
+    )
+    report_parser.add_argument(
+        "--db",
+        metavar="FILE",
+        help="运行历史数据库（默认使用 config.py 中的 RUN_HISTORY_DB）",
+    )
+
+    check_parser = subparsers.add_parser(
+        "check-selectors",
+        help="在保存的页面快照上检查配置的选择器是否仍然有效（不访问网站）",
+    )
+    check_parser.add_argument(
+        "--corpus",
+        metavar="DIR",
+        help="页面快照目录（默认使用 config.py 中的 SELECTOR_CORPUS_DIR，也可指定 HAR 录制包目录）",
+    )
+    check_parser.add_argument(
+        "--update-baseline",
+        action="store_true",
+        help="把尚未记录的选择器的匹配结果写入基线（确认快照中的页面正常时使用）",
+    )
+
+    return parser.parse_args(argv)
+
+
+def apply_args(config: Config, args: argparse.Namespace):
+    """
+    将命令行参数覆盖到配置对象
+
+    Args:
+        config: 配置对象
+        args: 命令行参数
+    """
+    if args.yes:
+        config.INTERACTIVE = False
+    if args.playlist:
+        config.PLAYLIST_FILE = args.playlist
+    if args.on_failure:
+        config.FAILURE_POLICY = args.on_failure
+    if args.retries is not None:
+        config.FAILURE_MAX_RETRIES = max(0, args.retries)
+    if args.prescan:
+        config.PRESCAN_ENABLED = True
+    if args.trace:
+        config.TRACE_ENABLED = True
+    if args.metrics_port:
+        config.METRICS_ENABLED = True
+        config.METRICS_PORT = args.metrics_port
+    if args.record_har:
+        config.HAR_MODE = "record"
+        config.HAR_BUNDLE_DIR = args.record_har
+    if args.replay_har:
+        config.HAR_MODE = "replay"
+        config.HAR_BUNDLE_DIR = args.replay_har
+
+    # 无人值守时不能询问，"ask" 降级为继续下一个
+    if not config.INTERACTIVE and config.FAILURE_POLICY == "ask":
+        config.FAILURE_POLICY = "continue"
+
+
+def setup_logging(verbose: bool = True, level: str = None, config: Config = None):
     """
     配置日志系统
 
+    所有日志先进入内存队列，由 QueueListener 的后台线程写入控制台、
+    按大小轮转的文本日志和 JSON Lines 日志，事件循环线程不做磁盘 IO
+
     Args:
         verbose: 是否输出详细日志
+        level: 日志级别名称，指定时优先于 verbose
+        config: 配置对象，提供日志文件路径和轮转参数
     """
-    log_level = logging.DEBUG if verbose else logging.INFO
+    config = config or Config()
+
+    if level:
+        log_level = getattr(logging, level.upper())
+    else:
+        log_level = logging.DEBUG if verbose else logging.INFO
 
     # 配置日志格式
     log_format = '%(asctime)s - %(levelname)s - %(message)s'
     date_format = '%H:%M:%S'
-
-    # 配置根日志器
-    logging.basicConfig(
-        level=log_level,
-        format=log_format,
-        datefmt=date_format,
-        handlers=[
-            logging.StreamHandler(sys.stdout),  # 输出到控制台
-            logging.FileHandler(  # 输出到文件
-                'video_automation.log',
-                mode='a',
-                encoding='utf-8'
-            )
-        ]
+    formatter = logging.Formatter(log_format, datefmt=date_format)
+
+    # 输出到控制台
+    console_handler = logging.StreamHandler(sys.stdout)
+    console_handler.setFormatter(formatter)
+
+    # 输出到文件（按大小轮转）
+    file_handler = RotatingFileHandler(
+        config.LOG_FILE,
+        mode='a',
+        maxBytes=config.LOG_MAX_BYTES,
+        backupCount=config.LOG_BACKUP_COUNT,
+        encoding='utf-8'
     )
+    file_handler.setFormatter(logging.Formatter(log_format, datefmt='%Y-%m-%d %H:%M:%S'))
+
+    handlers = [console_handler, file_handler]
+
+    # 输出结构化 JSON Lines（按大小轮转）
+    if config.LOG_JSON_FILE:
+        json_handler = RotatingFileHandler(
+            config.LOG_JSON_FILE,
+            mode='a',
+            maxBytes=config.LOG_MAX_BYTES,
+            backupCount=config.LOG_BACKUP_COUNT,
+            encoding='utf-8'
+        )
+        json_handler.setFormatter(JsonLinesFormatter())
+        handlers.append(json_handler)
+
+    # 配置根日志器：只挂一个非阻塞的 QueueHandler
+    log_queue = queue.SimpleQueue()
+    queue_handler = StructuredQueueHandler(log_queue)
+    queue_handler.addFilter(ContextFilter())
+
+    root_logger = logging.getLogger()
+    root_logger.setLevel(log_level)
+    for handler in root_logger.handlers[:]:
+        root_logger.removeHandler(handler)
+    root_logger.addHandler(queue_handler)
+
+    listener = QueueListener(log_queue, *handlers, respect_handler_level=True)
+    listener.start()
+    # 退出时把队列中剩余的日志写完
+    atexit.register(listener.stop)
 
     # 设置第三方库的日志级别（避免过多输出）
     logging.getLogger('playwright').setLevel(logging.WARNING)
@@ -68,13 +325,26 @@ def print_banner():
     print(banner)
 
 
-def print_disclaimer() -> bool:
+def print_disclaimer(config: Config, accept: bool = False) -> bool:
     """
     打印免责声明并获取用户确认
 
+    Args:
+        config: 配置对象
+        accept: 是否通过命令行确认（确认后保存记录）
+
     Returns:
         bool: 用户是否同意
     """
+    ack_file = Path(config.DISCLAIMER_ACK_FILE)
+    if accept:
+        ack_file.write_text(f"accepted at {datetime.now().isoformat()}\n", encoding='utf-8')
+        print("\n✅ 已确认免责声明（确认记录已保存）\n")
+        return True
+    if ack_file.exists():
+        print(f"\n✅ 已确认免责声明（{ack_file}）\n")
+        return True
+
     disclaimer = """
     ╔═══════════════════════════════════════════════════════════╗
     ║                                                           ║
@@ -97,6 +367,10 @@ def print_disclaimer() -> bool:
     """
     print(disclaimer)
 
+    if not config.INTERACTIVE:
+        print("❌ 无人值守模式下需要先使用 --accept-disclaimer 确认免责声明")
+        return False
+
     try:
         response = input("输入 'yes' 确认并继续，或输入其他内容退出: ").strip().lower()
         if response == 'yes':
@@ -114,9 +388,13 @@ def print_config_info(config: Config):
     """打印配置信息"""
     print("\n当前配置:")
     print(f"  基础URL: {config.VIDEO_SITE_URL}")
-    print(f"  视频数量: {len(config.VIDEO_HREF_LIST)}")
+    if config.PLAYLIST_FILE:
+        print(f"  播放列表: {config.PLAYLIST_FILE}")
+    print(f"  视频数量: {len(get_playlist(config))}")
     print(f"  无头模式: {config.HEADLESS}")
     print(f"  详细日志: {config.VERBOSE_LOGGING}")
+    print(f"  交互模式: {config.INTERACTIVE}")
+    print(f"  失败策略: {config.FAILURE_POLICY}")
     print()
 
 
@@ -135,9 +413,15 @@ def check_config(config: Config) -> bool:
         print("   请将其修改为实际的视频学习网站URL\n")
         return False
 
-    if not config.VIDEO_HREF_LIST:
-        print("\n⚠️  警告: VIDEO_HREF_LIST 为空！")
-        print("   请在 config.py 中配置要播放的视频列表")
+    try:
+        playlist = get_playlist(config)
+    except OSError as e:
+        print(f"\n⚠️  警告: {e}\n")
+        return False
+
+    if not playlist:
+        print("\n⚠️  警告: 播放列表为空！")
+        print("   请在 config.py 中配置要播放的视频列表，或使用 --playlist / PLAYLIST_FILE 指定列表文件")
         print("\n   示例:")
         print("   VIDEO_HREF_LIST = [")
         print("       '/course/video/1',")
@@ -145,6 +429,9 @@ def check_config(config: Config) -> bool:
         print("   ]")
         print()
 
+        if not config.INTERACTIVE:
+            return False
+
         response = input("是否继续（用于测试）？(y/n): ").strip().lower()
         if response != 'y':
             return False
@@ -152,6 +439,196 @@ def check_config(config: Config) -> bool:
     return True
 
 
+async def run_discover(config: Config, args: argparse.Namespace) -> int:
+    """
+    执行 discover 子命令
+
+    Args:
+        config: 配置对象
+        args: 命令行参数
+
+    Returns:
+        int: 进程退出码
+    """
+    catalogs = args.catalog or config.COURSE_CATALOG_HREFS
+    if not catalogs:
+        print("\n⚠️  没有目录页可供发现，请使用 --catalog 或在 config.py 中配置 COURSE_CATALOG_HREFS\n")
+        return 1
+
+    output = args.output or config.DISCOVERED_PLAYLIST_FILE
+
+    from video_automator import VideoAutomator
+
+    automator = VideoAutomator(config)
+    playlist = await automator.discover_playlist(catalogs, output, full=args.full)
+    if not playlist:
+        print("\n❌ 未发现任何视频\n")
+        return 1
+
+    print(f"\n✅ 发现 {len(playlist)} 个视频，已写入 {output}")
+    print(f"   使用: python main.py --playlist {output}\n")
+    return 0
+
+
+def run_check(config: Config) -> int:
+    """
+    执行 --check：校验配置和播放列表，不导入 Playwright
+
+    Args:
+        config: 已合并命令行参数的配置对象
+
+    Returns:
+        int: 进程退出码，配置有问题时为 1
+    """
+    # 校验模式不做任何交互
+    config.INTERACTIVE = False
+
+    print_config_info(config)
+    if not check_config(config):
+        print("❌ 配置检查未通过")
+        return 1
+
+    if config.AUTO_LOGIN_ENABLED:
+        missing = [
+            name for name in ("LOGIN_USERNAME", "LOGIN_PASSWORD", "CAPTCHA_API_KEY", "CAPTCHA_API_BASE_URL")
+            if not getattr(config, name)
+        ]
+        if missing:
+            print(f"⚠️  自动登录配置不完整，缺少: {', '.join(missing)}，运行时将降级为手动登录")
+
+    print("✅ 配置检查通过")
+    return 0
+
+
+def run_ctl(config: Config, args: argparse.Namespace) -> int:
+    """
+    执行 ctl 子命令：向运行中的会话发送一条控制命令
+
+    Args:
+        config: 配置对象
+        args: 命令行参数
+
+    Returns:
+        int: 进程退出码
+    """
+    path = args.socket or config.CONTROL_SOCKET
+    if not path:
+        print("❌ 未配置控制 socket (CONTROL_SOCKET)")
+        return 2
+
+    request = {"cmd": args.action}
+    if args.action == "enqueue":
+        hrefs = list(args.hrefs)
+        if args.from_file:
+            hrefs.extend(iter_playlist(args.from_file))
+        if not hrefs:
+            print("❌ enqueue 需要至少一个 href")
+            return 2
+        request["hrefs"] = hrefs
+
+    try:
+        response = send_command(path, request)
+    except (OSError, ValueError) as e:
+        print(f"❌ 无法连接到运行中的会话 ({path}): {e}")
+        return 1
+
+    if not response.get("ok"):
+        print(f"❌ {response.get('error')}")
+        return 1
+
+    if args.action == "state":
+        print(json.dumps(response["state"], ensure_ascii=False, indent=2))
+    elif args.action == "enqueue":
+        print(f"✅ 已追加 {len(response['video_indices'])} 个视频，序号: {response['video_indices']}")
+    elif args.action == "skip":
+        print(f"✅ 已跳过视频 {response['skipped']}")
+    else:
+        print(f"✅ {'已暂停（当前视频结束后生效）' if response['paused'] else '已继续'}")
+    return 0
+
+
+async def run_check_selectors(config: Config, args: argparse.Namespace) -> int:
+    """
+    执行 check-selectors 子命令：在页面快照语料库上检查选择器漂移
+
+    Args:
+        config: 配置对象
+        args: 命令行参数
+
+    Returns:
+        int: 进程退出码，有选择器失效时为 1
+    """
+    from playwright.async_api import async_playwright
+    from selector_drift import SelectorDriftChecker, load_corpus
+
+    directory = args.corpus or config.SELECTOR_CORPUS_DIR
+    corpus = load_corpus(directory)
+    if not corpus:
+        print(f"\n⚠️  {directory} 中没有页面快照（文件名需包含 login / play_page / dialog / complete）")
+        print("   可用 --record-har 录制一次，再用 --corpus 指定录制包目录\n")
+        return 1
+
+    print(f"\n页面快照: {', '.join(f'{kind} × {len(paths)}' for kind, paths in corpus.items())}")
+
+    checker = SelectorDriftChecker(config)
+    async with async_playwright() as p:
+        browser = await p.chromium.launch(headless=True, channel="chrome")
+        try:
+            context = await browser.new_context()
+            result = await checker.check_corpus(context, corpus, update_baseline=args.update_baseline)
+        finally:
+            await browser.close()
+
+    for key, count in result["checked"].items():
+        print(f"  已检查 {key}: {count} 个快照")
+    if result["skipped"]:
+        print(f"  未检查（缺少对应页面的快照）: {', '.join(result['skipped'])}")
+    for note in result["notes"]:
+        print(f"  ⚠️  {note}")
+
+    if args.update_baseline:
+        print(f"\n基线已写入 {checker.baseline_path}")
+
+    if not result["ok"]:
+        print("\n❌ 选择器漂移:")
+        for problem in result["problems"]:
+            print(problem)
+        print()
+        return 1
+
+    print("\n✅ 所有选择器在快照上均能匹配\n")
+    return 0
+
+
+def run_report(config: Config, args: argparse.Namespace) -> int:
+    """
+    执行 report 子命令：输出运行历史对比报告
+
+    Args:
+        config: 配置对象
+        args: 命令行参数
+
+    Returns:
+        int: 进程退出码
+    """
+    from run_history import build_report, connect
+
+    path = args.db or config.RUN_HISTORY_DB
+    if not path or not Path(path).is_file():
+        print(f"❌ 没有运行历史数据库: {path or '(未配置 RUN_HISTORY_DB)'}")
+        return 1
+    if args.runs <= 0:
+        print("❌ --runs 必须大于 0")
+        return 2
+
+    connection = connect(path)
+    try:
+        print("\n".join(build_report(connection, runs=args.runs)))
+    finally:
+        connection.close()
+    return 0
+
+
 def print_usage_tips():
     """打印使用提示"""
     print("\n使用流程:")
@@ -165,71 +642,118 @@ def print_usage_tips():
     print()
 
 
-async def main():
-    """主函数"""
+async def main(argv=None) -> int:
+    """
+    主函数
+
+    Args:
+        argv: 命令行参数列表，为None时使用 sys.argv
+
+    Returns:
+        int: 进程退出码
+    """
+    args = parse_args(argv)
+
+    # ctl 和 report 不启动浏览器，也不需要横幅和免责声明
+    if args.command in ("ctl", "report"):
+        try:
+            config = load_config(args.config, args.env_file)
+        except (OSError, ValueError) as e:
+            print(f"\n❌ 参数错误: {e}")
+            return 2
+        return run_ctl(config, args) if args.command == "ctl" else run_report(config, args)
+
     # 打印启动横幅
     print_banner()
 
-    # 显示免责声明并获取确认
-    if not print_disclaimer():
-        return
+    # 加载配置: config.py 默认值 < config.toml < .env < 环境变量 < 命令行参数
+    try:
+        config = load_config(args.config, args.env_file)
+        apply_args(config, args)
+        get_playlist(config)  # 提前校验播放列表文件存在
+    except (OSError, ValueError) as e:
+        print(f"\n❌ 参数错误: {e}")
+        return 2
 
-    # 加载配置
-    config = Config()
+    if args.check:
+        return run_check(config)
+
+    # 显示免责声明并获取确认
+    if not print_disclaimer(config, accept=args.accept_disclaimer):
+        return 1
 
     # 配置日志
-    setup_logging(verbose=config.VERBOSE_LOGGING)
+    setup_logging(verbose=config.VERBOSE_LOGGING, level=args.log_level, config=config)
 
     logger = logging.getLogger(__name__)
     logger.info("视频自动化脚本启动...")
 
+    if args.command == "discover":
+        return await run_discover(config, args)
+
+    if args.command == "check-selectors":
+        return await run_check_selectors(config, args)
+
     # 打印配置信息
     print_config_info(config)
 
     # 检查配置
     if not check_config(config):
         print_usage_tips()
-        return
+        return 1
 
     # 打印使用提示
     print_usage_tips()
 
     # 确认开始
-    try:
-        print("准备启动浏览器...")
-        response = input("按回车开始，或输入 'q' 退出: ").strip().lower()
-        if response == 'q':
-            print("已取消")
-            return
-    except KeyboardInterrupt:
-        print("\n已取消")
-        return
+    if config.INTERACTIVE:
+        try:
+            print("准备启动浏览器...")
+            response = input("按回车开始，或输入 'q' 退出: ").strip().lower()
+            if response == 'q':
+                print("已取消")
+                return 0
+        except KeyboardInterrupt:
+            print("\n已取消")
+            return 0
 
     print("\n正在启动浏览器...\n")
 
     # 创建并启动自动化器
+    exit_code = 0
     try:
+        from video_automator import VideoAutomator
+
         automator = VideoAutomator(config)
         await automator.start()
 
-        print("\n✅ 自动化完成！")
+        if automator.shutdown_signal is not None:
+            print("\n⚠️  已中断，进度已保存")
+            logger.info("收到退出信号，脚本已停止")
+            exit_code = 128 + automator.shutdown_signal
+        else:
+            print("\n✅ 自动化完成！")
 
     except KeyboardInterrupt:
         print("\n\n⚠️  用户中断")
         logger.info("用户手动中断脚本")
+        exit_code = 130
 
     except Exception as e:
         print(f"\n❌ 发生错误: {e}")
         logger.error(f"脚本运行出错: {e}", exc_info=True)
+        exit_code = 1
 
     finally:
         print("\n感谢使用！\n")
 
+    return exit_code
+
 
 if __name__ == "__main__":
     try:
         # 运行主函数
-        asyncio.run(main())
+        sys.exit(asyncio.run(main()))
 
     except KeyboardInterrupt:
         print("\n\n程序已退出")
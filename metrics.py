@@ -0,0 +1,304 @@
+"""
+运行指标模块
+汇总长时间运行时的计数器，并通过本地 HTTP 端点以 Prometheus 文本格式输出
+"""
+
+import asyncio
+import logging
+import os
+import time
+from collections import defaultdict
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+from process_tree import descendant_pids
+
+logger = logging.getLogger(__name__)
+
+# 可选依赖：非 Linux 系统上用 psutil 统计浏览器内存
+try:
+    import psutil
+    PSUTIL_AVAILABLE = True
+except ImportError:
+    PSUTIL_AVAILABLE = False
+
+# 阶段耗时直方图的桶上限 (秒)
+PHASE_BUCKETS = (1, 5, 10, 30, 60, 300, 900, 1800, 3600, 7200)
+
+# render() 中固定输出的指标名，register() 不允许重名
+FIXED_METRICS = (
+    "video_automation_uptime_seconds",
+    "video_automation_videos_total",
+    "video_automation_videos_done_total",
+    "video_automation_videos_failed_total",
+    "video_automation_retries_total",
+    "video_automation_current_video",
+    "video_automation_progress_percent",
+    "video_automation_current_time_seconds",
+    "video_automation_duration_seconds",
+    "video_automation_eta_seconds",
+    "video_automation_popups_handled_total",
+    "video_automation_cdp_calls_total",
+    "video_automation_errors_total",
+    "video_automation_browser_rss_bytes",
+    "video_automation_phase_seconds",
+)
+
+
+class PhaseHistogram:
+    """单个阶段的耗时直方图"""
+
+    def __init__(self, buckets=PHASE_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.count = 0
+        self.total = 0.0
+
+    def observe(self, value: float):
+        """记录一次耗时"""
+        self.count += 1
+        self.total += value
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+
+
+class Metrics:
+    """运行指标 - 由 VideoAutomator 在关键位置更新"""
+
+    def __init__(self):
+        self.started_at = time.time()
+
+        self.videos_total = 0
+        self.videos_done = 0
+        self.videos_failed = 0
+        self.retries = 0
+
+        self.current_video_index = 0
+        self.current_href = ""
+        self.progress = 0.0
+        self.current_time = 0.0
+        self.duration = 0.0
+        self.eta_seconds = 0.0
+
+        self.popups_handled: Dict[str, int] = defaultdict(int)
+        self.cdp_calls: Dict[str, int] = defaultdict(int)
+        self.errors: Dict[str, int] = defaultdict(int)
+        self.phases: Dict[str, PhaseHistogram] = {}
+
+        # 其他模块注册的指标: 指标名 -> (类型, 说明, 取值回调)，渲染时读取
+        self.registered: Dict[str, tuple] = {}
+
+    def register(self, name: str, kind: str, help_text: str, getter: Callable[[], object]):
+        """
+        注册一个由其他模块提供数值的指标
+
+        Args:
+            name: 完整指标名（counter 须以 _total 结尾）
+            kind: "counter" 或 "gauge"
+            help_text: 指标说明
+            getter: 返回数值，或 [(标签字典, 数值), ...] 的回调
+
+        Raises:
+            ValueError: 指标名重复或不符合命名约定
+        """
+        if kind not in ("counter", "gauge"):
+            raise ValueError(f"不支持的指标类型: {kind}")
+        if kind == "counter" and not name.endswith("_total"):
+            raise ValueError(f"counter 指标名应以 _total 结尾: {name}")
+        if name in FIXED_METRICS or name in self.registered:
+            raise ValueError(f"指标名重复: {name}")
+        self.registered[name] = (kind, help_text, getter)
+
+    def set_current(self, video_index: int, href: str):
+        """设置当前正在播放的视频"""
+        self.current_video_index = video_index
+        self.current_href = href
+        self.progress = 0.0
+        self.current_time = 0.0
+        self.duration = 0.0
+
+    def set_progress(self, progress: float, current_time: float, duration: float):
+        """更新播放进度"""
+        self.progress = progress
+        self.current_time = current_time
+        self.duration = duration
+
+    def popup_handled(self, selector: str):
+        """记录一次弹窗处理"""
+        self.popups_handled[selector] += 1
+
+    def cdp_call(self, method: str, count: int = 1):
+        """记录页面调用（每次都是一次与浏览器的往返）"""
+        self.cdp_calls[method] += count
+
+    def error(self, kind: str):
+        """记录一次分类后的错误"""
+        self.errors[kind] += 1
+
+    def observe_phase(self, phase: str, latency: float):
+        """记录阶段耗时"""
+        if phase not in self.phases:
+            self.phases[phase] = PhaseHistogram()
+        self.phases[phase].observe(latency)
+
+    def render(self) -> str:
+        """
+        以 Prometheus 文本格式输出所有指标
+
+        Returns:
+            str: 指标文本
+        """
+        lines: List[str] = []
+
+        def metric(name: str, kind: str, help_text: str, samples):
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            for labels, value in samples:
+                lines.append(f"{name}{_format_labels(labels)} {value}")
+
+        metric("video_automation_uptime_seconds", "gauge", "Seconds since start",
+               [({}, round(time.time() - self.started_at, 1))])
+        metric("video_automation_videos_total", "gauge", "Videos in the playlist",
+               [({}, self.videos_total)])
+        metric("video_automation_videos_done_total", "counter", "Videos completed",
+               [({}, self.videos_done)])
+        metric("video_automation_videos_failed_total", "counter", "Videos given up on",
+               [({}, self.videos_failed)])
+        metric("video_automation_retries_total", "counter", "Videos requeued for retry",
+               [({}, self.retries)])
+        metric("video_automation_current_video", "gauge", "Video currently playing",
+               [({"href": self.current_href}, self.current_video_index)])
+        metric("video_automation_progress_percent", "gauge", "Playback progress of the current video",
+               [({}, round(self.progress, 2))])
+        metric("video_automation_current_time_seconds", "gauge", "currentTime of the current video",
+               [({}, round(self.current_time, 1))])
+        metric("video_automation_duration_seconds", "gauge", "duration of the current video",
+               [({}, round(self.duration, 1))])
+        metric("video_automation_eta_seconds", "gauge", "Estimated time to finish the playlist",
+               [({}, round(self.eta_seconds, 1))])
+        metric("video_automation_popups_handled_total", "counter", "Popups clicked per selector",
+               [({"selector": k}, v) for k, v in sorted(self.popups_handled.items())])
+        metric("video_automation_cdp_calls_total", "counter", "Page calls sent to the browser per method",
+               [({"method": k}, v) for k, v in sorted(self.cdp_calls.items())])
+        metric("video_automation_errors_total", "counter", "Classified errors per kind",
+               [({"kind": k}, v) for k, v in sorted(self.errors.items())])
+
+        rss = browser_rss_bytes()
+        if rss is not None:
+            metric("video_automation_browser_rss_bytes", "gauge", "Resident memory of browser processes",
+                   [({}, rss)])
+
+        for name, (kind, help_text, getter) in self.registered.items():
+            try:
+                value = getter()
+            except Exception as e:
+                logger.debug(f"读取指标 {name} 失败: {e}")
+                continue
+            metric(name, kind, help_text, value if isinstance(value, list) else [({}, value)])
+
+        if self.phases:
+            name = "video_automation_phase_seconds"
+            lines.append(f"# HELP {name} Per-phase latency")
+            lines.append(f"# TYPE {name} histogram")
+            for phase, hist in sorted(self.phases.items()):
+                for bound, count in zip(hist.buckets, hist.counts):
+                    lines.append(f"{name}_bucket{_format_labels({'phase': phase, 'le': bound})} {count}")
+                lines.append(f"{name}_bucket{_format_labels({'phase': phase, 'le': '+Inf'})} {hist.count}")
+                lines.append(f"{name}_sum{_format_labels({'phase': phase})} {round(hist.total, 3)}")
+                lines.append(f"{name}_count{_format_labels({'phase': phase})} {hist.count}")
+
+        return "\n".join(lines) + "\n"
+
+
+def _format_labels(labels: dict) -> str:
+    """格式化 Prometheus 标签"""
+    if not labels:
+        return ""
+    parts = []
+    for key, value in labels.items():
+        escaped = str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+        parts.append(f'{key}="{escaped}"')
+    return "{" + ",".join(parts) + "}"
+
+
+def browser_rss_bytes() -> Optional[int]:
+    """
+    统计本进程所有子孙进程（Playwright 驱动和浏览器）的常驻内存
+
+    Returns:
+        int: 字节数，无法统计时返回 None
+    """
+    if PSUTIL_AVAILABLE:
+        try:
+            children = psutil.Process().children(recursive=True)
+            return sum(child.memory_info().rss for child in children if child.is_running())
+        except Exception:
+            return None
+
+    descendants = descendant_pids()
+    if descendants is None:
+        return None
+
+    page_size = os.sysconf("SC_PAGE_SIZE")
+    total = 0
+    for pid in descendants:
+        try:
+            total += int((Path("/proc") / str(pid) / "statm").read_text().split()[1]) * page_size
+        except (OSError, ValueError, IndexError):
+            continue
+    return total
+
+
+class MetricsServer:
+    """本地指标端点 - 只响应 GET /metrics"""
+
+    def __init__(self, metrics: Metrics, host: str = "127.0.0.1", port: int = 9464):
+        self.metrics = metrics
+        self.host = host
+        self.port = port
+        self.server: Optional[asyncio.AbstractServer] = None
+
+    async def start(self):
+        """启动 HTTP 服务"""
+        self.server = await asyncio.start_server(self._handle, self.host, self.port)
+        logger.info(f"📈 指标端点已启动: http://{self.host}:{self.port}/metrics")
+
+    async def stop(self):
+        """停止 HTTP 服务"""
+        if self.server:
+            self.server.close()
+            await self.server.wait_closed()
+            self.server = None
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        """处理单个 HTTP 请求"""
+        try:
+            request_line = await asyncio.wait_for(reader.readline(), timeout=5)
+            # 读完请求头
+            while True:
+                line = await asyncio.wait_for(reader.readline(), timeout=5)
+                if line in (b"\r\n", b"\n", b""):
+                    break
+
+            parts = request_line.decode("latin-1").split()
+            if len(parts) >= 2 and parts[0] == "GET" and parts[1].split("?")[0] == "/metrics":
+                status = "200 OK"
+                body = self.metrics.render().encode("utf-8")
+                content_type = "text/plain; version=0.0.4; charset=utf-8"
+            else:
+                status = "404 Not Found"
+                body = b"not found\n"
+                content_type = "text/plain; charset=utf-8"
+
+            writer.write(
+                f"HTTP/1.1 {status}\r\n"
+                f"Content-Type: {content_type}\r\n"
+                f"Content-Length: {len(body)}\r\n"
+                f"Connection: close\r\n\r\n".encode("latin-1") + body
+            )
+            await writer.drain()
+        except Exception as e:
+            logger.debug(f"处理指标请求时出错: {e}")
+        finally:
+            writer.close()
@@ -0,0 +1,253 @@
+"""
+网络流量统计模块
+通过 CDP Network 域统计每个视频会话的字节数和请求数，按资源类型和域名汇总，
+用于在按流量计费的网络上评估缓存和路由调整的效果
+"""
+
+import logging
+from typing import Dict, List, Optional
+from urllib.parse import urlsplit
+
+from playwright.async_api import BrowserContext, Page
+
+logger = logging.getLogger(__name__)
+
+# 不经过网络的 URL 协议
+LOCAL_SCHEMES = ("data", "blob", "about", "chrome-extension")
+
+# 报告中列出的域名数
+REPORT_TOP_HOSTS = 5
+
+
+def format_bytes(size: float) -> str:
+    """把字节数格式化为 KB / MB / GB"""
+    for unit in ("B", "KB", "MB"):
+        if abs(size) < 1024:
+            return f"{size:.0f} {unit}" if unit == "B" else f"{size:.1f} {unit}"
+        size /= 1024
+    return f"{size:.2f} GB"
+
+
+class NetworkUsage:
+    """一段时间内的流量汇总"""
+
+    def __init__(self):
+        self.bytes = 0
+        self.requests = 0
+        self.cached = 0
+        self.failed = 0
+        self.by_type: Dict[str, Dict[str, int]] = {}
+        self.by_host: Dict[str, Dict[str, int]] = {}
+
+    def add_request(self, resource_type: str, host: str):
+        self.requests += 1
+        for table, key in ((self.by_type, resource_type), (self.by_host, host)):
+            table.setdefault(key, {"bytes": 0, "requests": 0})["requests"] += 1
+
+    def add_bytes(self, resource_type: str, host: str, size: int):
+        self.bytes += size
+        for table, key in ((self.by_type, resource_type), (self.by_host, host)):
+            table.setdefault(key, {"bytes": 0, "requests": 0})["bytes"] += size
+
+    def merge(self, other: "NetworkUsage"):
+        """把另一段汇总累加到当前汇总"""
+        self.bytes += other.bytes
+        self.requests += other.requests
+        self.cached += other.cached
+        self.failed += other.failed
+        for mine, theirs in ((self.by_type, other.by_type), (self.by_host, other.by_host)):
+            for key, counts in theirs.items():
+                entry = mine.setdefault(key, {"bytes": 0, "requests": 0})
+                entry["bytes"] += counts["bytes"]
+                entry["requests"] += counts["requests"]
+
+    def to_dict(self) -> dict:
+        """可序列化为 JSON 的汇总，按字节数从大到小排列"""
+        def ordered(table):
+            return dict(sorted(table.items(), key=lambda item: -item[1]["bytes"]))
+
+        return {
+            "bytes": self.bytes,
+            "requests": self.requests,
+            "cached": self.cached,
+            "failed": self.failed,
+            "by_type": ordered(self.by_type),
+            "by_host": ordered(self.by_host),
+        }
+
+    def describe(self) -> str:
+        """一行摘要，如 "812.3 MB / 356 个请求 (Media 800.1 MB, Script 6.2 MB, ...)" """
+        top = sorted(self.by_type.items(), key=lambda item: -item[1]["bytes"])[:4]
+        parts = ", ".join(f"{name} {format_bytes(counts['bytes'])}" for name, counts in top)
+        return f"{format_bytes(self.bytes)} / {self.requests} 个请求" + (f" ({parts})" if parts else "")
+
+
+class NetworkCollector:
+    """CDP 网络流量采集器 - 每个页面一个 CDP 会话，按视频累计"""
+
+    def __init__(self, config):
+        """
+        Args:
+            config: 配置对象（NETWORK_ACCOUNTING）
+        """
+        self.enabled = config.NETWORK_ACCOUNTING
+        self.total = NetworkUsage()
+        self.videos: List[dict] = []
+
+        self.current: Optional[NetworkUsage] = None
+        self.current_video: Optional[tuple] = None
+        # 进行中的请求: requestId -> [资源类型, 域名, 已收到字节数]
+        self._pending: Dict[str, list] = {}
+
+    async def attach(self, context: BrowserContext, page: Page):
+        """
+        在页面上开启 CDP Network 域（页面因崩溃被替换后需要重新调用）
+
+        Args:
+            context: 页面所属的浏览器上下文
+            page: 页面
+        """
+        if not self.enabled:
+            return
+
+        try:
+            session = await context.new_cdp_session(page)
+            session.on("Network.requestWillBeSent", self._on_request)
+            session.on("Network.requestServedFromCache", self._on_served_from_cache)
+            session.on("Network.dataReceived", self._on_data)
+            session.on("Network.loadingFinished", self._on_finished)
+            session.on("Network.loadingFailed", self._on_failed)
+            await session.send("Network.enable")
+        except Exception as e:
+            # 非 Chromium 浏览器不支持 CDP
+            logger.warning(f"无法开启网络流量统计，已关闭: {e}")
+            self.enabled = False
+
+    def start_video(self, video_index: int, href: str):
+        """开始统计一个视频会话"""
+        if not self.enabled:
+            return
+        self.current = NetworkUsage()
+        self.current_video = (video_index, href)
+        self._pending = {}
+
+    def finish_video(self, completed: bool) -> Optional[dict]:
+        """
+        结束当前视频会话的统计（页面和上下文关闭之后调用）
+
+        Args:
+            completed: 视频是否播放完成
+
+        Returns:
+            dict: 该视频的流量汇总，未开启统计时返回 None
+        """
+        if self.current is None:
+            return None
+
+        usage, (video_index, href) = self.current, self.current_video
+        self.current = None
+        self.current_video = None
+        # 被取消但没有收到结束事件的请求，按已收到的字节计入
+        for resource_type, host, received in self._pending.values():
+            usage.add_bytes(resource_type, host, received)
+        self._pending = {}
+
+        if not self.enabled:
+            return None
+
+        self.total.merge(usage)
+        entry = {"video_index": video_index, "href": href, "completed": completed, **usage.to_dict()}
+        self.videos.append(entry)
+        logger.info(f"📶 视频 {video_index} 流量: {usage.describe()}")
+        return entry
+
+    def _on_request(self, params: dict):
+        if self.current is None:
+            return
+        url = params.get("request", {}).get("url", "")
+        parts = urlsplit(url)
+        if parts.scheme in LOCAL_SCHEMES:
+            return
+
+        request_id = params["requestId"]
+        # 重定向复用同一个 requestId，上一跳的响应头计入上一跳
+        redirect = params.get("redirectResponse")
+        if redirect and request_id in self._pending:
+            resource_type, host, received = self._pending[request_id]
+            self.current.add_bytes(resource_type, host, max(received, int(redirect.get("encodedDataLength", 0))))
+
+        resource_type = params.get("type") or "Other"
+        host = parts.hostname or parts.scheme
+        self._pending[request_id] = [resource_type, host, 0]
+        self.current.add_request(resource_type, host)
+
+    def _on_served_from_cache(self, params: dict):
+        if self.current is not None and params["requestId"] in self._pending:
+            self.current.cached += 1
+
+    def _on_data(self, params: dict):
+        entry = self._pending.get(params["requestId"])
+        if entry is not None:
+            entry[2] += int(params.get("encodedDataLength", 0))
+
+    def _on_finished(self, params: dict):
+        entry = self._pending.pop(params["requestId"], None)
+        if entry is None or self.current is None:
+            return
+        resource_type, host, received = entry
+        # encodedDataLength 包含响应头，是实际经过网络的总字节数
+        self.current.add_bytes(resource_type, host, max(received, int(params.get("encodedDataLength", 0))))
+
+    def _on_failed(self, params: dict):
+        entry = self._pending.pop(params["requestId"], None)
+        if entry is None or self.current is None:
+            return
+        resource_type, host, received = entry
+        self.current.failed += 1
+        self.current.add_bytes(resource_type, host, received)
+
+    def get_state(self) -> dict:
+        """
+        返回流量统计状态（写入进度文件和 ctl state）
+
+        Returns:
+            dict: 总计、当前视频的实时统计和每个已结束视频的汇总
+        """
+        return {
+            "total": self.total.to_dict(),
+            "current": self.current.to_dict() if self.current is not None else None,
+            "videos": self.videos,
+        }
+
+    def get_statistics(self) -> dict:
+        """
+        获取流量统计信息（供 Prometheus 指标使用）
+
+        Returns:
+            dict: 统计信息
+        """
+        current = self.current or NetworkUsage()
+        return {
+            "network_bytes": self.total.bytes + current.bytes,
+            "network_requests": self.total.requests + current.requests,
+        }
+
+    def report_lines(self) -> List[str]:
+        """运行结束时的流量报告"""
+        if not self.videos:
+            return []
+
+        lines = [f"流量合计: {self.total.describe()}"]
+        for entry in self.videos:
+            media = entry["by_type"].get("Media", {}).get("bytes", 0)
+            status = "" if entry["completed"] else " (未完成)"
+            lines.append(
+                f"  - 视频 {entry['video_index']}{status}: {format_bytes(entry['bytes'])}，"
+                f"媒体 {format_bytes(media)}，{entry['requests']} 个请求（缓存命中 {entry['cached']}）"
+            )
+        hosts = list(self.total.to_dict()["by_host"].items())[:REPORT_TOP_HOSTS]
+        if hosts:
+            lines.append("  流量最大的域名: " + ", ".join(
+                f"{host} {format_bytes(counts['bytes'])}" for host, counts in hosts
+            ))
+        return lines
@@ -0,0 +1,70 @@
+"""
+播放列表模块
+负责从外部文件加载视频 href 列表
+"""
+
+import logging
+from pathlib import Path
+from typing import Iterator, List, Union
+
+logger = logging.getLogger(__name__)
+
+
+def iter_playlist(path: str) -> Iterator[str]:
+    """
+    逐行读取播放列表文件
+
+    文件格式: 每行一个相对路径 href，空行和以 # 开头的行会被忽略
+
+    Args:
+        path: 播放列表文件路径
+
+    Yields:
+        str: href
+    """
+    with Path(path).open('r', encoding='utf-8') as f:
+        for line in f:
+            href = line.strip()
+            if not href or href.startswith('#'):
+                continue
+            yield href
+
+
+class FilePlaylist:
+    """基于文件的播放列表 - 每次迭代都重新流式读取文件，不把整个列表放入内存"""
+
+    def __init__(self, path: str):
+        """
+        Args:
+            path: 播放列表文件路径
+        """
+        self.path = Path(path)
+        if not self.path.is_file():
+            raise FileNotFoundError(f"播放列表文件不存在: {self.path}")
+
+    def __iter__(self) -> Iterator[str]:
+        return iter_playlist(str(self.path))
+
+    def __len__(self) -> int:
+        return sum(1 for _ in self)
+
+    def __bool__(self) -> bool:
+        return next(iter(self), None) is not None
+
+    def __repr__(self) -> str:
+        return f"FilePlaylist({str(self.path)!r})"
+
+
+def get_playlist(config) -> Union[FilePlaylist, List[str]]:
+    """
+    返回本次运行使用的播放列表：配置了 PLAYLIST_FILE 时流式读取该文件，否则使用 VIDEO_HREF_LIST
+
+    Args:
+        config: 配置对象
+
+    Returns:
+        可重复迭代、支持 len() 的 href 序列
+    """
+    if config.PLAYLIST_FILE:
+        return FilePlaylist(config.PLAYLIST_FILE)
+    return config.VIDEO_HREF_LIST
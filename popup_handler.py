@@ -1,240 +1,457 @@
 """
 弹窗处理模块
-负责检测和处理页面中的弹窗（确认、继续等类型）
+按 Config.POPUP_RULES 规则表统一处理所有弹窗（进入页面、播放中、播放完成）：
+每次检测只在页面内执行一次脚本，按优先级匹配所有规则，并对点击做去抖
 """
 
 import asyncio
+import json
 import logging
-from typing import List, Optional
+import re
+from typing import Awaitable, Callable, Dict, List, Optional
+
 from playwright.async_api import Page
 
 logger = logging.getLogger(__name__)
 
+# 规则支持的动作: 点击匹配到的元素 / 按 ESC 键 / 只报告（由调用方处理）
+ACTIONS = ("click", "escape", "report")
 
-class PopupHandler:
-    """弹窗处理器 - 自动检测并关闭弹窗"""
+# 点击后等待弹窗消失的时间 (秒)
+CLICK_SETTLE_SECONDS = 1
 
-    def __init__(self, config):
-        """
-        初始化弹窗处理器
+# 点击的超时时间 (毫秒)
+CLICK_TIMEOUT_MS = 5000
 
-        Args:
-            config: 配置对象，包含弹窗选择器等信息
-        """
-        self.config = config
-        self.monitoring = False
-        self.popup_count = 0
-        logger.info("弹窗处理器初始化完成")
+# 匹配到的元素上标记的属性，点击时据此定位，也用于识别同一个弹窗
+ELEMENT_ID_ATTRIBUTE = "data-va-popup-id"
 
-    async def detect_popup(self, page: Page) -> Optional[any]:
-        """
-        检测页面中是否存在弹窗
+_HAS_TEXT_PATTERN = re.compile(r""":has-text\((['"])(.*?)\1\)$""")
 
-        Args:
-            page: Playwright Page 对象
+# 弹窗监视脚本在 DOM 变化后最多每隔这么久匹配一次 (毫秒)
+WATCH_THROTTLE_MS = 250
 
-        Returns:
-            弹窗元素，如果没有则返回 None
-        """
-        try:
-            # 遍历所有可能的弹窗选择器
-            for selector in self.config.POPUP_SELECTORS:
-                try:
-                    popup = await page.query_selector(selector)
-                    if popup:
-                        # 检查弹窗是否可见
-                        is_visible = await popup.is_visible()
-                        if is_visible:
-                            logger.debug(f"检测到弹窗: {selector}")
-                            return popup
-                except Exception as e:
-                    logger.debug(f"检查选择器 {selector} 时出错: {e}")
-                    continue
+# 页面内匹配用到的公共函数（匹配脚本和监视脚本共用）
+_MATCH_HELPERS_JS = """
+    const normalize = s => (s || '').replace(/\\s+/g, ' ').trim().toLowerCase();
+    const visible = el => {
+        const rect = el.getBoundingClientRect();
+        return rect.width > 0 && rect.height > 0 && getComputedStyle(el).visibility !== 'hidden';
+    };
+    const find = m => {
+        if (m.xpath) {
+            const result = document.evaluate(m.xpath, document, null, XPathResult.ORDERED_NODE_SNAPSHOT_TYPE, null);
+            return Array.from({length: result.snapshotLength}, (_, i) => result.snapshotItem(i));
+        }
+        return Array.from(document.querySelectorAll(m.css));
+    };
+    const matches = (el, m) => el instanceof Element && visible(el)
+        && (!m.text || normalize(el.innerText || el.textContent).includes(m.text));
+"""
 
+# 页面内的匹配脚本: 按规则优先级依次查找第一个可见、未在去抖期内的元素
+POPUP_CHECK_JS = """
+({rules, skip}) => {
+    const debounced = new Set(skip);
+    %(helpers)s
+    window.__vaPopupPrefix = window.__vaPopupPrefix || Math.random().toString(36).slice(2, 8);
+    const errors = [];
+    for (const rule of rules) {
+        for (const m of rule.matchers) {
+            let elements;
+            try {
+                elements = find(m);
+            } catch (e) {
+                errors.push(m.selector);
+                continue;
+            }
+            for (const el of elements) {
+                if (!matches(el, m)) continue;
+                if (!el.hasAttribute('%(attribute)s')) {
+                    window.__vaPopupSeq = (window.__vaPopupSeq || 0) + 1;
+                    el.setAttribute('%(attribute)s', window.__vaPopupPrefix + '-' + window.__vaPopupSeq);
+                }
+                const id = el.getAttribute('%(attribute)s');
+                if (debounced.has(id)) continue;
+                const text = (el.innerText || el.textContent || '').trim().slice(0, 40);
+                return {rule: rule.name, selector: m.selector, id, text, errors};
+            }
+        }
+    }
+    return {rule: null, errors};
+}
+""" % {"attribute": ELEMENT_ID_ATTRIBUTE, "helpers": _MATCH_HELPERS_JS}
+
+# 页面内的弹窗监视脚本（作为初始化脚本注入）: DOM 变化后节流匹配，
+# 有新的匹配元素出现时才调用绑定通知 Python，没有弹窗时不产生任何页面调用
+POPUP_WATCH_JS = """
+((rules, binding) => {
+    %(helpers)s
+    let shown = new Set();
+    let timer = null;
+    const scan = () => {
+        timer = null;
+        const current = new Set();
+        for (const rule of rules) {
+            for (const m of rule.matchers) {
+                let elements = [];
+                try {
+                    elements = find(m);
+                } catch (e) {}
+                elements.filter(el => matches(el, m)).forEach(el => current.add(el));
+            }
+        }
+        const appeared = [...current].some(el => !shown.has(el));
+        shown = current;
+        if (appeared && window[binding]) window[binding]().catch(() => {});
+    };
+    const schedule = () => {
+        if (timer === null) timer = setTimeout(scan, %(throttle)d);
+    };
+    const start = () => {
+        new MutationObserver(schedule).observe(document.documentElement, {
+            childList: true, subtree: true, attributes: true,
+            attributeFilter: ['style', 'class', 'hidden', 'open'],
+        });
+        schedule();
+    };
+    if (document.documentElement) start(); else document.addEventListener('DOMContentLoaded', start);
+})
+""" % {"helpers": _MATCH_HELPERS_JS, "throttle": WATCH_THROTTLE_MS}
+
+
+def _split_selector_list(selector: str) -> List[str]:
+    """按顶层逗号拆分选择器列表（忽略括号和引号中的逗号）"""
+    parts, depth, quote, start = [], 0, None, 0
+    for i, char in enumerate(selector):
+        if quote:
+            if char == quote:
+                quote = None
+        elif char in "'\"":
+            quote = char
+        elif char in "([":
+            depth += 1
+        elif char in ")]":
+            depth -= 1
+        elif char == "," and depth == 0:
+            parts.append(selector[start:i].strip())
+            start = i + 1
+    parts.append(selector[start:].strip())
+    return [part for part in parts if part]
+
+
+def compile_selector(selector: str) -> Optional[List[dict]]:
+    """
+    把 Playwright 选择器转换为页面内可执行的匹配条件
+
+    支持 XPath（xpath= 前缀或以 / 开头）、CSS 以及末尾的 :has-text('...')
+
+    Args:
+        selector: Playwright 选择器
+
+    Returns:
+        List[dict]: 匹配条件列表，任意一个匹配即可；无法转换时返回 None（回退到 Playwright 查询）
+    """
+    text = selector.strip()
+    if text.startswith("xpath="):
+        return [{"selector": selector, "xpath": text[len("xpath="):]}]
+    if text.startswith(("/", "(")):
+        return [{"selector": selector, "xpath": text}]
+    if text.startswith("css="):
+        text = text[len("css="):]
+    elif re.match(r"^[a-z_-]+=", text):
+        # text=、id= 等 Playwright 专用引擎
+        return None
+
+    matchers = []
+    for part in _split_selector_list(text):
+        match = _HAS_TEXT_PATTERN.search(part)
+        css, has_text = (part[:match.start()], match.group(2)) if match else (part, "")
+        if ">>" in css or ":has-text(" in css or ":text" in css or ":visible" in css:
             return None
+        matchers.append({
+            "selector": selector,
+            "css": css or "*",
+            "text": " ".join(has_text.split()).lower(),
+        })
+    return matchers
 
-        except Exception as e:
-            logger.error(f"检测弹窗时出错: {e}")
-            return None
 
-    async def find_close_button(self, page: Page) -> Optional[any]:
+class PopupRule:
+    """一条弹窗规则"""
+
+    def __init__(
+        self,
+        name: str,
+        selectors: List[str],
+        action: str = "click",
+        phases: tuple = (),
+        cooldown: float = 0,
+        priority: int = 0,
+        snapshot: str = "",
+    ):
+        """
+        Args:
+            name: 规则名（日志和统计使用）
+            selectors: 匹配的选择器，任意一个匹配即可
+            action: 匹配后的动作，见 ACTIONS
+            phases: 规则生效的阶段
+            cooldown: 同一规则两次动作的最小间隔(秒)，点击过的元素在此期间不再点击
+            priority: 优先级，大的先匹配
+            snapshot: 动作前保存的 DOM 快照类型（HAR 录制时使用），为空则不保存
         """
-        查找弹窗的关闭/确认按钮
+        if action not in ACTIONS:
+            raise ValueError(f"弹窗规则 {name}: 未知动作 {action!r}，可用动作: {', '.join(ACTIONS)}")
+        if not selectors:
+            raise ValueError(f"弹窗规则 {name}: 没有选择器")
+
+        self.name = name
+        self.selectors = list(selectors)
+        self.action = action
+        self.phases = tuple(phases)
+        self.cooldown = cooldown
+        self.priority = priority
+        self.snapshot = snapshot
+
+        # 能在页面内执行的匹配条件，其余选择器回退到 Playwright 逐个查询
+        self.matchers: List[dict] = []
+        self.fallback_selectors: List[str] = []
+        for selector in self.selectors:
+            compiled = compile_selector(selector)
+            if compiled is None:
+                self.fallback_selectors.append(selector)
+            else:
+                self.matchers.extend(compiled)
+
+    @classmethod
+    def from_config(cls, config, entry: dict) -> "PopupRule":
+        """
+        从 Config.POPUP_RULES 中的一项创建规则
 
         Args:
-            page: Playwright Page 对象
+            config: 配置对象（selectors 为配置项名时从中读取）
+            entry: 规则定义
 
         Returns:
-            按钮元素，如果没有则返回 None
+            PopupRule: 弹窗规则
         """
         try:
-            # 遍历所有可能的关闭按钮选择器
-            for selector in self.config.POPUP_CLOSE_SELECTORS:
-                try:
-                    button = await page.query_selector(selector)
-                    if button:
-                        is_visible = await button.is_visible()
-                        if is_visible:
-                            logger.debug(f"找到关闭按钮: {selector}")
-                            return button
-                except Exception as e:
-                    logger.debug(f"检查按钮选择器 {selector} 时出错: {e}")
-                    continue
+            name = entry["name"]
+            selectors = entry["selectors"]
+        except (KeyError, TypeError) as e:
+            raise ValueError(f"弹窗规则缺少字段: {e}") from e
+
+        if isinstance(selectors, str) and hasattr(config, selectors):
+            selectors = getattr(config, selectors)
+        if isinstance(selectors, str):
+            selectors = [selectors]
+
+        return cls(
+            name=name,
+            selectors=selectors,
+            action=entry.get("action", "click"),
+            phases=tuple(entry.get("phases", ())),
+            cooldown=float(entry.get("cooldown", 0)),
+            priority=int(entry.get("priority", 0)),
+            snapshot=entry.get("snapshot", ""),
+        )
+
+    def payload(self) -> dict:
+        """传给页面内匹配脚本的规则定义"""
+        return {"name": self.name, "matchers": self.matchers}
+
+
+class PopupMatch:
+    """一次检测的结果"""
+
+    def __init__(self, rule: PopupRule, selector: str, text: str = "", element_id: Optional[str] = None):
+        self.rule = rule
+        self.selector = selector
+        self.text = text
+        self.element_id = element_id
+        # 回退到 Playwright 查询时匹配到的元素
+        self.element = None
+        # 动作是否已执行（report 规则始终为 False）
+        self.handled = False
 
-            return None
 
-        except Exception as e:
-            logger.error(f"查找关闭按钮时出错: {e}")
-            return None
+class PopupHandler:
+    """弹窗处理器 - 所有弹窗检测和处理的唯一入口"""
 
-    async def close_popup(self, page: Page) -> bool:
+    def __init__(
+        self,
+        config,
+        metrics=None,
+        before_action: Optional[Callable[[Page, PopupMatch], Awaitable[None]]] = None,
+    ):
         """
-        尝试关闭弹窗
+        初始化弹窗处理器
 
         Args:
-            page: Playwright Page 对象
-
-        Returns:
-            bool: 是否成功关闭弹窗
+            config: 配置对象，POPUP_RULES 为规则表
+            metrics: 运行指标，记录 CDP 调用和点击次数
+            before_action: 执行动作前的回调（如保存 DOM 快照）
         """
-        try:
-            # 策略1: 查找并点击关闭按钮
-            close_button = await self.find_close_button(page)
-            if close_button:
-                logger.info("点击关闭按钮...")
-                await close_button.click()
-                await asyncio.sleep(0.5)
-                self.popup_count += 1
-                logger.info(f"成功关闭弹窗 (累计: {self.popup_count})")
-                return True
-
-            # 策略2: 尝试按 ESC 键关闭
-            logger.debug("尝试按 ESC 键关闭弹窗...")
-            await page.keyboard.press("Escape")
-            await asyncio.sleep(0.5)
-
-            # 验证弹窗是否还在
-            popup_still_exists = await self.detect_popup(page)
-            if not popup_still_exists:
-                self.popup_count += 1
-                logger.info(f"通过 ESC 键关闭弹窗 (累计: {self.popup_count})")
-                return True
-
-            # 策略3: 点击弹窗外部（遮罩层）
-            logger.debug("尝试点击遮罩层关闭弹窗...")
-            overlay_selectors = [
-                ".modal-backdrop",
-                ".overlay",
-                "[class*='mask']",
-                "[class*='backdrop']"
-            ]
-
-            for selector in overlay_selectors:
-                try:
-                    overlay = await page.query_selector(selector)
-                    if overlay:
-                        await overlay.click()
-                        await asyncio.sleep(0.5)
-
-                        # 验证弹窗是否关闭
-                        popup_still_exists = await self.detect_popup(page)
-                        if not popup_still_exists:
-                            self.popup_count += 1
-                            logger.info(f"通过点击遮罩关闭弹窗 (累计: {self.popup_count})")
-                            return True
-                except Exception:
-                    continue
-
-            logger.warning("所有关闭弹窗的策略都失败了")
-            return False
+        self.config = config
+        self.metrics = metrics
+        self.before_action = before_action
+        self.rules = sorted(
+            (PopupRule.from_config(config, entry) for entry in config.POPUP_RULES),
+            key=lambda rule: -rule.priority,
+        )
+        self.popup_count = 0
+        self.handled_by_rule: Dict[str, int] = {}
 
-        except Exception as e:
-            logger.error(f"关闭弹窗时出错: {e}")
-            return False
+        self._last_fired: Dict[str, float] = {}
+        # 点击过的元素 -> 去抖截止时间
+        self._debounce: Dict[str, float] = {}
+        logger.info(f"弹窗处理器初始化完成 ({len(self.rules)} 条规则)")
 
-    async def handle_popup(self, page: Page) -> bool:
+    def watch_script(self, phase: str, binding: str) -> str:
         """
-        检测并处理弹窗（完整流程）
+        生成监视某阶段弹窗的页面初始化脚本
 
         Args:
-            page: Playwright Page 对象
+            phase: 阶段
+            binding: 有弹窗出现时调用的页面绑定名
 
         Returns:
-            bool: 是否检测到并成功处理了弹窗
+            str: 初始化脚本
         """
-        try:
-            popup = await self.detect_popup(page)
+        rules = [rule.payload() for rule in self.rules if phase in rule.phases and rule.matchers]
+        return f"{POPUP_WATCH_JS}({json.dumps(rules, ensure_ascii=False)}, {json.dumps(binding)});"
 
-            if popup:
-                logger.info("检测到弹窗，正在处理...")
-                success = await self.close_popup(page)
-                return success
-            else:
-                return False
+    def watchable(self, phase: str) -> bool:
+        """该阶段的弹窗是否都能由页面内的监视脚本发现（有回退到 Playwright 的选择器时不能）"""
+        return all(not rule.fallback_selectors for rule in self.rules if phase in rule.phases)
 
-        except Exception as e:
-            logger.error(f"处理弹窗时出错: {e}")
-            return False
+    def _cdp_call(self, name: str):
+        if self.metrics is not None:
+            self.metrics.cdp_call(name)
 
-    async def monitor_popups(
-        self,
-        page: Page,
-        check_interval: int = 2
-    ):
+    def _eligible_rules(self, phase: str, now: float) -> List[PopupRule]:
+        """当前阶段生效且不在冷却期的规则（按优先级排序）"""
+        return [
+            rule for rule in self.rules
+            if phase in rule.phases and now - self._last_fired.get(rule.name, float("-inf")) >= rule.cooldown
+        ]
+
+    async def check(self, page: Page, phase: str) -> Optional[PopupMatch]:
         """
-        持续监测并自动处理弹窗
+        检测当前阶段的弹窗并执行匹配规则的动作
 
         Args:
             page: Playwright Page 对象
-            check_interval: 检测间隔(秒)
+            phase: 阶段，如 entry / playback / complete / after_complete
+
+        Returns:
+            PopupMatch: 匹配到的规则，没有弹窗时返回 None
         """
-        self.monitoring = True
-        logger.info(f"开始监测弹窗 (间隔: {check_interval}秒)")
+        loop = asyncio.get_running_loop()
+        now = loop.time()
+        rules = self._eligible_rules(phase, now)
+        if not rules:
+            return None
 
-        while self.monitoring:
-            try:
-                await self.handle_popup(page)
-                await asyncio.sleep(check_interval)
+        self._debounce = {key: until for key, until in self._debounce.items() if until > now}
 
-            except Exception as e:
-                logger.error(f"监测弹窗时出错: {e}")
-                await asyncio.sleep(check_interval)
+        try:
+            match = await self._match(page, rules)
+        except Exception as e:
+            logger.debug(f"检测弹窗 ({phase}) 时出错: {e}")
+            return None
+        if match is None:
+            return None
 
-    def stop_monitoring(self):
-        """停止弹窗监测"""
-        self.monitoring = False
-        logger.info(f"弹窗监测已停止 (累计处理: {self.popup_count} 个弹窗)")
+        try:
+            await self._act(page, match)
+        except Exception as e:
+            # 未记录冷却和去抖，下一轮检测会重试
+            logger.warning(f"⚠️  处理弹窗 [{match.rule.name}] 失败 (选择器: {match.selector}): {e}")
+            return None
+        return match
+
+    async def _match(self, page: Page, rules: List[PopupRule]) -> Optional[PopupMatch]:
+        """先在页面内一次匹配所有规则，再用 Playwright 查询无法转换的选择器"""
+        by_name = {rule.name: rule for rule in rules}
+        match = None
+
+        compiled = [rule.payload() for rule in rules if rule.matchers]
+        if compiled:
+            result = await page.evaluate(POPUP_CHECK_JS, {"rules": compiled, "skip": list(self._debounce)})
+            self._cdp_call("evaluate")
+            for selector in result.get("errors") or []:
+                self._demote(selector)
+            if result.get("rule"):
+                match = PopupMatch(by_name[result["rule"]], result["selector"], result["text"], result["id"])
+
+        for rule in rules:
+            if match is not None and rule.priority <= match.rule.priority:
+                break
+            for selector in rule.fallback_selectors:
+                try:
+                    element = await page.query_selector(selector)
+                    self._cdp_call("query_selector")
+                    if element is None:
+                        continue
+                    visible = await element.is_visible()
+                    self._cdp_call("is_visible")
+                    if visible:
+                        text = await element.text_content()
+                        self._cdp_call("text_content")
+                        match = PopupMatch(rule, selector, (text or "").strip())
+                        match.element = element
+                        return match
+                except Exception as e:
+                    logger.debug(f"检查选择器 {selector} 时出错: {e}")
 
-    async def wait_and_handle_popup(
-        self,
-        page: Page,
-        timeout: int = 5
-    ) -> bool:
-        """
-        等待弹窗出现并处理（用于预期会出现弹窗的场景）
+        return match
 
-        Args:
-            page: Playwright Page 对象
-            timeout: 等待超时时间(秒)
+    def _demote(self, selector: str):
+        """页面内无法执行的选择器改为回退到 Playwright 查询"""
+        for rule in self.rules:
+            if any(m["selector"] == selector for m in rule.matchers):
+                rule.matchers = [m for m in rule.matchers if m["selector"] != selector]
+                rule.fallback_selectors.append(selector)
+                logger.debug(f"弹窗规则 {rule.name}: 选择器 {selector} 无法在页面内执行，改用 Playwright 查询")
 
-        Returns:
-            bool: 是否成功处理了弹窗
-        """
-        logger.info(f"等待弹窗出现 (超时: {timeout}秒)...")
+    async def _act(self, page: Page, match: PopupMatch):
+        """执行规则动作，成功后才记录冷却和去抖（失败时不记录，下一轮检测会重试）"""
+        rule = match.rule
+        loop = asyncio.get_running_loop()
 
-        start_time = asyncio.get_event_loop().time()
+        if self.before_action is not None:
+            await self.before_action(page, match)
 
-        while (asyncio.get_event_loop().time() - start_time) < timeout:
-            popup = await self.detect_popup(page)
-            if popup:
-                logger.info("弹窗已出现，正在处理...")
-                success = await self.close_popup(page)
-                return success
+        if rule.action == "report":
+            logger.debug(f"检测到弹窗 [{rule.name}] (选择器: {match.selector})")
+            self._last_fired[rule.name] = loop.time()
+            return
 
-            await asyncio.sleep(0.5)
+        logger.info(f"🔔 检测到弹窗 [{rule.name}]: '{match.text}' (选择器: {match.selector})，正在处理...")
 
-        logger.debug("在超时时间内未检测到弹窗")
-        return False
+        if rule.action == "escape":
+            await page.keyboard.press("Escape")
+            self._cdp_call("keyboard.press")
+        elif match.element is not None:
+            await match.element.click(timeout=CLICK_TIMEOUT_MS)
+            self._cdp_call("click")
+        else:
+            await page.click(f'[{ELEMENT_ID_ATTRIBUTE}="{match.element_id}"]', timeout=CLICK_TIMEOUT_MS)
+            self._cdp_call("click")
+
+        now = loop.time()
+        self._last_fired[rule.name] = now
+        if match.element_id is not None:
+            self._debounce[match.element_id] = now + rule.cooldown
+
+        match.handled = True
+        self.popup_count += 1
+        self.handled_by_rule[rule.name] = self.handled_by_rule.get(rule.name, 0) + 1
+        if self.metrics is not None:
+            self.metrics.popup_handled(match.selector)
+        await asyncio.sleep(CLICK_SETTLE_SECONDS)
+        logger.info(f"✅ 已处理弹窗 [{rule.name}] (累计: {self.popup_count})")
 
     def get_statistics(self) -> dict:
         """
@@ -245,43 +462,5 @@ class PopupHandler:
         """
         return {
             "total_popups_handled": self.popup_count,
-            "is_monitoring": self.monitoring
+            "popups_by_rule": dict(self.handled_by_rule),
         }
-
-
-# 独立测试
-if __name__ == "__main__":
-    logging.basicConfig(
-        level=logging.DEBUG,
-        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-    )
-
-    # 创建测试配置
-    class TestConfig:
-        POPUP_SELECTORS = [".popup", ".modal", "[role='dialog']"]
-        POPUP_CLOSE_SELECTORS = ["button:has-text('关闭')", ".close-btn"]
-
-    async def test():
-        from playwright.async_api import async_playwright
-
-        config = TestConfig()
-        handler = PopupHandler(config)
-
-        async with async_playwright() as p:
-            browser = await p.chromium.launch(headless=False)
-            page = await browser.new_page()
-
-            # 访问一个测试页面
-            await page.goto("https://example.com")
-
-            # 测试弹窗检测
-            popup = await handler.detect_popup(page)
-            print(f"检测到弹窗: {popup is not None}")
-
-            # 获取统计信息
-            stats = handler.get_statistics()
-            print(f"统计信息: {stats}")
-
-            await browser.close()
-
-    asyncio.run(test())
@@ -0,0 +1,138 @@
+"""
+进程树模块
+列出本进程的子孙进程（Playwright 驱动和浏览器），退出时清理残留的浏览器进程
+"""
+
+import logging
+import os
+import signal
+from collections import defaultdict
+from pathlib import Path
+from typing import Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# 可选依赖：非 Linux 系统上用 psutil 遍历进程树
+try:
+    import psutil
+    PSUTIL_AVAILABLE = True
+except ImportError:
+    PSUTIL_AVAILABLE = False
+
+# Windows 没有 SIGKILL
+KILL_SIGNAL = getattr(signal, "SIGKILL", signal.SIGTERM)
+
+
+def _read_stat(pid: int) -> Optional[List[str]]:
+    """读取 /proc/<pid>/stat 中进程名之后的字段"""
+    try:
+        stat = Path(f"/proc/{pid}/stat").read_text()
+    except OSError:
+        return None
+    # comm 字段可能包含空格，从最后一个 ')' 之后解析
+    return stat[stat.rindex(")") + 2:].split()
+
+
+def descendant_pids(root: Optional[int] = None) -> Optional[List[int]]:
+    """
+    列出指定进程的所有子孙进程
+
+    Args:
+        root: 根进程 pid，为None时使用本进程
+
+    Returns:
+        List[int]: 子孙进程 pid，平台不支持时返回 None
+    """
+    root = root or os.getpid()
+
+    if PSUTIL_AVAILABLE:
+        try:
+            return [child.pid for child in psutil.Process(root).children(recursive=True)]
+        except Exception:
+            return None
+
+    proc = Path("/proc")
+    if not proc.is_dir():
+        return None
+
+    # 读取 /proc 建立父子关系
+    children_of = defaultdict(list)
+    for entry in proc.iterdir():
+        if not entry.name.isdigit():
+            continue
+        fields = _read_stat(int(entry.name))
+        if fields:
+            children_of[int(fields[1])].append(int(entry.name))
+
+    descendants = []
+    frontier = [root]
+    while frontier:
+        pid = frontier.pop()
+        children = children_of.get(pid, [])
+        descendants.extend(children)
+        frontier.extend(children)
+    return descendants
+
+
+def _start_time(pid: int) -> Optional[float]:
+    """进程启动时间，用于识别 pid 是否已被其他进程复用；进程不存在或已是僵尸进程时返回 None"""
+    if PSUTIL_AVAILABLE:
+        try:
+            process = psutil.Process(pid)
+            if process.status() == psutil.STATUS_ZOMBIE:
+                return None
+            return process.create_time()
+        except Exception:
+            return None
+
+    fields = _read_stat(pid)
+    if not fields or fields[0] == "Z":
+        return None
+    # stat 第 22 个字段 starttime，去掉 pid 和 comm 后下标为 19
+    return float(fields[19])
+
+
+def snapshot_descendants(exclude: tuple = ()) -> Dict[int, float]:
+    """
+    记录当前所有子孙进程及其启动时间
+
+    浏览器进程在驱动退出后会被过继给 init，不再出现在进程树中，
+    因此需要在运行期间提前记录
+
+    Args:
+        exclude: 不记录的 pid（如虚拟显示器）
+
+    Returns:
+        Dict[int, float]: pid -> 启动时间
+    """
+    snapshot = {}
+    for pid in descendant_pids() or []:
+        if pid in exclude:
+            continue
+        started = _start_time(pid)
+        if started is not None:
+            snapshot[pid] = started
+    return snapshot
+
+
+def kill_processes(processes: Dict[int, float], sig: int = KILL_SIGNAL) -> int:
+    """
+    结束仍在运行的进程（启动时间不符的视为 pid 已被复用，跳过）
+
+    Args:
+        processes: snapshot_descendants 的返回值
+        sig: 发送的信号
+
+    Returns:
+        int: 实际结束的进程数
+    """
+    killed = 0
+    for pid, started in processes.items():
+        if _start_time(pid) != started:
+            continue
+        try:
+            os.kill(pid, sig)
+            killed += 1
+        except OSError as e:
+            logger.debug(f"结束进程 {pid} 失败: {e}")
+    return killed
@@ -0,0 +1,160 @@
+"""
+重试队列模块
+按顺序分发待播放视频，并以指数退避的方式把失败的视频重新放回队列
+"""
+
+import asyncio
+import heapq
+import itertools
+import logging
+from collections import deque
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class RetryScheduler:
+    """重试调度器 - 失败视频按指数退避重新入队，每个视频有最大尝试次数"""
+
+    def __init__(
+        self,
+        hrefs: Iterable[str],
+        max_retries: int = 2,
+        base_delay: float = 30,
+        backoff_factor: float = 2,
+        max_delay: float = 600
+    ):
+        """
+        初始化重试调度器
+
+        Args:
+            hrefs: 视频 href 序列（按播放顺序，需可重复迭代；按需逐个读取）
+            max_retries: 每个视频的最大重试次数（不含首次播放）
+            base_delay: 第一次重试前的等待时间(秒)
+            backoff_factor: 每次重试等待时间的倍增系数
+            max_delay: 单次等待时间上限(秒)
+        """
+        self.max_retries = max(0, max_retries)
+        self.base_delay = base_delay
+        self.backoff_factor = backoff_factor
+        self.max_delay = max_delay
+
+        # 待播放队列: 从播放列表中按需读取 (视频序号, href)
+        self.hrefs = hrefs
+        self._source = enumerate(iter(hrefs), 1)
+        self._next_item: Optional[Tuple[int, str]] = next(self._source, None)
+        self.dispatched = 0
+        # 运行中追加的视频，排在播放列表之后
+        self.appended: deque = deque()
+        # 退避中的重试: (可执行时间, 序号, 视频序号, href)
+        self.delayed: List[Tuple[float, int, int, str]] = []
+        self._seq = itertools.count()
+
+        # 每个视频已尝试的次数（按视频序号计，允许列表中出现重复 href）
+        self.attempts: Dict[int, int] = {}
+        self.retry_count = 0
+
+    def _pop_pending(self) -> Tuple[int, str]:
+        """取出下一个尚未开始的视频"""
+        if self._next_item is None:
+            return self.appended.popleft()
+        item = self._next_item
+        self._next_item = next(self._source, None)
+        self.dispatched += 1
+        return item
+
+    def has_pending(self) -> bool:
+        """是否还有尚未开始的视频"""
+        return self._next_item is not None or bool(self.appended)
+
+    def enqueue(self, video_index: int, href: str):
+        """
+        在队尾追加一个视频
+
+        Args:
+            video_index: 视频序号
+            href: 视频相对路径
+        """
+        self.appended.append((video_index, href))
+
+    def queued_hrefs(self) -> Iterator[str]:
+        """逐个返回队列中尚未开始的视频 href（含追加的视频和退避中的重试）"""
+        pending = itertools.islice(iter(self.hrefs), self.dispatched, None)
+        return itertools.chain(
+            pending,
+            [item[1] for item in self.appended],
+            [item[3] for item in self.delayed],
+        )
+
+    def attempt_of(self, video_index: int) -> int:
+        """返回视频当前是第几次尝试"""
+        return self.attempts.get(video_index, 0)
+
+    def compute_delay(self, retry_number: int) -> float:
+        """
+        计算第 N 次重试前的等待时间
+
+        Args:
+            retry_number: 重试序号（从1开始）
+
+        Returns:
+            float: 等待时间(秒)
+        """
+        delay = self.base_delay * (self.backoff_factor ** (retry_number - 1))
+        return min(delay, self.max_delay)
+
+    async def next(self) -> Optional[Tuple[int, str]]:
+        """
+        获取下一个要播放的视频
+
+        已到期的重试优先；只剩退避中的重试时会等待到最早的一个到期
+
+        Returns:
+            (视频序号, href)，队列为空时返回 None
+        """
+        loop = asyncio.get_event_loop()
+
+        while True:
+            if self.delayed and self.delayed[0][0] <= loop.time():
+                _, _, video_index, href = heapq.heappop(self.delayed)
+                break
+            if self.has_pending():
+                video_index, href = self._pop_pending()
+                break
+            if not self.delayed:
+                return None
+            # 等待期间重试仍留在队列中：被退出信号取消时会随剩余视频一起保存
+            ready_at, _, video_index, _ = self.delayed[0]
+            wait = ready_at - loop.time()
+            logger.info(f"⏳ 等待 {wait:.0f} 秒后重试视频 {video_index}...")
+            await asyncio.sleep(wait)
+
+        self.attempts[video_index] = self.attempts.get(video_index, 0) + 1
+        return video_index, href
+
+    def schedule_retry(self, video_index: int, href: str) -> bool:
+        """
+        将失败的视频放回队列
+
+        Args:
+            video_index: 视频序号
+            href: 视频相对路径
+
+        Returns:
+            bool: 是否已重新入队（达到最大尝试次数时返回 False）
+        """
+        retry_number = self.attempts.get(video_index, 0)
+        if retry_number > self.max_retries:
+            logger.warning(f"视频 {video_index} 已达到最大重试次数 ({self.max_retries})，不再重试")
+            return False
+
+        delay = self.compute_delay(retry_number)
+        ready_at = asyncio.get_event_loop().time() + delay
+        heapq.heappush(self.delayed, (ready_at, next(self._seq), video_index, href))
+        self.retry_count += 1
+
+        logger.info(
+            f"🔁 视频 {video_index} 将在 {delay:.0f} 秒后重试 "
+            f"(第 {retry_number}/{self.max_retries} 次重试)"
+        )
+        return True
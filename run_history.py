@@ -0,0 +1,327 @@
+"""
+运行历史模块
+把每次运行及其中每个视频的耗时、额外开销、失败类型、弹窗数和资源占用写入本地 SQLite 数据库，
+并生成跨运行的对比报告（python main.py report）
+"""
+
+import json
+import logging
+import sqlite3
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# 记录到运行信息中的配置项，用于判断前后两次运行的差异来自哪里
+RECORDED_CONFIG_KEYS = (
+    "HEADLESS",
+    "FAILURE_POLICY",
+    "POPUP_CHECK_INTERVAL",
+    "VIDEO_CHECK_INTERVAL_DEFAULT",
+    "VIDEO_CHECK_INTERVAL_MIN",
+    "VIDEO_CHECK_INTERVAL_MAX",
+    "TRACE_ENABLED",
+    "HAR_MODE",
+    "SELECTOR_DRIFT_CHECK",
+    "NETWORK_ACCOUNTING",
+)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    started_at TEXT NOT NULL,
+    finished_at TEXT,
+    videos_total INTEGER,
+    completed INTEGER,
+    failed INTEGER,
+    skipped INTEGER,
+    retries INTEGER,
+    shutdown_signal TEXT,
+    config TEXT
+);
+CREATE TABLE IF NOT EXISTS videos (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    run_id INTEGER NOT NULL REFERENCES runs(id),
+    video_index INTEGER NOT NULL,
+    href TEXT NOT NULL,
+    attempt INTEGER,
+    completed INTEGER NOT NULL,
+    error_kind TEXT,
+    finished_at TEXT NOT NULL,
+    session_seconds REAL,
+    media_seconds REAL,
+    overhead_seconds REAL,
+    popups INTEGER,
+    cdp_calls INTEGER,
+    network_bytes INTEGER,
+    network_requests INTEGER,
+    browser_rss_bytes INTEGER
+);
+CREATE TABLE IF NOT EXISTS phases (
+    video_id INTEGER NOT NULL REFERENCES videos(id),
+    phase TEXT NOT NULL,
+    seconds REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS videos_run ON videos(run_id);
+CREATE INDEX IF NOT EXISTS phases_video ON phases(video_id);
+"""
+
+
+def _now() -> str:
+    return datetime.now().isoformat(timespec="seconds")
+
+
+def connect(path: str) -> sqlite3.Connection:
+    """
+    打开运行历史数据库（不存在时创建）
+
+    Args:
+        path: 数据库文件路径
+
+    Returns:
+        sqlite3.Connection: 数据库连接
+    """
+    Path(path).parent.mkdir(parents=True, exist_ok=True)
+    connection = sqlite3.connect(path)
+    connection.row_factory = sqlite3.Row
+    connection.executescript(SCHEMA)
+    return connection
+
+
+class RunHistory:
+    """运行历史记录器 - 每个视频会话结束时写入一行，数据库出错只记录警告，不影响播放"""
+
+    def __init__(self, config):
+        """
+        Args:
+            config: 配置对象（RUN_HISTORY_DB 为空时不记录）
+        """
+        self.config = config
+        self.path = config.RUN_HISTORY_DB
+        self.connection: Optional[sqlite3.Connection] = None
+        self.run_id: Optional[int] = None
+
+    def start_run(self, videos_total: int):
+        """
+        开始记录一次运行
+
+        Args:
+            videos_total: 播放列表中的视频数
+        """
+        if not self.path:
+            return
+        try:
+            self.connection = connect(self.path)
+            settings = {key: getattr(self.config, key, None) for key in RECORDED_CONFIG_KEYS}
+            with self.connection:
+                cursor = self.connection.execute(
+                    "INSERT INTO runs (started_at, videos_total, config) VALUES (?, ?, ?)",
+                    (_now(), videos_total, json.dumps(settings, ensure_ascii=False)),
+                )
+            self.run_id = cursor.lastrowid
+            logger.debug(f"运行历史: {self.path} (run {self.run_id})")
+        except (sqlite3.Error, OSError) as e:
+            logger.warning(f"无法打开运行历史数据库 {self.path}: {e}")
+            self.connection = None
+
+    def record_video(
+        self,
+        video_index: int,
+        href: str,
+        attempt: int,
+        completed: bool,
+        error_kind: Optional[str],
+        session_seconds: float,
+        media_seconds: Optional[float],
+        phases: Dict[str, float],
+        popups: int,
+        cdp_calls: int,
+        network: Optional[dict] = None,
+        browser_rss_bytes: Optional[int] = None,
+    ):
+        """
+        记录一个视频会话
+
+        Args:
+            video_index: 视频序号
+            href: 视频相对路径
+            attempt: 第几次尝试
+            completed: 是否播放完成
+            error_kind: 失败时的错误类型，跳过或退出时为 skipped / interrupted
+            session_seconds: 会话总耗时(秒)
+            media_seconds: 视频时长(秒)，未知时为 None
+            phases: 各阶段耗时(秒)
+            popups: 处理的弹窗数
+            cdp_calls: 与浏览器的往返次数
+            network: NetworkCollector.finish_video 返回的流量汇总
+            browser_rss_bytes: 会话结束时浏览器进程的常驻内存
+        """
+        if self.connection is None:
+            return
+
+        # 额外开销: 会话总耗时减去视频本身的时长（只对播放完成的视频有意义）
+        overhead = session_seconds - media_seconds if completed and media_seconds else None
+        try:
+            with self.connection:
+                cursor = self.connection.execute(
+                    """
+                    INSERT INTO videos (
+                        run_id, video_index, href, attempt, completed, error_kind, finished_at,
+                        session_seconds, media_seconds, overhead_seconds, popups, cdp_calls,
+                        network_bytes, network_requests, browser_rss_bytes
+                    ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                    """,
+                    (
+                        self.run_id, video_index, href, attempt, int(completed), error_kind, _now(),
+                        session_seconds, media_seconds, overhead, popups, cdp_calls,
+                        network["bytes"] if network else None,
+                        network["requests"] if network else None,
+                        browser_rss_bytes,
+                    ),
+                )
+                self.connection.executemany(
+                    "INSERT INTO phases (video_id, phase, seconds) VALUES (?, ?, ?)",
+                    [(cursor.lastrowid, phase, seconds) for phase, seconds in phases.items()],
+                )
+        except sqlite3.Error as e:
+            logger.warning(f"写入运行历史失败: {e}")
+
+    def finish_run(self, completed: int, failed: int, skipped: int, retries: int, shutdown_signal: Optional[str]):
+        """结束本次运行的记录"""
+        if self.connection is None:
+            return
+        try:
+            with self.connection:
+                self.connection.execute(
+                    """
+                    UPDATE runs SET finished_at = ?, completed = ?, failed = ?, skipped = ?,
+                        retries = ?, shutdown_signal = ?
+                    WHERE id = ?
+                    """,
+                    (_now(), completed, failed, skipped, retries, shutdown_signal, self.run_id),
+                )
+        except sqlite3.Error as e:
+            logger.warning(f"写入运行历史失败: {e}")
+        finally:
+            self.connection.close()
+            self.connection = None
+
+
+def _fmt(value: Optional[float], digits: int = 1) -> str:
+    return "-" if value is None else f"{value:.{digits}f}"
+
+
+def _fmt_mb(value: Optional[float]) -> str:
+    return "-" if value is None else f"{value / 1024 / 1024:.1f}"
+
+
+def build_report(connection: sqlite3.Connection, runs: int = 10) -> List[str]:
+    """
+    生成最近几次运行的对比报告
+
+    Args:
+        connection: 运行历史数据库连接
+        runs: 对比的运行次数
+
+    Returns:
+        List[str]: 报告文本行
+    """
+    rows = connection.execute(
+        """
+        SELECT r.id, r.started_at, r.finished_at, r.completed, r.failed, r.skipped, r.retries,
+               r.shutdown_signal, r.config,
+               COUNT(v.id) AS sessions,
+               AVG(v.overhead_seconds) AS avg_overhead,
+               AVG(CASE WHEN v.completed THEN v.session_seconds END) AS avg_session,
+               AVG(v.popups) AS avg_popups,
+               AVG(v.cdp_calls) AS avg_cdp,
+               AVG(v.network_bytes) AS avg_bytes,
+               MAX(v.browser_rss_bytes) AS max_rss
+        FROM runs r LEFT JOIN videos v ON v.run_id = r.id
+        GROUP BY r.id ORDER BY r.id DESC LIMIT ?
+        """,
+        (runs,),
+    ).fetchall()
+    if not rows:
+        return ["运行历史为空"]
+
+    rows = list(reversed(rows))
+    run_ids = [row["id"] for row in rows]
+    placeholders = ",".join("?" * len(run_ids))
+    lines = []
+
+    # 1. 每次运行的每视频额外开销
+    lines.append(f"最近 {len(rows)} 次运行（额外开销 = 会话耗时 - 视频时长，取播放完成的视频平均）")
+    lines.append(
+        f"{'run':>5}  {'开始时间':<19}  {'完成':>4} {'失败':>4} {'跳过':>4} {'重试':>4}  "
+        f"{'开销/视频(s)':>12} {'会话(s)':>8} {'弹窗':>5} {'CDP':>6} {'流量(MB)':>9} {'内存峰值(MB)':>12}"
+    )
+    previous_config = None
+    for row in rows:
+        note = f"  [{row['shutdown_signal']}]" if row["shutdown_signal"] else ""
+        if row["finished_at"] is None:
+            note += "  [未正常结束]"
+        lines.append(
+            f"{row['id']:>5}  {row['started_at']:<19}  {row['completed'] or 0:>4} {row['failed'] or 0:>4} "
+            f"{row['skipped'] or 0:>4} {row['retries'] or 0:>4}  {_fmt(row['avg_overhead']):>12} "
+            f"{_fmt(row['avg_session'], 0):>8} {_fmt(row['avg_popups']):>5} {_fmt(row['avg_cdp'], 0):>6} "
+            f"{_fmt_mb(row['avg_bytes']):>9} {_fmt_mb(row['max_rss']):>12}{note}"
+        )
+        config = json.loads(row["config"] or "{}")
+        if previous_config is not None:
+            changed = [f"{k}={config.get(k)!r}" for k in config if config.get(k) != previous_config.get(k)]
+            if changed:
+                lines.append(f"{'':>7}配置变化: {', '.join(changed)}")
+        previous_config = config
+
+    # 2. 最慢的阶段（每次运行的平均耗时）
+    phase_rows = connection.execute(
+        f"""
+        SELECT v.run_id, p.phase, AVG(p.seconds) AS avg_seconds, MAX(p.seconds) AS max_seconds
+        FROM phases p JOIN videos v ON v.id = p.video_id
+        WHERE v.run_id IN ({placeholders})
+        GROUP BY v.run_id, p.phase
+        """,
+        run_ids,
+    ).fetchall()
+    if phase_rows:
+        averages: Dict[str, Dict[int, float]] = {}
+        worst: Dict[str, float] = {}
+        for row in phase_rows:
+            averages.setdefault(row["phase"], {})[row["run_id"]] = row["avg_seconds"]
+            worst[row["phase"]] = max(worst.get(row["phase"], 0), row["max_seconds"])
+        shown = run_ids[-5:]
+        lines.append("")
+        lines.append("阶段平均耗时(s)，按最近一次运行从慢到快")
+        lines.append(f"{'阶段':<16}" + "".join(f"{'run ' + str(i):>10}" for i in shown) + f"{'最慢':>10}")
+        latest = shown[-1]
+        for phase in sorted(averages, key=lambda p: -(averages[p].get(latest) or 0)):
+            lines.append(
+                f"{phase:<16}"
+                + "".join(f"{_fmt(averages[phase].get(i)):>10}" for i in shown)
+                + f"{_fmt(worst[phase]):>10}"
+            )
+
+    # 3. 最常见的失败类型
+    error_rows = connection.execute(
+        f"""
+        SELECT error_kind, COUNT(*) AS count, COUNT(DISTINCT run_id) AS runs, MAX(finished_at) AS last_seen
+        FROM videos
+        WHERE run_id IN ({placeholders}) AND NOT completed
+          AND error_kind IS NOT NULL AND error_kind NOT IN ('skipped', 'interrupted')
+        GROUP BY error_kind ORDER BY count DESC
+        """,
+        run_ids,
+    ).fetchall()
+    lines.append("")
+    if error_rows:
+        lines.append("最常见的失败类型")
+        for row in error_rows:
+            lines.append(
+                f"  {row['error_kind']:<20} {row['count']:>4} 次，出现在 {row['runs']} 次运行中，最近 {row['last_seen']}"
+            )
+    else:
+        lines.append("没有失败的视频")
+
+    return lines
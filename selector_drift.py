@@ -0,0 +1,364 @@
+"""
+选择器漂移检测模块
+把配置中的选择器对照本地保存的页面快照（语料库）和会话开始时的真实页面逐一检查，
+网站改版导致选择器失效时立即失败，并给出与基线相比的差异和页面上的相似元素
+"""
+
+import asyncio
+import gzip
+import json
+import logging
+import re
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from playwright.async_api import BrowserContext, Page
+
+from errors import SelectorDriftError
+
+logger = logging.getLogger(__name__)
+
+# 每个配置项应当在哪类页面上匹配到元素（列表类配置项只要其中一个匹配即可）
+KEY_PAGES = {
+    "LOGIN_USERNAME_XPATH": "login",
+    "LOGIN_PASSWORD_XPATH": "login",
+    "LOGIN_CAPTCHA_INPUT_XPATH": "login",
+    "LOGIN_CAPTCHA_IMAGE_XPATH": "login",
+    "LOGIN_SUBMIT_BUTTON_XPATH": "login",
+    "VIDEO_PLAYER_SELECTOR": "play_page",
+    "CONTINUE_BUTTON_SELECTORS": "dialog",
+    "COMPLETE_POPUP_SELECTOR": "complete",
+    "POPUP_CLOSE_SELECTORS": "complete",
+}
+
+# 快照文件名中的页面类型，如 login.html、video_0001_dialog_1.html.gz
+PAGE_KIND_PATTERN = re.compile(r"(login|play_page|dialog|complete)")
+
+# 指纹中决定"是否还是同一个元素"的字段；其余字段（class、文本）的变化只作提示
+IDENTITY_FIELDS = ("tag", "id", "name", "type")
+
+# 提取元素指纹
+FINGERPRINT_JS = """
+el => ({
+    tag: el.tagName.toLowerCase(),
+    id: el.id || '',
+    name: el.getAttribute('name') || '',
+    type: el.getAttribute('type') || '',
+    placeholder: el.getAttribute('placeholder') || '',
+    cls: (el.getAttribute('class') || '').trim(),
+    text: (el.innerText || el.textContent || '').trim().slice(0, 40),
+})
+"""
+
+# 在页面上查找与基线指纹相似的元素，返回其绝对 XPath
+FIND_SIMILAR_JS = """
+fp => {
+    const xpath = el => {
+        const parts = [];
+        for (; el && el.nodeType === 1; el = el.parentNode) {
+            let i = 1;
+            for (let s = el.previousElementSibling; s; s = s.previousElementSibling) {
+                if (s.tagName === el.tagName) i++;
+            }
+            parts.unshift(el.tagName.toLowerCase() + '[' + i + ']');
+        }
+        return '/' + parts.join('/');
+    };
+    const found = new Map();
+    const add = (el, reason) => {
+        if (el && !found.has(el)) found.set(el, reason);
+    };
+    if (fp.id) add(document.getElementById(fp.id), 'id');
+    for (const attr of ['name', 'placeholder']) {
+        if (fp[attr]) {
+            document.querySelectorAll(`${fp.tag}[${attr}="${CSS.escape(fp[attr])}"]`)
+                .forEach(el => add(el, attr));
+        }
+    }
+    if (fp.text) {
+        const prefix = fp.text.slice(0, 10);
+        for (const el of document.querySelectorAll(fp.tag)) {
+            if ((el.innerText || el.textContent || '').trim().startsWith(prefix)) add(el, 'text');
+        }
+    }
+    return [...found].slice(0, 3).map(([el, reason]) => ({
+        xpath: xpath(el),
+        reason,
+        tag: el.tagName.toLowerCase(),
+        id: el.id || '',
+        cls: (el.getAttribute('class') || '').trim(),
+        text: (el.innerText || el.textContent || '').trim().slice(0, 40),
+    }));
+}
+"""
+
+
+def describe(fingerprint: Optional[dict]) -> str:
+    """把元素指纹格式化为 tag#id.class[name] "文本" 形式"""
+    if not fingerprint:
+        return "-"
+    text = fingerprint["tag"]
+    if fingerprint.get("id"):
+        text += f"#{fingerprint['id']}"
+    if fingerprint.get("cls"):
+        text += "." + ".".join(fingerprint["cls"].split()[:3])
+    if fingerprint.get("name"):
+        text += f"[name={fingerprint['name']}]"
+    if fingerprint.get("text"):
+        text += f' "{fingerprint["text"]}"'
+    return text
+
+
+def fingerprint_changes(before: dict, after: dict) -> Tuple[List[str], List[str]]:
+    """
+    比较两个元素指纹
+
+    Returns:
+        (身份字段的变化, 其他字段的变化)，每项形如 "id: a → b"
+    """
+    identity, minor = [], []
+    for field in sorted(set(before) | set(after)):
+        old, new = before.get(field, ""), after.get(field, "")
+        if old != new:
+            (identity if field in IDENTITY_FIELDS else minor).append(f"{field}: {old!r} → {new!r}")
+    return identity, minor
+
+
+def load_corpus(directory: str) -> Dict[str, List[Path]]:
+    """
+    按页面类型收集语料库中的快照（包括 HAR 录制包的 dom/ 子目录）
+
+    Args:
+        directory: 语料库目录
+
+    Returns:
+        Dict[str, List[Path]]: 页面类型 -> 快照路径
+    """
+    corpus: Dict[str, List[Path]] = {}
+    root = Path(directory)
+    if not root.is_dir():
+        return corpus
+
+    for path in sorted(root.rglob("*.html*")):
+        if not path.name.endswith((".html", ".html.gz")):
+            continue
+        match = PAGE_KIND_PATTERN.search(path.name)
+        if match:
+            corpus.setdefault(match.group(1), []).append(path)
+    return corpus
+
+
+def _read_snapshot(path: Path) -> str:
+    if path.suffix == ".gz":
+        return gzip.decompress(path.read_bytes()).decode("utf-8", errors="replace")
+    return path.read_text(encoding="utf-8", errors="replace")
+
+
+class SelectorDriftChecker:
+    """选择器漂移检测器 - 基线记录每个配置项上次匹配到的选择器和元素指纹"""
+
+    def __init__(self, config):
+        """
+        Args:
+            config: 配置对象
+        """
+        self.config = config
+        self.baseline_path = Path(config.SELECTOR_BASELINE_FILE)
+        self.baseline: Dict[str, dict] = {}
+        if self.baseline_path.is_file():
+            try:
+                self.baseline = json.loads(self.baseline_path.read_text(encoding="utf-8"))
+            except (OSError, ValueError) as e:
+                logger.warning(f"选择器基线读取失败，忽略: {e}")
+
+    def save_baseline(self):
+        """写回基线文件"""
+        self.baseline_path.parent.mkdir(parents=True, exist_ok=True)
+        self.baseline_path.write_text(
+            json.dumps(self.baseline, ensure_ascii=False, indent=2), encoding="utf-8"
+        )
+
+    def selectors_of(self, key: str) -> List[str]:
+        """配置项中的所有候选选择器，XPATH 项加上 xpath= 前缀"""
+        value = getattr(self.config, key)
+        selectors = list(value) if isinstance(value, (list, tuple)) else [value]
+        if key.endswith("_XPATH"):
+            selectors = [s if s.startswith("xpath=") else f"xpath={s}" for s in selectors]
+        return [s for s in selectors if s]
+
+    async def probe(self, page: Page, key: str) -> Dict[str, dict]:
+        """
+        在页面上运行配置项的每个候选选择器
+
+        Returns:
+            Dict[str, dict]: 选择器 -> {"matches": 匹配数, "fingerprint": 第一个匹配元素的指纹}
+        """
+        results = {}
+        for selector in self.selectors_of(key):
+            try:
+                elements = await page.query_selector_all(selector)
+                entry = {"matches": len(elements)}
+                if elements:
+                    entry["fingerprint"] = await elements[0].evaluate(FINGERPRINT_JS)
+            except Exception as e:
+                entry = {"matches": 0, "error": str(e).splitlines()[0]}
+            results[selector] = entry
+        return results
+
+    async def diagnose(self, page: Page, key: str, kind: str, probe: Dict[str, dict]) -> Tuple[List[str], List[str]]:
+        """
+        对照基线判断配置项是否漂移
+
+        Args:
+            page: 当前页面（用于查找相似元素）
+            key: 配置项名
+            kind: 页面类型
+            probe: probe() 的结果
+
+        Returns:
+            (导致失败的差异, 仅提示的差异)
+        """
+        matched = next(((s, r) for s, r in probe.items() if r.get("matches")), None)
+        base = self.baseline.get(key)
+
+        if matched is None:
+            problems = [f"{key}: {kind} 页面上 {len(probe)} 个选择器都没有匹配到元素"]
+            for selector, result in probe.items():
+                problems.append(f"    ✗ {selector}" + (f" ({result['error']})" if result.get("error") else ""))
+            if base:
+                problems.append(f"    基线: {base['selector']} -> {describe(base['fingerprint'])}")
+                try:
+                    similar = await page.evaluate(FIND_SIMILAR_JS, base["fingerprint"])
+                except Exception:
+                    similar = []
+                for candidate in similar:
+                    problems.append(
+                        f"    相似元素 ({candidate['reason']}): xpath={candidate['xpath']} -> {describe(candidate)}"
+                    )
+            return problems, []
+
+        selector, result = matched
+        if not base:
+            return [], []
+
+        identity, minor = fingerprint_changes(base["fingerprint"], result["fingerprint"])
+        if identity:
+            return [
+                f"{key}: {selector} 匹配到的已不是基线中的元素",
+                f"    基线: {describe(base['fingerprint'])}",
+                f"    现在: {describe(result['fingerprint'])}",
+                *(f"    {change}" for change in identity),
+            ], []
+        if minor:
+            return [], [f"{key}: {selector} 匹配的元素有变化: {'; '.join(minor)}"]
+        return [], []
+
+    def _record(self, key: str, probe: Dict[str, dict]):
+        """把第一个匹配的选择器和指纹记入基线"""
+        matched = next(((s, r) for s, r in probe.items() if r.get("matches")), None)
+        if matched:
+            self.baseline[key] = {"selector": matched[0], "fingerprint": matched[1]["fingerprint"]}
+
+    async def check_corpus(self, context: BrowserContext, corpus: Dict[str, List[Path]], update_baseline: bool = False) -> dict:
+        """
+        在语料库的每个快照上检查对应的配置项
+
+        Args:
+            context: 浏览器上下文（快照通过 set_content 载入，不访问网络）
+            corpus: load_corpus() 的结果
+            update_baseline: 是否用本次结果更新基线（确认页面正常时使用）
+
+        Returns:
+            dict: {"ok": 是否全部通过, "problems": [...], "notes": [...], "checked": {配置项: 快照数}, "skipped": [...]}
+        """
+        page = await context.new_page()
+        # 快照中的外部资源无法加载，直接中止，避免等待
+        await page.route("**/*", lambda route: route.abort())
+
+        problems, notes = [], []
+        checked: Dict[str, int] = {}
+        skipped = [key for key, kind in KEY_PAGES.items() if kind not in corpus]
+        try:
+            for kind, paths in corpus.items():
+                keys = [key for key, page_kind in KEY_PAGES.items() if page_kind == kind]
+                for path in paths:
+                    await page.set_content(_read_snapshot(path), wait_until="domcontentloaded")
+                    for key in keys:
+                        probe = await self.probe(page, key)
+                        if update_baseline and key not in self.baseline:
+                            self._record(key, probe)
+                        failed, minor = await self.diagnose(page, key, kind, probe)
+                        if failed:
+                            problems.append(f"[{path.name}] " + "\n".join(failed))
+                        notes.extend(f"[{path.name}] {note}" for note in minor)
+                        checked[key] = checked.get(key, 0) + 1
+        finally:
+            await page.close()
+
+        if update_baseline:
+            self.save_baseline()
+
+        return {"ok": not problems, "problems": problems, "notes": notes, "checked": checked, "skipped": skipped}
+
+    async def _page_loaded(self, page: Page) -> bool:
+        """页面是否已加载完成（document.readyState == "complete"）"""
+        try:
+            return await page.evaluate("document.readyState") == "complete"
+        except Exception:
+            return False
+
+    async def check_live(self, page: Page, kind: str, keys: List[str]) -> bool:
+        """
+        会话开始时在真实页面上检查选择器，等待最多 SELECTOR_DRIFT_TIMEOUT 秒让页面加载和渲染
+
+        到期时仍有配置项没有匹配到元素或页面未加载完成，只说明页面慢，不判定为漂移，
+        交给调用方按正常流程（重新加载、找不到播放器的恢复）处理
+
+        Args:
+            page: 当前页面
+            kind: 页面类型
+            keys: 要检查的配置项
+
+        Returns:
+            bool: 是否完成检查（False 表示结果不确定，下次到达该页面时重新检查）
+
+        Raises:
+            SelectorDriftError: 页面已加载完成，且匹配到的元素与基线中的不是同一个元素
+        """
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.config.SELECTOR_DRIFT_TIMEOUT
+        while True:
+            probes = {key: await self.probe(page, key) for key in keys}
+            all_matched = all(any(r.get("matches") for r in probe.values()) for probe in probes.values())
+            loaded = await self._page_loaded(page)
+            if (all_matched and loaded) or loop.time() >= deadline:
+                break
+            await asyncio.sleep(0.5)
+
+        if not loaded:
+            logger.warning(f"⚠️  {kind} 页面 {self.config.SELECTOR_DRIFT_TIMEOUT} 秒内未加载完成，跳过本次选择器检查")
+            return False
+
+        problems, unmatched = [], []
+        for key, probe in probes.items():
+            failed, minor = await self.diagnose(page, key, kind, probe)
+            if not any(r.get("matches") for r in probe.values()):
+                unmatched.extend(failed)
+                continue
+            problems.extend(failed)
+            for note in minor:
+                logger.warning(f"⚠️  {note}")
+            if not failed and key not in self.baseline:
+                # 首次通过时记录基线，之后才能给出差异
+                self._record(key, probe)
+                self.save_baseline()
+
+        if problems:
+            raise SelectorDriftError("选择器漂移:\n" + "\n".join(problems))
+        if unmatched:
+            logger.warning(
+                f"⚠️  {kind} 页面 {self.config.SELECTOR_DRIFT_TIMEOUT} 秒内没有渲染出以下元素，"
+                f"暂不判定为漂移:\n" + "\n".join(unmatched)
+            )
+            return False
+        return True
@@ -0,0 +1,521 @@
+#!/usr/bin/env python3
+"""
+监控循环模拟工具
+用虚拟时钟驱动的假 Page 运行完成检测和弹窗监控循环，
+几毫秒内跑完一个 2 小时视频，用于测量检测延迟和 CDP 调用次数
+
+用法:
+    python simulation.py                        # 运行全部内置场景，输出 JSON
+    python simulation.py --scenario 2h_dialogs --verbose
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import math
+import selectors
+import sys
+import tempfile
+import time
+from collections import Counter
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+from config import Config
+from popup_handler import POPUP_CHECK_JS, WATCH_THROTTLE_MS
+from video_automator import VideoAutomator
+
+logger = logging.getLogger(__name__)
+
+# 浮点误差容忍度 (秒)
+EPSILON = 1e-6
+
+
+class _VirtualSelector(selectors.BaseSelector):
+    """不阻塞的 selector - 没有就绪的 IO 时直接把虚拟时钟推进到下一个定时器"""
+
+    def __init__(self, loop: "VirtualClockLoop"):
+        self._loop = loop
+        self._selector = selectors.DefaultSelector()
+
+    def register(self, fileobj, events, data=None):
+        return self._selector.register(fileobj, events, data)
+
+    def unregister(self, fileobj):
+        return self._selector.unregister(fileobj)
+
+    def modify(self, fileobj, events, data=None):
+        return self._selector.modify(fileobj, events, data)
+
+    def select(self, timeout=None):
+        ready = self._selector.select(0)
+        if ready or timeout == 0:
+            return ready
+        if timeout is None:
+            # 没有定时器，只能等待其他线程（如写盘）的结果
+            return self._selector.select(None)
+        self._loop.advance(timeout)
+        return []
+
+    def close(self):
+        self._selector.close()
+
+    def get_map(self):
+        return self._selector.get_map()
+
+
+class VirtualClockLoop(asyncio.SelectorEventLoop):
+    """虚拟时钟事件循环 - asyncio.sleep / wait_for 不真正等待，loop.time() 直接跳到下一个定时器"""
+
+    def __init__(self):
+        self._virtual_time = 0.0
+        super().__init__(selector=_VirtualSelector(self))
+
+    def time(self) -> float:
+        return self._virtual_time
+
+    def advance(self, seconds: float):
+        """推进虚拟时钟"""
+        self._virtual_time += seconds
+
+
+class Scenario:
+    """模拟场景 - 描述视频时长、播放中弹出的对话框和卡住的时间段"""
+
+    def __init__(
+        self,
+        name: str,
+        duration: float,
+        dialogs: Sequence[float] = (),
+        stalls: Sequence[Tuple[float, float]] = (),
+        completion_popup: bool = True,
+        playback_rate: float = 1.0,
+        cdp_latency: float = 0.005,
+        url: str = "https://example.invalid/ybdy/play?v_id=1",
+    ):
+        """
+        Args:
+            name: 场景名
+            duration: 视频时长(秒)
+            dialogs: 播放到这些位置(秒)时弹出"继续学习"对话框并暂停，点击后继续
+            stalls: 卡住的时间段 [(开始播放后第几秒, 持续秒数)]，期间播放位置不变但不触发 pause
+            completion_popup: 播放结束时是否弹出"视频播放完成"
+            playback_rate: 播放倍速
+            cdp_latency: 每次页面调用的往返耗时(秒)
+            url: 页面地址
+        """
+        self.name = name
+        self.duration = duration
+        self.dialogs = sorted(dialogs)
+        self.stalls = sorted(stalls)
+        self.completion_popup = completion_popup
+        self.playback_rate = playback_rate
+        self.cdp_latency = cdp_latency
+        self.url = url
+
+
+# 内置场景
+DEFAULT_SCENARIOS = {
+    scenario.name: scenario for scenario in (
+        Scenario("2h_dialogs", 7200, dialogs=range(900, 7200, 900)),
+        Scenario("2h_stall", 7200, stalls=[(1800, 300)]),
+        Scenario("2h_no_popup", 7200, completion_popup=False),
+        Scenario("30m_2x_rate", 1800, dialogs=[600], playback_rate=2.0),
+        Scenario("5m_short", 300),
+    )
+}
+
+
+class FakeVideo:
+    """按虚拟时钟推进的 <video> 状态机"""
+
+    def __init__(
+        self,
+        scenario: Scenario,
+        loop: asyncio.AbstractEventLoop,
+        emit: Callable[[str], None],
+        popup: Callable[[], None],
+    ):
+        """
+        Args:
+            scenario: 模拟场景
+            loop: 虚拟时钟事件循环
+            emit: 媒体事件回调（模拟页面推送的 pause / play / ended）
+            popup: 弹窗事件回调（模拟页面内监视脚本发现"继续"对话框）
+        """
+        self.scenario = scenario
+        self.loop = loop
+        self.emit = emit
+        self.popup = popup
+
+        self.position = 0.0
+        self.playing = True
+        self.ended = False
+        self.started_at = loop.time()
+        self.updated_at = self.started_at
+        self.pending_dialogs = list(scenario.dialogs)
+
+        self.dialog_open = False
+        self.dialog_opened_at: Optional[float] = None
+        self.dialog_latencies: List[float] = []
+        self.ended_at: Optional[float] = None
+        self.completion_visible = False
+        self._timer = None
+        self._schedule()
+
+    def _stall_end(self, t: float) -> Optional[float]:
+        """t 时刻处于卡住状态时返回卡住结束的时间"""
+        offset = t - self.started_at
+        for start, length in self.scenario.stalls:
+            if start <= offset < start + length:
+                return self.started_at + start + length
+        return None
+
+    def _next_transition(self, t: float) -> float:
+        """从 t 开始下一次状态变化（对话框、结束、卡住开始/结束）的时间"""
+        if not self.playing:
+            return math.inf
+
+        stall_end = self._stall_end(t)
+        if stall_end is not None:
+            return stall_end
+
+        target = min(self.pending_dialogs[0] if self.pending_dialogs else math.inf, self.scenario.duration)
+        reach = t + (target - self.position) / self.scenario.playback_rate
+        offset = t - self.started_at
+        next_stall = min(
+            (self.started_at + start for start, _ in self.scenario.stalls if start > offset),
+            default=math.inf
+        )
+        return min(reach, next_stall)
+
+    def _apply_transition(self, t: float):
+        """到达对话框位置或视频结尾时更新状态"""
+        if self.pending_dialogs and self.position >= self.pending_dialogs[0] - EPSILON:
+            self.position = self.pending_dialogs.pop(0)
+            self.playing = False
+            self.dialog_open = True
+            self.dialog_opened_at = t
+            self.emit("pause")
+            # 页面内监视脚本节流后才推送
+            self.loop.call_later(WATCH_THROTTLE_MS / 1000, self.popup)
+        elif self.position >= self.scenario.duration - EPSILON:
+            self.position = self.scenario.duration
+            self.playing = False
+            self.ended = True
+            self.ended_at = t
+            self.completion_visible = self.scenario.completion_popup
+            self.emit("pause")
+            self.emit("ended")
+
+    def sync(self):
+        """把状态推进到当前虚拟时间"""
+        now = self.loop.time()
+        t = self.updated_at
+        while self.playing:
+            transition = self._next_transition(t)
+            step_end = min(transition, now)
+            if self._stall_end(t) is None:
+                self.position += (step_end - t) * self.scenario.playback_rate
+            t = step_end
+            if transition > now + EPSILON:
+                break
+            self._apply_transition(t)
+        self.updated_at = now
+        self._schedule()
+
+    def _schedule(self):
+        """在下一次状态变化时自动推进，使媒体事件按时发出"""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        transition = self._next_transition(self.updated_at)
+        if transition != math.inf:
+            self._timer = self.loop.call_at(transition, self.sync)
+
+    def dismiss_dialog(self):
+        """点击对话框按钮，继续播放"""
+        self.sync()
+        if not self.dialog_open:
+            return
+        self.dialog_open = False
+        self.dialog_latencies.append(self.loop.time() - self.dialog_opened_at)
+        self.playing = True
+        self.emit("play")
+        self._schedule()
+
+    def status(self) -> dict:
+        """与 _wait_for_video_complete 中 evaluate 返回的结构一致"""
+        return {
+            "currentTime": self.position,
+            "duration": self.scenario.duration,
+            "ended": self.ended,
+            "paused": not self.playing,
+            "playbackRate": self.scenario.playback_rate,
+        }
+
+
+class FakeElement:
+    """假元素 - 只支持监控循环用到的方法"""
+
+    def __init__(self, page: "FakePage", kind: str, text: str):
+        self.page = page
+        self.kind = kind
+        self.text = text
+
+    async def is_visible(self) -> bool:
+        await self.page._call("is_visible")
+        return self.kind in self.page._present().values()
+
+    async def text_content(self) -> str:
+        await self.page._call("text_content")
+        return self.text
+
+    async def click(self, **kwargs):
+        await self.page._call("click")
+        self.page._click(self.kind)
+
+
+class _FakeKeyboard:
+    def __init__(self, page: "FakePage"):
+        self.page = page
+
+    async def press(self, key: str):
+        await self.page._call("keyboard.press")
+
+
+class FakePage:
+    """
+    假 Page - 用 Config 中的选择器作为元素标识，不解析选择器本身
+
+    对话框可见时: CONTINUE_BUTTON_SELECTORS[0]、含"继续"的 POPUP_CLOSE_SELECTORS 命中按钮，POPUP_SELECTORS[0] 命中对话框；
+    完成弹窗可见时: COMPLETE_POPUP_SELECTOR、POPUP_SELECTORS[0] 命中弹窗，POPUP_CLOSE_SELECTORS[0] 命中"我知道了"按钮
+    """
+
+    def __init__(
+        self,
+        config: Config,
+        scenario: Scenario,
+        on_media_event: Optional[Callable] = None,
+        on_popup_event: Optional[Callable] = None,
+    ):
+        """
+        Args:
+            config: 配置对象
+            scenario: 模拟场景
+            on_media_event: 媒体事件回调，签名同 VideoAutomator._on_media_event
+            on_popup_event: 弹窗事件回调，签名同 VideoAutomator._on_popup_event
+        """
+        self.config = config
+        self.scenario = scenario
+        self.url = scenario.url
+        self.keyboard = _FakeKeyboard(self)
+        self.calls: Counter = Counter()
+        self.on_media_event = on_media_event
+        self.on_popup_event = on_popup_event
+        self.video = FakeVideo(scenario, asyncio.get_running_loop(), self._emit, self._popup)
+
+        continue_close = next(
+            (s for s in config.POPUP_CLOSE_SELECTORS if "继续" in s),
+            config.POPUP_CLOSE_SELECTORS[0]
+        )
+        self._dialog_selectors = {
+            config.CONTINUE_BUTTON_SELECTORS[0]: "dialog_button",
+            continue_close: "dialog_button",
+            config.POPUP_SELECTORS[0]: "dialog",
+        }
+        self._completion_selectors = {
+            config.COMPLETE_POPUP_SELECTOR: "complete_popup",
+            config.POPUP_SELECTORS[0]: "complete_popup",
+            config.POPUP_CLOSE_SELECTORS[0]: "complete_button",
+        }
+
+    def _emit(self, event_type: str):
+        if self.on_media_event is not None:
+            self.on_media_event(None, event_type)
+
+    def _popup(self):
+        if self.on_popup_event is not None and self.video.dialog_open:
+            self.on_popup_event(None)
+
+    async def _call(self, name: str):
+        """记录一次页面调用并模拟往返耗时"""
+        self.calls[name] += 1
+        await asyncio.sleep(self.scenario.cdp_latency)
+        self.video.sync()
+
+    def _present(self) -> Dict[str, str]:
+        """当前可见的元素: 选择器 -> 元素类型"""
+        present = {}
+        if self.video.dialog_open:
+            present.update(self._dialog_selectors)
+        if self.video.completion_visible:
+            for selector, kind in self._completion_selectors.items():
+                present.setdefault(selector, kind)
+        return present
+
+    def _click(self, kind: str):
+        if kind == "dialog_button":
+            self.video.dismiss_dialog()
+        elif kind == "complete_button":
+            self.video.completion_visible = False
+
+    def _element_id(self, kind: str) -> str:
+        """元素标识，每次新出现的对话框不同（与页面内脚本标记的 data-va-popup-id 对应）"""
+        if kind.startswith("dialog"):
+            return f"{kind}-{len(self.video.dialog_latencies)}"
+        return kind
+
+    def _check_popups(self, rules: List[dict], skip: List[str]) -> dict:
+        """模拟 PopupHandler 的页面内匹配脚本"""
+        present = self._present()
+        for rule in rules:
+            for matcher in rule["matchers"]:
+                kind = present.get(matcher["selector"])
+                if kind is None or self._element_id(kind) in skip:
+                    continue
+                text = "继续学习" if kind.startswith("dialog") else "我知道了"
+                return {"rule": rule["name"], "selector": matcher["selector"],
+                        "id": self._element_id(kind), "text": text, "errors": []}
+        return {"rule": None, "errors": []}
+
+    async def click(self, selector: str, **kwargs):
+        await self._call("click")
+        for kind in set(self._present().values()):
+            if f'"{self._element_id(kind)}"' in selector:
+                self._click(kind)
+                return
+
+    async def query_selector(self, selector: str) -> Optional[FakeElement]:
+        await self._call("query_selector")
+        kind = self._present().get(selector)
+        if kind is None:
+            return None
+        text = "继续学习" if kind.startswith("dialog") else "我知道了"
+        return FakeElement(self, kind, text)
+
+    async def evaluate(self, script: str, *args):
+        await self._call("evaluate")
+        if script == POPUP_CHECK_JS:
+            return self._check_popups(args[0]["rules"], args[0]["skip"])
+        if "currentTime" in script:
+            return self.video.status()
+        return None
+
+
+async def _simulate(scenario: Scenario, config: Config) -> dict:
+    loop = asyncio.get_running_loop()
+    automator = VideoAutomator(config)
+    page = FakePage(
+        config, scenario,
+        on_media_event=automator._on_media_event,
+        on_popup_event=automator._on_popup_event,
+    )
+    automator.page = page
+    automator.current_video_index = 1
+    automator.current_href = config.VIDEO_HREF_LIST[0]
+
+    # 卡住检测会保存 trace，这里只记录检测时间
+    stall_detections = []
+
+    async def record_stall(name):
+        stall_detections.append(loop.time())
+        return None
+
+    automator.tracer.persist = record_stall
+
+    started = loop.time()
+    automator.session_active = True
+    # 模拟时间上限，防止循环永不退出
+    limit = scenario.duration / scenario.playback_rate * 3 + 3600
+    error = None
+    try:
+        results = await asyncio.wait_for(
+            asyncio.gather(
+                automator._monitor_and_handle_popups(),
+                automator._wait_for_video_complete(),
+                return_exceptions=True
+            ),
+            timeout=limit
+        )
+        error = next((r for r in results if isinstance(r, BaseException)), None)
+    except asyncio.TimeoutError:
+        error = TimeoutError(f"模拟超过 {limit:.0f} 秒仍未结束")
+    finished = loop.time()
+
+    video = page.video
+    stall_starts = [started + start for start, _ in scenario.stalls]
+    return {
+        "scenario": scenario.name,
+        "completed": error is None,
+        "error": repr(error) if error else None,
+        "video_duration": scenario.duration,
+        "ended_at": round(video.ended_at - started, 3) if video.ended_at is not None else None,
+        "finished_at": round(finished - started, 3),
+        # 结束播放到监控循环退出的时间，负值表示按 99.5% 规则提前退出
+        "completion_latency": round(finished - video.ended_at, 3) if video.ended_at is not None else None,
+        "dialogs_shown": len(scenario.dialogs) - len(video.pending_dialogs),
+        "dialog_latencies": [round(latency, 3) for latency in video.dialog_latencies],
+        "stall_detection_latencies": [
+            round(detected - max(s for s in stall_starts if s <= detected), 3)
+            for detected in stall_detections if any(s <= detected for s in stall_starts)
+        ],
+        "cdp_calls": dict(page.calls),
+        "cdp_total": sum(page.calls.values()),
+        "cdp_calls_per_minute": round(sum(page.calls.values()) / max(finished - started, 1) * 60, 2),
+    }
+
+
+def simulate(scenario: Scenario, config: Optional[Config] = None) -> dict:
+    """
+    在虚拟时钟上运行一次完成检测 + 弹窗监控
+
+    Args:
+        scenario: 模拟场景
+        config: 配置对象，为None时使用默认配置
+
+    Returns:
+        dict: 检测延迟、CDP 调用次数等结果（时间均为虚拟秒）
+    """
+    config = config or Config()
+    loop = VirtualClockLoop()
+    wall_started = time.perf_counter()
+    with tempfile.TemporaryDirectory() as tmp:
+        # 不写真实的缓存、截图和 trace
+        config.DURATION_CACHE_FILE = str(Path(tmp) / "durations.json")
+        config.SAVE_SCREENSHOTS = False
+        config.TRACE_ENABLED = False
+        config.PLAYLIST_FILE = ""
+        config.VIDEO_HREF_LIST = ["/simulation"]
+        try:
+            result = loop.run_until_complete(_simulate(scenario, config))
+        finally:
+            loop.close()
+    result["wall_ms"] = round((time.perf_counter() - wall_started) * 1000, 1)
+    return result
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="用虚拟时钟模拟视频监控循环，输出 JSON 结果")
+    parser.add_argument(
+        "--scenario",
+        action="append",
+        choices=sorted(DEFAULT_SCENARIOS),
+        help="要运行的场景，可重复指定（默认全部）",
+    )
+    parser.add_argument("--verbose", action="store_true", help="输出监控循环的日志")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(
+        level=logging.INFO if args.verbose else logging.ERROR,
+        format='%(levelname)s - %(name)s - %(message)s'
+    )
+
+    results = [simulate(DEFAULT_SCENARIOS[name]) for name in args.scenario or DEFAULT_SCENARIOS]
+    print(json.dumps(results, ensure_ascii=False, indent=2))
+    return 0 if all(result["completed"] for result in results) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
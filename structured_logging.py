@@ -0,0 +1,100 @@
+"""
+结构化日志模块
+为日志记录附加当前视频上下文（href、阶段、进度、耗时等），并输出 JSON Lines
+"""
+
+import copy
+import json
+import logging
+from contextvars import ContextVar
+from datetime import datetime
+from logging.handlers import QueueHandler
+
+# 结构化字段：既可以通过 set_log_context 设置为上下文，也可以通过 extra= 随单条日志传入
+STRUCTURED_FIELDS = (
+    "video_index",
+    "href",
+    "attempt",
+    "phase",
+    "progress",
+    "current_time",
+    "duration",
+    "latency",
+    "error_kind",
+)
+
+_log_context: ContextVar = ContextVar("log_context", default={})
+
+
+def set_log_context(**fields):
+    """
+    设置当前任务的日志上下文（值为 None 的字段会被移除）
+
+    Args:
+        **fields: 结构化字段
+    """
+    context = dict(_log_context.get())
+    for key, value in fields.items():
+        if value is None:
+            context.pop(key, None)
+        else:
+            context[key] = value
+    _log_context.set(context)
+
+
+def clear_log_context():
+    """清空当前任务的日志上下文"""
+    _log_context.set({})
+
+
+class ContextFilter(logging.Filter):
+    """把日志上下文写入 LogRecord（在产生日志的线程中执行，保证上下文正确）"""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        for key, value in _log_context.get().items():
+            if not hasattr(record, key):
+                setattr(record, key, value)
+        return True
+
+
+class JsonLinesFormatter(logging.Formatter):
+    """JSON Lines 格式化器 - 每条日志一行 JSON，便于程序分析"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": datetime.fromtimestamp(record.created).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        for key in STRUCTURED_FIELDS:
+            value = getattr(record, key, None)
+            if value is not None:
+                entry[key] = value
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry["exc"] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class StructuredQueueHandler(QueueHandler):
+    """
+    保留异常信息的 QueueHandler
+
+    标准 QueueHandler.prepare() 会把堆栈拼进消息并清空 exc_info / exc_text，
+    JSON 日志因此拿不到单独的 exc 字段；这里只合并消息参数，把堆栈预先渲染到 exc_text，
+    由各输出端的格式化器自行附加
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record = copy.copy(record)
+        record.message = record.getMessage()
+        record.msg = record.message
+        record.args = None
+        if record.exc_info:
+            if not record.exc_text:
+                record.exc_text = logging.Formatter().formatException(record.exc_info)
+            # 不把 traceback 对象放入队列，避免其引用的栈帧在输出前一直存活
+            record.exc_info = None
+        return record
@@ -2,12 +2,28 @@
 """
 选择器测试工具
 帮助您快速测试和验证网站的选择器配置
+
+用法:
+    python test_selectors.py                    # 交互式测试
+    python test_selectors.py URL                # 快速测试常用选择器
+    python test_selectors.py --profile TARGET   # 无头模式测量 config.py 中所有选择器的开销，输出 JSON
+                                                # TARGET 可以是 URL 或保存的 DOM 快照 (.html / .html.gz)
 """
 
+import argparse
 import asyncio
+import gzip
+import json
+import statistics
 import sys
+import time
+from pathlib import Path
+from typing import List, Tuple
+
 from playwright.async_api import async_playwright
 
+from config import Config
+
 
 async def test_selectors():
     """测试选择器的交互式工具"""
@@ -200,13 +216,185 @@ async def quick_test(url: str):
             await browser.close()
 
 
+def config_selectors(config: Config) -> List[Tuple[str, str]]:
+    """
+    收集配置中的所有选择器（*_SELECTOR、*_SELECTORS、*_XPATH）
+
+    Args:
+        config: 配置对象
+
+    Returns:
+        List[Tuple[str, str]]: (配置项名, 选择器)，XPATH 项统一加上 xpath= 前缀
+    """
+    selectors = []
+    for name in dir(config):
+        if not name.isupper():
+            continue
+        value = getattr(config, name)
+        if name.endswith("_SELECTORS"):
+            selectors.extend((name, selector) for selector in value)
+        elif name.endswith("_SELECTOR"):
+            selectors.append((name, value))
+        elif name.endswith("_XPATH") and value:
+            selectors.append((name, value if value.startswith("xpath=") else f"xpath={value}"))
+    return selectors
+
+
+def selector_engine(selector: str) -> str:
+    """粗略区分选择器类型，便于比较开销"""
+    if selector.startswith(("xpath=", "//", "..")):
+        return "xpath"
+    if ":has-text(" in selector or selector.startswith("text="):
+        return "text"
+    if "*=" in selector:
+        return "css-substring"
+    return "css"
+
+
+async def load_target(page, target: str):
+    """
+    打开 URL，或把保存的 DOM 快照载入页面
+
+    Args:
+        page: Playwright Page 对象
+        target: URL 或 .html / .html.gz 文件路径
+    """
+    path = Path(target)
+    if path.is_file():
+        if path.suffix == ".gz":
+            html = gzip.decompress(path.read_bytes()).decode("utf-8", errors="replace")
+        else:
+            html = path.read_text(encoding="utf-8", errors="replace")
+        await page.set_content(html, wait_until="load")
+        return
+
+    await page.goto(target, timeout=30000)
+    try:
+        await page.wait_for_load_state('networkidle', timeout=15000)
+    except Exception:
+        pass
+
+
+async def measure_selector(page, selector: str, runs: int) -> dict:
+    """
+    测量单个选择器: 匹配数、可见数，以及 query_selector 的耗时（与监控循环中的调用方式一致）
+
+    Args:
+        page: Playwright Page 对象
+        selector: 选择器
+        runs: 重复次数
+
+    Returns:
+        dict: 测量结果，耗时单位为毫秒
+    """
+    try:
+        elements = await page.query_selector_all(selector)
+        visible = 0
+        for element in elements:
+            if await element.is_visible():
+                visible += 1
+
+        samples = []
+        for _ in range(runs):
+            started = time.perf_counter()
+            await page.query_selector(selector)
+            samples.append((time.perf_counter() - started) * 1000)
+    except Exception as e:
+        return {"matches": 0, "visible": 0, "error": str(e).splitlines()[0]}
+
+    return {
+        "matches": len(elements),
+        "visible": visible,
+        "median_ms": round(statistics.median(samples), 3),
+        "min_ms": round(min(samples), 3),
+        "max_ms": round(max(samples), 3),
+    }
+
+
+async def profile_selectors(target: str, runs: int = 20, headed: bool = False) -> dict:
+    """
+    无头打开页面或快照，测量 config.py 中每个选择器的匹配情况和开销
+
+    Args:
+        target: URL 或 DOM 快照路径
+        runs: 每个选择器的重复次数
+        headed: 是否显示浏览器窗口
+
+    Returns:
+        dict: 可直接序列化为 JSON 的报告
+    """
+    config = Config()
+
+    async with async_playwright() as p:
+        browser = await p.chromium.launch(headless=not headed)
+        try:
+            page = await browser.new_page()
+            await load_target(page, target)
+
+            # 基准: 最简单的选择器，近似一次 CDP 往返的固定开销
+            baseline = await measure_selector(page, "html", runs)
+
+            results = []
+            for name, selector in config_selectors(config):
+                result = {"name": name, "selector": selector, "engine": selector_engine(selector)}
+                result.update(await measure_selector(page, selector, runs))
+                if "median_ms" in result and "median_ms" in baseline:
+                    result["over_baseline_ms"] = round(result["median_ms"] - baseline["median_ms"], 3)
+                results.append(result)
+        finally:
+            await browser.close()
+
+    # 每个配置项中仍能匹配到可见元素、且开销最低的选择器
+    cheapest = {}
+    for result in results:
+        if not result.get("visible"):
+            continue
+        best = cheapest.get(result["name"])
+        if best is None or result["median_ms"] < best["median_ms"]:
+            cheapest[result["name"]] = {"selector": result["selector"], "median_ms": result["median_ms"]}
+
+    return {
+        "target": target,
+        "runs": runs,
+        "baseline_ms": baseline.get("median_ms"),
+        "selectors": results,
+        "cheapest_matching": cheapest,
+    }
+
+
+def parse_args(argv=None) -> argparse.Namespace:
+    """解析命令行参数"""
+    parser = argparse.ArgumentParser(description="选择器测试工具")
+    parser.add_argument("url", nargs="?", help="快速测试常用选择器的网站 URL（不提供则进入交互模式）")
+    parser.add_argument(
+        "--profile",
+        metavar="TARGET",
+        help="无头测量 config.py 中所有选择器的匹配情况和开销，TARGET 为 URL 或 DOM 快照 (.html / .html.gz)",
+    )
+    parser.add_argument("--runs", type=int, default=20, help="--profile 时每个选择器的重复次数（默认 20）")
+    parser.add_argument("--output", metavar="FILE", help="--profile 结果写入文件（默认输出到终端）")
+    parser.add_argument("--headed", action="store_true", help="--profile 时显示浏览器窗口")
+    return parser.parse_args(argv)
+
+
 if __name__ == "__main__":
+    args = parse_args()
+
+    if args.profile:
+        # 非交互的性能测量
+        report = asyncio.run(profile_selectors(args.profile, runs=max(1, args.runs), headed=args.headed))
+        output = json.dumps(report, ensure_ascii=False, indent=2)
+        if args.output:
+            Path(args.output).write_text(output + "\n", encoding="utf-8")
+        else:
+            print(output)
+        sys.exit(0)
+
     print()
 
-    if len(sys.argv) > 1:
+    if args.url:
         # 如果提供了URL参数，直接运行快速测试
-        url = sys.argv[1]
-        asyncio.run(quick_test(url))
+        asyncio.run(quick_test(args.url))
     else:
         # 否则运行交互式测试
         asyncio.run(test_selectors())
@@ -0,0 +1,204 @@
+"""
+滚动追踪模块
+持续录制 Playwright trace，按固定时长切块放入环形缓冲区，只在视频失败或卡住时落盘
+"""
+
+import asyncio
+import logging
+import math
+import shutil
+import time
+from collections import deque
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, Optional
+
+from playwright.async_api import BrowserContext, Page
+
+logger = logging.getLogger(__name__)
+
+
+class TraceRecorder:
+    """滚动追踪录制器 - 只保留最近 N 分钟的 trace 分块"""
+
+    def __init__(self, config):
+        """
+        初始化追踪录制器
+
+        Args:
+            config: 配置对象，包含 trace 开关、分块时长和缓冲时长
+        """
+        self.config = config
+        self.enabled = config.TRACE_ENABLED
+        self.chunk_seconds = config.TRACE_CHUNK_SECONDS
+        self.max_chunks = max(1, math.ceil(config.TRACE_BUFFER_MINUTES * 60 / self.chunk_seconds))
+
+        self.trace_dir = Path(config.TRACE_DIR)
+        self.buffer_dir = self.trace_dir / ".buffer"
+
+        self.context: Optional[BrowserContext] = None
+        self.page_getter: Optional[Callable[[], Optional[Page]]] = None
+        self.task: Optional[asyncio.Task] = None
+        self.lock = asyncio.Lock()
+
+        # 环形缓冲区: 每项为一个分块的文件列表 (trace zip + 低频截图)
+        self.chunks = deque()
+        self.chunk_seq = 0
+
+        # 开销统计（用于评估能否在生产环境常开）
+        self.overhead_seconds = 0.0
+        self.session_started_at = 0.0
+        self.persisted_count = 0
+
+    async def start(self, context: BrowserContext, page_getter: Callable[[], Optional[Page]]):
+        """
+        在上下文上开始滚动录制
+
+        Args:
+            context: 浏览器上下文
+            page_getter: 返回当前页面的回调（页面可能在恢复过程中被替换）
+        """
+        if not self.enabled:
+            return
+
+        self.context = context
+        self.page_getter = page_getter
+        self.buffer_dir.mkdir(parents=True, exist_ok=True)
+        self.session_started_at = time.monotonic()
+        self.overhead_seconds = 0.0
+
+        started = time.monotonic()
+        await context.tracing.start(screenshots=False, snapshots=True, sources=False)
+        await context.tracing.start_chunk()
+        self.overhead_seconds += time.monotonic() - started
+
+        self.task = asyncio.create_task(self._rotate_loop())
+        logger.debug(
+            f"滚动 trace 已开启 (分块 {self.chunk_seconds} 秒，保留 {self.max_chunks} 块)"
+        )
+
+    async def _rotate_loop(self):
+        """定时切块"""
+        while True:
+            await asyncio.sleep(self.chunk_seconds)
+            async with self.lock:
+                try:
+                    await self._rotate()
+                except Exception as e:
+                    logger.debug(f"trace 切块失败: {e}")
+
+    async def _rotate(self, restart: bool = True):
+        """
+        结束当前分块并放入缓冲区，淘汰超出时长的旧分块
+
+        Args:
+            restart: 是否紧接着开始下一个分块
+        """
+        started = time.monotonic()
+        self.chunk_seq += 1
+        stem = f"chunk_{self.chunk_seq:05d}"
+        files = []
+
+        trace_path = self.buffer_dir / f"{stem}.zip"
+        await self.context.tracing.stop_chunk(path=str(trace_path))
+        files.append(trace_path)
+
+        # 低频截图：每个分块一张，在两次分块之间截取，不计入 trace
+        page = self.page_getter() if self.page_getter else None
+        if page is not None:
+            screenshot_path = self.buffer_dir / f"{stem}.jpg"
+            try:
+                await page.screenshot(
+                    path=str(screenshot_path),
+                    type="jpeg",
+                    quality=self.config.TRACE_SCREENSHOT_QUALITY,
+                    timeout=3000
+                )
+                files.append(screenshot_path)
+            except Exception as e:
+                logger.debug(f"trace 截图失败: {e}")
+
+        if restart:
+            await self.context.tracing.start_chunk()
+
+        self.chunks.append(files)
+        while len(self.chunks) > self.max_chunks:
+            for path in self.chunks.popleft():
+                path.unlink(missing_ok=True)
+
+        self.overhead_seconds += time.monotonic() - started
+
+    async def persist(self, name: str) -> Optional[Path]:
+        """
+        把缓冲区中的分块（含当前分块）保存到 TRACE_DIR
+
+        Args:
+            name: 目录名前缀
+
+        Returns:
+            Path: 保存目录，未开启或失败时返回 None
+        """
+        if not self.enabled or self.context is None:
+            return None
+
+        async with self.lock:
+            try:
+                await self._rotate()
+            except Exception as e:
+                logger.debug(f"保存前切块失败: {e}")
+
+            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+            target = self.trace_dir / f"{name}_{timestamp}"
+            target.mkdir(parents=True, exist_ok=True)
+            for files in self.chunks:
+                for path in files:
+                    if path.exists():
+                        shutil.copy2(path, target / path.name)
+
+        self.persisted_count += 1
+        logger.info(f"🧵 最近 {len(self.chunks)} 段 trace 已保存: {target}")
+        logger.info(f"   使用 'playwright show-trace {target}/chunk_XXXXX.zip' 查看")
+        return target
+
+    async def stop(self, persist_as: Optional[str] = None):
+        """
+        停止录制；persist_as 不为空时先保存缓冲区，否则直接丢弃。已停止时什么都不做
+
+        Args:
+            persist_as: 保存目录名前缀，None 表示视频成功、丢弃全部分块
+        """
+        if not self.enabled or self.context is None:
+            return
+
+        if self.task:
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+            self.task = None
+
+        if persist_as:
+            await self.persist(persist_as)
+
+        started = time.monotonic()
+        try:
+            await self.context.tracing.stop()
+        except Exception as e:
+            logger.debug(f"停止 trace 时出错: {e}")
+        self.overhead_seconds += time.monotonic() - started
+
+        for files in self.chunks:
+            for path in files:
+                path.unlink(missing_ok=True)
+        self.chunks.clear()
+
+        elapsed = time.monotonic() - self.session_started_at
+        if elapsed > 0:
+            logger.info(
+                f"trace 开销: {self.overhead_seconds:.2f}s / {elapsed:.0f}s "
+                f"({self.overhead_seconds / elapsed * 100:.2f}%)"
+            )
+
+        self.context = None
+        self.page_getter = None
@@ -4,19 +4,60 @@
 """
 
 import asyncio
+import itertools
+import json
 import logging
+import math
 import os
-import requests
+import signal
+import time
 from datetime import datetime
-from typing import Optional
 from pathlib import Path
+from typing import Any, Dict, List, Optional
 from playwright.async_api import async_playwright, Page, Browser, BrowserContext
+from playwright.async_api import TimeoutError as PlaywrightTimeoutError
 
 from config import Config
-from popup_handler import PopupHandler
+from popup_handler import PopupHandler, PopupMatch
+from retry_queue import RetryScheduler
+from artifacts import ArtifactCollector
+from trace_recorder import TraceRecorder
+from structured_logging import set_log_context
+from metrics import Metrics, MetricsServer, browser_rss_bytes
+from duration_scan import DurationCache, EtaEstimator, scan_durations, format_seconds
+from discovery import PlaylistDiscovery
+from playlist import get_playlist
+from control import ControlServer
+from process_tree import snapshot_descendants, kill_processes
+from har_bundle import HarBundle
+from network_usage import NetworkCollector
+from run_history import RunHistory
+from virtual_display import VirtualDisplay
+from selector_drift import SelectorDriftChecker
+from errors import (
+    VideoAutomationError,
+    LoggedOutError,
+    PlayerMissingError,
+    SelectorDriftError,
+    RendererCrashError,
+    BrowserClosedError,
+    PlaybackTimeoutError,
+    classify_error,
+    RECOVERY_RELOAD,
+    RECOVERY_RELOGIN,
+    RECOVERY_WAIT_NETWORK,
+    RECOVERY_NEW_PAGE,
+    RECOVERY_RESTART_BROWSER,
+)
 
 logger = logging.getLogger(__name__)
 
+# 页面向脚本推送媒体事件所用的绑定名
+MEDIA_EVENT_BINDING = "__videoAutomationMediaEvent"
+
+# 页面内监视脚本发现播放中的弹窗时调用的绑定名
+POPUP_EVENT_BINDING = "__videoAutomationPopupEvent"
+
 
 class VideoAutomator:
     """视频自动化器 - 简化版"""
@@ -29,69 +70,213 @@ class VideoAutomator:
             config: 配置对象，如果为None则使用默认配置
         """
         self.config = config or Config()
-        self.popup_handler = PopupHandler(self.config)
+        self.artifacts = ArtifactCollector(self.config)
+        self.tracer = TraceRecorder(self.config)
+        self.metrics = Metrics()
+        self.popup_handler = PopupHandler(
+            self.config, metrics=self.metrics, before_action=self._before_popup_action
+        )
+        self.network = NetworkCollector(self.config)
+        self._register_metrics()
+        self.history = RunHistory(self.config)
+        self.display = VirtualDisplay(self.config)
+        self.duration_cache = DurationCache(self.config.DURATION_CACHE_FILE)
+        self.eta = EtaEstimator({}, self.config.VIDEO_OVERHEAD_ESTIMATE)
+        self.scheduler: Optional[RetryScheduler] = None
+        self.metrics_server = MetricsServer(
+            self.metrics,
+            host=self.config.METRICS_HOST,
+            port=self.config.METRICS_PORT
+        )
+        self.control_server = ControlServer(self, self.config.CONTROL_SOCKET)
+        self.har = HarBundle(self.config)
+        self.drift_checker = SelectorDriftChecker(self.config)
+        # 本次运行已在真实页面上检查过的页面类型（每类只在第一次到达时检查）
+        self.drift_checked = set()
 
+        self.playwright = None
         self.browser: Optional[Browser] = None
         self.context: Optional[BrowserContext] = None
         self.page: Optional[Page] = None
 
         self.session_active = False
+        self.page_crashed = False
+        self.media_event = asyncio.Event()
+        self.popup_event = asyncio.Event()
+        self.last_error: Optional[VideoAutomationError] = None
+        self.current_video_index = 0
+        self.current_href = ""
+        self.phase_timings = {}
+        self.video_popup_count = 0
         self.videos_completed = 0
-        self.total_videos = len(self.config.VIDEO_HREF_LIST)
-
-        # 创建截图目录
-        if self.config.SAVE_SCREENSHOTS:
-            Path(self.config.SCREENSHOT_DIR).mkdir(parents=True, exist_ok=True)
+        self.failed_videos = []
+        self.skipped_videos = []
+        self.playlist = get_playlist(self.config)
+        self.total_videos = len(self.playlist)
+
+        # 控制命令: 暂停时清除，继续时设置；正在播放的视频会话可被跳过
+        self.resume_event = asyncio.Event()
+        self.resume_event.set()
+        self.session_task: Optional[asyncio.Task] = None
+        self.skip_requested = False
+
+        # 退出信号: 第一次优雅退出（有时限），第二次立即结束浏览器进程
+        self.shutdown_signal: Optional[int] = None
+        self.interrupted_video = None
+        self.cancelled_session: Optional[asyncio.Task] = None
+        self.main_task: Optional[asyncio.Task] = None
+        self.browser_processes: Dict[int, float] = {}
+        self._previous_signal_handlers = {}
+        self._force_kill_handle = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
 
         logger.info("视频自动化器初始化完成")
 
     async def start(self):
-        """启动自动化流程 - 每个视频独立浏览器会话"""
+        """启动自动化流程 - 每个视频独立浏览器上下文，浏览器进程在视频间复用"""
         logger.info("=" * 60)
         logger.info("视频自动化脚本启动 (独立会话模式)")
         logger.info("=" * 60)
 
-        if not self.config.VIDEO_HREF_LIST:
-            logger.warning("⚠️  VIDEO_HREF_LIST 为空，请在 config.py 中配置视频列表")
+        if not self.playlist:
+            logger.warning("⚠️  播放列表为空，请配置 VIDEO_HREF_LIST 或 PLAYLIST_FILE")
             return
 
         logger.info(f"共有 {self.total_videos} 个视频待播放\n")
 
         # 记录失败的视频
-        failed_videos = []
-
-        for idx, href in enumerate(self.config.VIDEO_HREF_LIST, 1):
-            logger.info("=" * 60)
-            logger.info(f"[{idx}/{self.total_videos}] 开始处理视频")
-            logger.info(f"URL: {self.config.VIDEO_SITE_URL}{href}")
-            logger.info("=" * 60)
+        failed_videos = self.failed_videos
+
+        # 待播放队列，"retry" 策略下失败的视频会以指数退避重新入队
+        scheduler = self.scheduler = RetryScheduler(
+            self.playlist,
+            max_retries=self.config.FAILURE_MAX_RETRIES,
+            base_delay=self.config.RETRY_BASE_DELAY,
+            backoff_factor=self.config.RETRY_BACKOFF_FACTOR,
+            max_delay=self.config.RETRY_MAX_DELAY,
+        )
 
+        self.metrics.videos_total = self.total_videos
+        if self.config.METRICS_ENABLED:
             try:
-                # 为每个视频启动独立的浏览器会话
-                success = await self._play_single_video_session(href, idx)
+                await self.metrics_server.start()
+            except OSError as e:
+                logger.warning(f"指标端点启动失败: {e}")
+        if self.config.CONTROL_SOCKET:
+            try:
+                await self.control_server.start()
+            except OSError as e:
+                logger.warning(f"控制端点启动失败: {e}")
+
+        self.history.start_run(self.total_videos)
+        self.main_task = asyncio.current_task()
+        self._install_signal_handlers()
+        try:
+            self.playwright = await async_playwright().start()
+
+            # 时长预扫描（或仅使用缓存），估算总耗时
+            await self._prepare_eta()
+
+            while True:
+                if not self.resume_event.is_set():
+                    logger.info("⏸️  已暂停，等待 resume 命令...")
+                    await self.resume_event.wait()
+                    logger.info("▶️  继续播放")
+
+                item = await scheduler.next()
+                if item is None:
+                    break
+                idx, href = item
+
+                logger.info("=" * 60)
+                attempt = scheduler.attempt_of(idx)
+                set_log_context(attempt=attempt)
+                attempt_info = f" (第 {attempt} 次尝试)" if attempt > 1 else ""
+                logger.info(f"[{idx}/{self.total_videos}] 开始处理视频{attempt_info}")
+                logger.info(f"URL: {self.config.VIDEO_SITE_URL}{href}")
+                logger.info("=" * 60)
+
+                try:
+                    # 为每个视频创建独立的浏览器会话（放在任务中，以便控制命令跳过）
+                    self.skip_requested = False
+                    self.session_task = asyncio.ensure_future(
+                        self._play_single_video_session(href, idx)
+                    )
+                    # 不直接 await 任务: 退出时主流程立即收到取消，会话的收尾由 _shutdown 限时等待
+                    await asyncio.wait({self.session_task})
+                    success = self.session_task.result()
+                except asyncio.CancelledError:
+                    if not self.skip_requested:
+                        self.interrupted_video = (idx, href)
+                        raise
+                    logger.info(f"⏭️  视频 {idx}/{self.total_videos} 已跳过\n")
+                    self.skipped_videos.append((idx, href))
+                    continue
+                except KeyboardInterrupt:
+                    logger.info("\n用户中断，正在退出...")
+                    break
+                except Exception as e:
+                    logger.error(f"❌ 播放视频 {idx} 时出错: {e}", exc_info=True)
+                    self.last_error = classify_error(e)
+                    success = False
+                finally:
+                    self.session_task = None
 
                 if success:
                     self.videos_completed += 1
-                    logger.info(f"✅ 视频 {idx}/{self.total_videos} 播放完成\n")
-                else:
+                    self.metrics.videos_done += 1
+                    logger.info(f"✅ 视频 {idx}/{self.total_videos} 播放完成")
+                    self._log_eta()
+                    continue
+
+                logger.warning(f"❌ 视频 {idx}/{self.total_videos} 播放失败\n")
+
+                # 选择器失效时后面的视频都会以同样方式失败，直接停止
+                if isinstance(self.last_error, SelectorDriftError):
                     failed_videos.append((idx, href))
-                    logger.warning(f"❌ 视频 {idx}/{self.total_videos} 播放失败\n")
+                    self.metrics.videos_failed += 1
+                    logger.error(f"❌ {self.last_error}")
+                    logger.error("选择器已失效，停止播放；更新 config.py 中的选择器后可运行 check-selectors 验证")
+                    break
 
-            except KeyboardInterrupt:
-                logger.info("\n用户中断，正在退出...")
-                break
-            except Exception as e:
-                logger.error(f"❌ 播放视频 {idx} 时出错: {e}", exc_info=True)
-                failed_videos.append((idx, href))
+                if self.config.FAILURE_POLICY == "retry":
+                    if self.last_error is not None and not self.last_error.retryable:
+                        logger.warning(f"错误 [{self.last_error.kind}] 无法通过重试解决，跳过重试")
+                        failed_videos.append((idx, href))
+                        self.metrics.videos_failed += 1
+                    elif scheduler.schedule_retry(idx, href):
+                        self.metrics.retries += 1
+                    else:
+                        failed_videos.append((idx, href))
+                        self.metrics.videos_failed += 1
+                    continue
 
-                # 询问是否继续
-                try:
-                    response = input(f"\n视频 {idx} 播放失败，是否继续下一个？(y/n): ").strip().lower()
-                    if response != 'y':
-                        logger.info("用户选择停止")
-                        break
-                except:
+                failed_videos.append((idx, href))
+                self.metrics.videos_failed += 1
+                if not self._should_continue_after_failure(idx):
                     break
+        except asyncio.CancelledError:
+            # 由退出信号取消时正常收尾，其余取消继续向上传递
+            if self.shutdown_signal is None:
+                raise
+            task = asyncio.current_task()
+            if hasattr(task, "uncancel"):
+                task.uncancel()
+            logger.warning("已停止播放，正在退出...")
+        finally:
+            self._save_progress()
+            try:
+                await self._shutdown()
+            finally:
+                # 在被取消的会话收尾（写入其运行历史）之后再结束本次运行的记录
+                self.history.finish_run(
+                    completed=self.videos_completed,
+                    failed=len(failed_videos),
+                    skipped=len(self.skipped_videos),
+                    retries=scheduler.retry_count,
+                    shutdown_signal=signal.Signals(self.shutdown_signal).name if self.shutdown_signal else None,
+                )
+            self._remove_signal_handlers()
 
         # 最终统计报告
         logger.info("\n" + "=" * 60)
@@ -99,18 +284,428 @@ class VideoAutomator:
         logger.info("=" * 60)
         logger.info(f"成功: {self.videos_completed}/{self.total_videos}")
         logger.info(f"失败: {len(failed_videos)}/{self.total_videos}")
+        if self.skipped_videos:
+            logger.info(f"跳过: {len(self.skipped_videos)}/{self.total_videos}")
+        if scheduler.retry_count:
+            logger.info(f"重试: {scheduler.retry_count} 次")
+        for line in self.network.report_lines():
+            logger.info(line)
 
         if failed_videos:
             logger.info("\n失败的视频:")
-            for video_idx, video_href in failed_videos:
+            for video_idx, video_href in sorted(failed_videos):
                 logger.info(f"  - 视频 {video_idx}: {video_href}")
 
         logger.info("=" * 60)
 
+    def _register_metrics(self):
+        """注册弹窗规则、截图采集和网络流量的指标（名称和类型在这里显式声明）"""
+        self.metrics.register(
+            "video_automation_popups_handled_by_rule_total", "counter", "Popups handled per rule",
+            lambda: [({"rule": k}, v) for k, v in sorted(self.popup_handler.handled_by_rule.items())],
+        )
+        self.metrics.register(
+            "video_automation_artifacts_saved_total", "counter", "Screenshots and snapshots saved",
+            lambda: self.artifacts.get_statistics()["artifacts_saved"],
+        )
+        self.metrics.register(
+            "video_automation_artifact_bytes", "gauge", "Bytes currently kept in the artifact directory",
+            lambda: self.artifacts.get_statistics()["artifact_bytes"],
+        )
+        self.metrics.register(
+            "video_automation_artifacts_pending", "gauge", "Artifacts waiting to be written",
+            lambda: self.artifacts.get_statistics()["artifacts_pending"],
+        )
+        self.metrics.register(
+            "video_automation_network_bytes_total", "counter", "Network bytes received by video sessions",
+            lambda: self.network.get_statistics()["network_bytes"],
+        )
+        self.metrics.register(
+            "video_automation_network_requests_total", "counter", "Network requests made by video sessions",
+            lambda: self.network.get_statistics()["network_requests"],
+        )
+
+    def _install_signal_handlers(self):
+        """接管 SIGINT / SIGTERM，改为有时限的优雅退出"""
+        self._loop = asyncio.get_running_loop()
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            try:
+                self._previous_signal_handlers[signum] = signal.signal(signum, self._on_signal)
+            except (ValueError, OSError) as e:
+                logger.debug(f"无法注册信号 {signum} 的处理器: {e}")
+
+    def _remove_signal_handlers(self):
+        """恢复原来的信号处理器"""
+        for signum, handler in self._previous_signal_handlers.items():
+            signal.signal(signum, handler)
+        self._previous_signal_handlers = {}
+
+    def _on_signal(self, signum, frame):
+        """
+        信号处理器（在主线程中同步执行）
+
+        第一次收到信号时通知事件循环开始优雅退出；第二次收到时
+        立即结束浏览器进程并抛出 KeyboardInterrupt，即使事件循环正阻塞在 input() 上
+        """
+        if self.shutdown_signal is None:
+            self.shutdown_signal = signum
+            self._loop.call_soon_threadsafe(self._begin_shutdown)
+            return
+
+        logger.warning("再次收到退出信号，强制结束浏览器进程")
+        self._kill_browser_processes()
+        self.display.terminate()
+        raise KeyboardInterrupt
+
+    def _begin_shutdown(self):
+        """停止弹窗和播放监控，取消主流程，并在超时后强制结束浏览器进程"""
+        timeout = self.config.SHUTDOWN_TIMEOUT
+        logger.warning(
+            f"收到退出信号 ({signal.Signals(self.shutdown_signal).name})，"
+            f"正在保存进度并关闭浏览器（最多 {timeout} 秒，再次按 Ctrl+C 强制退出）..."
+        )
+        self.session_active = False
+        self.popup_event.set()
+        if self.session_task is not None and not self.session_task.done():
+            self.session_task.cancel()
+            self.cancelled_session = self.session_task
+        if self.main_task is not None and not self.main_task.done():
+            self.main_task.cancel()
+        self._force_kill_handle = self._loop.call_later(timeout, self._force_kill)
+
+    def _force_kill(self):
+        """优雅退出超时，结束浏览器进程使仍在等待的 Playwright 调用尽快失败"""
+        logger.warning(f"退出超过 {self.config.SHUTDOWN_TIMEOUT} 秒，强制结束浏览器进程")
+        self._kill_browser_processes()
+
+    def _track_browser_processes(self):
+        """记录当前浏览器进程，驱动先退出时它们会脱离进程树（虚拟显示器由 VirtualDisplay 单独关闭）"""
+        self.browser_processes.update(snapshot_descendants(exclude=self._display_pids()))
+
+    def _display_pids(self) -> tuple:
+        """不应作为浏览器进程结束的 pid"""
+        return (self.display.pid,) if self.display.pid is not None else ()
+
+    def _kill_browser_processes(self) -> int:
+        """结束记录过的以及仍在进程树中的浏览器进程"""
+        processes = dict(self.browser_processes)
+        processes.update(snapshot_descendants(exclude=self._display_pids()))
+        killed = kill_processes(processes)
+        if killed:
+            logger.warning(f"已结束 {killed} 个残留的浏览器进程")
+        return killed
+
+    async def _close_all(self):
+        """等待被取消的视频会话收尾，再依次关闭页面、上下文、浏览器、后台服务和 Playwright 驱动"""
+        if self.cancelled_session is not None:
+            await asyncio.wait({self.cancelled_session})
+            self.cancelled_session = None
+        await self._cleanup()
+        await self.artifacts.close()
+        await self.metrics_server.stop()
+        await self.control_server.stop()
+        if self.playwright:
+            await self.playwright.stop()
+            self.playwright = None
+
+    async def _shutdown(self):
+        """有时限地释放所有资源，最后清理残留的浏览器进程"""
+        try:
+            await asyncio.wait_for(self._close_all(), timeout=self.config.SHUTDOWN_TIMEOUT)
+        except asyncio.TimeoutError:
+            logger.warning(f"资源清理超过 {self.config.SHUTDOWN_TIMEOUT} 秒，放弃等待")
+        except Exception as e:
+            logger.error(f"释放资源时出错: {e}")
+
+        if self._force_kill_handle is not None:
+            self._force_kill_handle.cancel()
+            self._force_kill_handle = None
+
+        self._kill_browser_processes()
+        self.browser_processes = {}
+        self.playwright = None
+
+        # 清理超时时虚拟显示器可能还在运行
+        try:
+            await self.display.stop()
+        except Exception as e:
+            logger.debug(f"停止虚拟显示器时出错: {e}")
+
+    def _save_progress(self):
+        """保存运行进度，并把未完成的视频（含被中断的当前视频）写入剩余播放列表"""
+        remaining_path = Path(self.config.REMAINING_PLAYLIST_FILE)
+        progress_path = Path(self.config.PROGRESS_FILE)
+        try:
+            remaining_path.parent.mkdir(parents=True, exist_ok=True)
+            remaining = 0
+            with remaining_path.open('w', encoding='utf-8') as f:
+                f.write(f"# 未完成的视频，保存于 {datetime.now().isoformat(timespec='seconds')}\n")
+                hrefs = self.scheduler.queued_hrefs() if self.scheduler else []
+                if self.interrupted_video:
+                    hrefs = itertools.chain([self.interrupted_video[1]], hrefs)
+                for href in hrefs:
+                    f.write(href + "\n")
+                    remaining += 1
+
+            state = self.get_state()
+            state.update({
+                "saved_at": datetime.now().isoformat(timespec="seconds"),
+                "shutdown_signal": signal.Signals(self.shutdown_signal).name if self.shutdown_signal else None,
+                "interrupted": (
+                    {"video_index": self.interrupted_video[0], "href": self.interrupted_video[1]}
+                    if self.interrupted_video else None
+                ),
+                "remaining": remaining,
+                "remaining_playlist": str(remaining_path),
+            })
+            progress_path.parent.mkdir(parents=True, exist_ok=True)
+            progress_path.write_text(json.dumps(state, ensure_ascii=False, indent=2), encoding="utf-8")
+
+            if remaining:
+                logger.info(f"💾 进度已保存，剩余 {remaining} 个视频: python main.py --playlist {remaining_path}")
+        except OSError as e:
+            logger.warning(f"保存进度失败: {e}")
+
+    def enqueue(self, hrefs: List[str]) -> List[int]:
+        """
+        在运行中的队列末尾追加视频
+
+        Args:
+            hrefs: 视频相对路径列表
+
+        Returns:
+            List[int]: 分配给追加视频的序号
+        """
+        indices = []
+        for href in hrefs:
+            self.total_videos += 1
+            self.scheduler.enqueue(self.total_videos, href)
+            indices.append(self.total_videos)
+            logger.info(f"➕ 已追加视频 {self.total_videos}: {href}")
+        self.metrics.videos_total = self.total_videos
+        return indices
+
+    def pause(self):
+        """当前视频结束后暂停"""
+        if self.resume_event.is_set():
+            logger.info("⏸️  当前视频结束后暂停")
+        self.resume_event.clear()
+
+    def resume(self):
+        """从暂停中恢复"""
+        self.resume_event.set()
+
+    def skip_current(self) -> Optional[int]:
+        """
+        跳过正在播放的视频（取消其会话，不计为失败，也不重试）
+
+        Returns:
+            被跳过的视频序号，当前没有视频在播放时返回 None
+        """
+        if self.session_task is None or self.session_task.done():
+            return None
+        self.skip_requested = True
+        self.session_task.cancel()
+        return self.current_video_index
+
+    def get_state(self, queue_preview: int = 20) -> Dict[str, Any]:
+        """
+        返回当前运行状态快照
+
+        Args:
+            queue_preview: 最多列出的排队视频数
+
+        Returns:
+            Dict: 可序列化为 JSON 的状态
+        """
+        playing = self.session_task is not None and not self.session_task.done()
+        queued = []
+        if self.scheduler is not None:
+            queued = list(itertools.islice(self.scheduler.queued_hrefs(), queue_preview))
+
+        return {
+            "paused": not self.resume_event.is_set(),
+            "current": {
+                "video_index": self.current_video_index,
+                "href": self.current_href,
+                "progress": self.metrics.progress,
+                "current_time": self.metrics.current_time,
+                "duration": self.metrics.duration,
+                "attempt": self.scheduler.attempt_of(self.current_video_index) if self.scheduler else 0,
+            } if playing else None,
+            "total_videos": self.total_videos,
+            "completed": self.videos_completed,
+            "failed": [{"video_index": i, "href": h} for i, h in self.failed_videos],
+            "skipped": [{"video_index": i, "href": h} for i, h in self.skipped_videos],
+            "retries": self.scheduler.retry_count if self.scheduler else 0,
+            "queued": queued,
+            "eta_seconds": round(self.metrics.eta_seconds) if self.eta.durations else None,
+            "network": self.network.get_state(),
+        }
+
+    async def discover_playlist(self, catalog_hrefs: List[str], output_path: str, full: bool = False) -> List[str]:
+        """
+        登录一次并爬取课程目录页，生成播放列表文件
+
+        Args:
+            catalog_hrefs: 目录页相对路径列表（按课程顺序）
+            output_path: 播放列表输出路径
+            full: 是否忽略缓存的修改标记，全部重新抓取
+
+        Returns:
+            List[str]: 发现的 href 列表，登录失败时为空
+        """
+        logger.info("=" * 60)
+        logger.info(f"播放列表发现 ({len(catalog_hrefs)} 个目录页)")
+        logger.info("=" * 60)
+
+        async with async_playwright() as p:
+            self.playwright = p
+            try:
+                self.browser = await self._launch_browser(p)
+                self.context = await self._setup_context(self.browser)
+                await self._new_page()
+
+                if not await self._login():
+                    logger.error("登录失败，无法发现播放列表")
+                    return []
+
+                discovery = PlaylistDiscovery(self.config, output_path)
+                return await discovery.discover(
+                    self.context,
+                    catalog_hrefs,
+                    concurrency=self.config.DISCOVERY_CONCURRENCY,
+                    full=full
+                )
+            finally:
+                await self._cleanup()
+                self.playwright = None
+
+    async def _prepare_eta(self):
+        """根据时长缓存（PRESCAN_ENABLED 时先扫描缺失的时长）估算播放列表总耗时"""
+        hrefs = self.playlist
+
+        if self.config.PRESCAN_ENABLED:
+            logger.info("=" * 60)
+            logger.info("时长预扫描")
+            logger.info("=" * 60)
+            try:
+                await self._prescan_durations(hrefs)
+            except Exception as e:
+                logger.warning(f"时长预扫描失败，将使用已有缓存: {e}")
+            finally:
+                await self._close_session()
+
+        durations = self.duration_cache.durations(hrefs)
+        self.eta = EtaEstimator(durations, self.config.VIDEO_OVERHEAD_ESTIMATE)
+
+        if durations:
+            total = self.eta.estimate(hrefs)
+            self.metrics.eta_seconds = total
+            logger.info(
+                f"已知 {len(durations)}/{len(hrefs)} 个视频的时长，"
+                f"预计总耗时 {format_seconds(total)}\n"
+            )
+
+    async def _prescan_durations(self, hrefs):
+        """登录一次，并发读取缓存中没有的视频时长"""
+        if not any(self.duration_cache.get(href) is None for href in hrefs):
+            return
+
+        if not self._browser_alive():
+            self.browser = await self._launch_browser(self.playwright)
+        self.context = await self._setup_context(self.browser)
+        await self._new_page()
+
+        if not await self._login():
+            logger.warning("预扫描登录失败，跳过")
+            return
+
+        await scan_durations(
+            self.context,
+            self.config.VIDEO_SITE_URL,
+            hrefs,
+            self.duration_cache,
+            concurrency=self.config.PRESCAN_CONCURRENCY,
+            timeout=self.config.PRESCAN_PAGE_TIMEOUT,
+            player_selector=self.config.VIDEO_PLAYER_SELECTOR
+        )
+
+    def _video_timeout(self, href: str, observed_duration: Optional[float] = None) -> float:
+        """
+        计算单个视频的超时时间
+
+        优先使用页面上读到的（有限的）时长，其次使用缓存/预扫描的时长：
+        时长 * VIDEO_TIMEOUT_FACTOR + VIDEO_TIMEOUT_SLACK + 本视频已处理弹窗数 * VIDEO_TIMEOUT_POPUP_ALLOWANCE；
+        时长未知时使用 MAX_VIDEO_DURATION
+
+        Args:
+            href: 视频相对路径
+            observed_duration: 页面上读到的 video.duration
+
+        Returns:
+            float: 超时时间(秒)
+        """
+        duration = observed_duration or self.eta.duration_of(href)
+        # 直播流或没有结束时间的 HLS 时长为 Infinity，按时长未知处理
+        if not duration or not math.isfinite(duration):
+            return self.config.MAX_VIDEO_DURATION
+
+        timeout = (
+            duration * self.config.VIDEO_TIMEOUT_FACTOR
+            + self.config.VIDEO_TIMEOUT_SLACK
+            + self.video_popup_count * self.config.VIDEO_TIMEOUT_POPUP_ALLOWANCE
+        )
+        return timeout
+
+    def _remaining_seconds(self, current_remaining: float = 0.0) -> float:
+        """估算整个播放列表的剩余时间"""
+        queued = self.scheduler.queued_hrefs() if self.scheduler else []
+        remaining = self.eta.remaining(current_remaining, queued)
+        self.metrics.eta_seconds = remaining
+        return remaining
+
+    def _log_eta(self):
+        """输出剩余时间估计"""
+        if not self.eta.durations:
+            return
+        logger.info(f"⏳ 预计剩余时间: {format_seconds(self._remaining_seconds())}\n")
+
+    def _should_continue_after_failure(self, video_index: int) -> bool:
+        """
+        根据 FAILURE_POLICY 决定视频失败后是否继续下一个
+
+        Args:
+            video_index: 失败的视频序号
+
+        Returns:
+            bool: 是否继续
+        """
+        policy = self.config.FAILURE_POLICY
+
+        if policy == "stop":
+            logger.info("失败策略为 stop，停止播放")
+            return False
+
+        if policy == "ask" and self.config.INTERACTIVE:
+            try:
+                response = input(f"\n视频 {video_index} 播放失败，是否继续下一个？(y/n): ").strip().lower()
+            except (EOFError, KeyboardInterrupt):
+                return False
+            if response != 'y':
+                logger.info("用户选择停止")
+                return False
+
+        return True
+
     async def _play_single_video_session(self, href: str, video_index: int) -> bool:
         """
         为单个视频创建独立的浏览器会话
 
+        浏览器进程在视频之间复用，只有在其已断开时才重新启动；
+        每个视频使用全新的上下文和页面，结束后关闭。
+        播放出错时先按错误类型在会话内恢复，恢复失败才结束会话
+
         Args:
             href: 视频相对路径
             video_index: 视频序号
@@ -118,57 +713,298 @@ class VideoAutomator:
         Returns:
             bool: 是否成功播放完成
         """
-        async with async_playwright() as p:
-            try:
-                # 1. 启动浏览器
-                self.browser = await self._launch_browser(p)
-                self.context = await self._setup_context(self.browser)
-                self.page = await self.context.new_page()
-                self.session_active = True
-
-                # 2. 自动登录
-                if self.config.AUTO_LOGIN_ENABLED and self._validate_auto_login_config():
-                    login_success = await self._auto_login_flow()
-                    if not login_success:
-                        logger.error("自动登录失败")
+        self.last_error = None
+        self.current_video_index = video_index
+        self.current_href = href
+        self.phase_timings = {}
+        self.video_popup_count = 0
+        completed = False
+        session_started = time.monotonic()
+        cdp_calls_started = sum(self.metrics.cdp_calls.values())
+        set_log_context(video_index=video_index, href=href, phase="launch")
+        self.metrics.set_current(video_index, href)
+        self.network.start_video(video_index, href)
+
+        try:
+            # 1. 启动浏览器（复用仍存活的浏览器）
+            phase_started = time.monotonic()
+            if not self._browser_alive():
+                await self._cleanup()
+                self.browser = await self._launch_browser(self.playwright)
+            else:
+                logger.info("复用已启动的浏览器")
+            self.context = await self._setup_context(self.browser, self.har.context_options(video_index, href))
+            await self.har.attach(self.context, href)
+            await self._new_page()
+            self._track_browser_processes()
+            await self.tracer.start(self.context, lambda: self.page)
+            self._record_phase("launch", phase_started)
+
+            # 2. 登录
+            set_log_context(phase="login")
+            phase_started = time.monotonic()
+            if not await self._login():
+                return False
+            self._record_phase("login", phase_started)
+            await self.har.snapshot(self.page, "login")
+
+            video_url = f"{self.config.VIDEO_SITE_URL.rstrip('/')}{href}"
+            recoveries = 0
+            previous_error = None
+
+            while True:
+                try:
+                    # 3. 跳转到视频页面
+                    set_log_context(phase="open_page")
+                    phase_started = time.monotonic()
+                    await self._open_video_page(video_url)
+                    self._record_phase("open_page", phase_started)
+
+                    # 4. 处理进入视频页面时的弹窗
+                    await self._handle_entry_popup()
+                    await self.har.snapshot(self.page, "play_page")
+                    await self._check_selector_drift("play_page", ["VIDEO_PLAYER_SELECTOR"])
+
+                    # 5. 播放视频
+                    await self._play_single_video()
+
+                    completed = True
+                    self._record_phase("session", session_started)
+                    logger.info(f"视频 {video_index} 播放流程结束")
+                    return True
+
+                except Exception as e:
+                    error = classify_error(e)
+
+                    # 重新加载后播放器仍然不存在：对照基线检查，确认选择器失效才升级为漂移，
+                    # 否则按页面慢处理，保持可重试的 PlayerMissingError
+                    if isinstance(error, PlayerMissingError) and isinstance(previous_error, PlayerMissingError):
+                        try:
+                            await self._check_selector_drift("play_page", ["VIDEO_PLAYER_SELECTOR"], force=True)
+                        except SelectorDriftError as drift:
+                            error = drift
+                        except Exception as check_error:
+                            logger.debug(f"选择器检查出错: {check_error}")
+
+                    self.last_error = error
+                    previous_error = error
+                    self.metrics.error(error.kind)
+                    logger.error(
+                        f"视频 {video_index} 出错 [{error.kind}]: {error}",
+                        extra={"error_kind": error.kind}
+                    )
+                    await self._save_screenshot(f"error_video_{video_index}_{error.kind}")
+
+                    if recoveries >= self.config.ERROR_RECOVERY_MAX_ATTEMPTS:
+                        logger.error(f"会话内恢复已达上限 ({self.config.ERROR_RECOVERY_MAX_ATTEMPTS} 次)")
                         return False
-                else:
-                    await self._manual_login_flow()
 
-                # 3. 跳转到视频页面
-                video_url = f"{self.config.VIDEO_SITE_URL.rstrip('/')}{href}"
-                logger.info(f"跳转到视频页面: {video_url}")
-                await self.page.goto(video_url, wait_until='domcontentloaded')
+                    recoveries += 1
+                    if not await self._recover(error):
+                        return False
+
+        except Exception as e:
+            self.last_error = classify_error(e)
+            self.metrics.error(self.last_error.kind)
+            logger.error(
+                f"视频 {video_index} 会话出错 [{self.last_error.kind}]: {e}",
+                exc_info=True,
+                extra={"error_kind": self.last_error.kind}
+            )
+            await self._save_screenshot(f"error_video_{video_index}")
+            if self.last_error.recovery == RECOVERY_RESTART_BROWSER:
+                # 关闭浏览器前保存 trace，关闭后上下文已不可用（finally 中的 stop 随之不再执行）
+                await self.tracer.stop(persist_as=f"error_video_{video_index}")
+                await self._cleanup()
+            return False
+
+        finally:
+            # 6. 成功则丢弃 trace，失败则保存最近几分钟的 trace（跳过或退出时不保存；
+            #    重启浏览器前已保存并停止时不再执行）
+            interrupted = self.skip_requested or self.shutdown_signal is not None
+            await self.tracer.stop(
+                persist_as=None if completed or interrupted else f"error_video_{video_index}"
+            )
+
+            rss = browser_rss_bytes()
+
+            # 7. 关闭页面和上下文（浏览器留给下一个视频）
+            await self._close_session()
+            # 上下文关闭后 HAR 才写入磁盘
+            await self.har.finish()
+            network = self.network.finish_video(completed)
+
+            # 8. 写入运行历史
+            if completed:
+                error_kind = None
+            elif interrupted:
+                error_kind = "skipped" if self.skip_requested else "interrupted"
+            else:
+                error_kind = self.last_error.kind if self.last_error else "unknown"
+            self.history.record_video(
+                video_index=video_index,
+                href=href,
+                attempt=self.scheduler.attempt_of(video_index) if self.scheduler else 0,
+                completed=completed,
+                error_kind=error_kind,
+                session_seconds=time.monotonic() - session_started,
+                media_seconds=self.metrics.duration or self.duration_cache.get(href),
+                phases=self.phase_timings,
+                popups=self.video_popup_count,
+                cdp_calls=sum(self.metrics.cdp_calls.values()) - cdp_calls_started,
+                network=network,
+                browser_rss_bytes=rss,
+            )
+            set_log_context(phase=None)
+            # 等待资源完全释放
+            if not interrupted:
                 await asyncio.sleep(2)
 
-                # 4. 处理进入视频页面时的弹窗
-                await self._handle_entry_popup()
+    def _record_phase(self, phase: str, started: float):
+        """
+        记录当前视频某个阶段的耗时，并输出带 phase/latency 字段的结构化日志
+
+        Args:
+            phase: 阶段名称
+            started: 阶段开始时的 time.monotonic()
+        """
+        latency = time.monotonic() - started
+        self.phase_timings[phase] = latency
+        self.metrics.observe_phase(phase, latency)
+        logger.info(
+            f"⏱️ 阶段 {phase} 耗时 {latency:.1f}s",
+            extra={"phase": phase, "latency": round(latency, 3)}
+        )
 
-                # 5. 播放视频
-                await self._play_single_video()
+    async def _login(self) -> bool:
+        """
+        按配置执行自动登录或手动登录
 
-                logger.info(f"视频 {video_index} 播放流程结束")
-                return True
+        Returns:
+            bool: 是否登录成功
+        """
+        if self.har.replaying:
+            # 回放时验证码和登录请求无法与录制内容匹配，只打开录制的首页
+            logger.info(f"📼 回放模式，跳过登录: {self.config.VIDEO_SITE_URL}")
+            await self.page.goto(self.config.VIDEO_SITE_URL, wait_until='domcontentloaded')
+            return True
+
+        if self.config.AUTO_LOGIN_ENABLED and self._validate_auto_login_config():
+            login_success = await self._auto_login_flow()
+            if not login_success:
+                logger.error("自动登录失败")
+            return login_success
 
+        return await self._manual_login_flow()
+
+    async def _new_page(self):
+        """在当前上下文中新建页面，并监听渲染进程崩溃"""
+        self.page_crashed = False
+        self.page = await self.context.new_page()
+        self.page.on("crash", lambda _: self._on_page_crash())
+        await self.network.attach(self.context, self.page)
+
+    def _on_page_crash(self):
+        """页面渲染进程崩溃回调"""
+        logger.error("💥 页面渲染进程崩溃")
+        self.page_crashed = True
+
+    def _on_login_page(self) -> bool:
+        """当前页面是否为登录页（登录状态失效时会被重定向到登录页）"""
+        return self.page is not None and "login" in self.page.url.lower()
+
+    async def _open_video_page(self, video_url: str):
+        """
+        打开视频页面并确认仍处于登录状态
+
+        Args:
+            video_url: 视频页面完整 URL
+        """
+        logger.info(f"跳转到视频页面: {video_url}")
+        await self.page.goto(video_url, wait_until='domcontentloaded')
+        await asyncio.sleep(2)
+
+        if self._on_login_page():
+            raise LoggedOutError(f"打开视频页面时被重定向到登录页: {self.page.url}")
+
+    async def _recover(self, error: VideoAutomationError) -> bool:
+        """
+        按错误类型执行对应的恢复动作
+
+        Args:
+            error: 分类后的错误
+
+        Returns:
+            bool: 是否可以在当前会话内重新打开视频页面
+        """
+        recovery = error.recovery
+        logger.info(f"🔧 尝试恢复 [{error.kind}] -> {recovery}")
+
+        if recovery == RECOVERY_RELOAD:
+            return True
+
+        if recovery == RECOVERY_RELOGIN:
+            return await self._login()
+
+        if recovery == RECOVERY_WAIT_NETWORK:
+            return await self._wait_for_network()
+
+        if recovery == RECOVERY_NEW_PAGE:
+            try:
+                if self.page:
+                    await self.page.close()
             except Exception as e:
-                logger.error(f"视频 {video_index} 会话出错: {e}", exc_info=True)
-                await self._save_screenshot(f"error_video_{video_index}")
-                return False
+                logger.debug(f"关闭崩溃页面时出错: {e}")
+            await self._new_page()
+            return True
 
-            finally:
-                # 6. 关闭浏览器和清理资源
-                await self._cleanup()
-                # 等待资源完全释放
-                await asyncio.sleep(2)
+        if recovery == RECOVERY_RESTART_BROWSER:
+            await self.tracer.stop(persist_as=f"error_video_{self.current_video_index}")
+            await self._cleanup()
+            return False
+
+        # RECOVERY_ABORT
+        return False
+
+    async def _wait_for_network(self) -> bool:
+        """
+        等待网络恢复
+
+        Returns:
+            bool: 网络是否在 NETWORK_RECOVERY_TIMEOUT 内恢复
+        """
+        start_time = datetime.now()
+
+        while (datetime.now() - start_time).total_seconds() < self.config.NETWORK_RECOVERY_TIMEOUT:
+            logger.info(f"🌐 网络不可用，{self.config.NETWORK_RETRY_WAIT} 秒后重新检测...")
+            await asyncio.sleep(self.config.NETWORK_RETRY_WAIT)
+
+            try:
+                await self.context.request.head(self.config.VIDEO_SITE_URL, timeout=10000)
+                logger.info("✅ 网络已恢复")
+                return True
+            except Exception as e:
+                logger.debug(f"网络检测失败: {e}")
+
+        logger.error(f"网络在 {self.config.NETWORK_RECOVERY_TIMEOUT} 秒内未恢复")
+        return False
+
+    def _browser_alive(self) -> bool:
+        """浏览器是否已启动且仍然连接"""
+        return self.browser is not None and self.browser.is_connected()
 
     async def _launch_browser(self, playwright) -> Browser:
         """启动浏览器"""
         logger.info(f"启动浏览器 (headless={self.config.HEADLESS})...")
         logger.info("使用系统已安装的 Chrome 浏览器")
 
+        # 没有显示器时按需启动虚拟显示器，DISPLAY 只传给浏览器
+        await self.display.start()
+
         browser = await playwright.chromium.launch(
             headless=self.config.HEADLESS,
             channel="chrome",  # 使用系统已安装的 Chrome
+            env=self.display.browser_env(),
             args=[
                 '--disable-blink-features=AutomationControlled',
                 '--disable-dev-shm-usage',
@@ -179,8 +1015,14 @@ class VideoAutomator:
         logger.info("浏览器启动成功")
         return browser
 
-    async def _setup_context(self, browser: Browser) -> BrowserContext:
-        """设置浏览器上下文"""
+    async def _setup_context(self, browser: Browser, har_options: Optional[dict] = None) -> BrowserContext:
+        """
+        设置浏览器上下文
+
+        Args:
+            browser: 浏览器
+            har_options: HAR 录制参数（见 HarBundle.context_options）
+        """
         logger.info("配置浏览器上下文...")
 
         context = await browser.new_context(
@@ -191,6 +1033,7 @@ class VideoAutomator:
             user_agent=self.config.USER_AGENT,
             locale='zh-CN',
             timezone_id='Asia/Shanghai',
+            **(har_options or {}),
         )
 
         # 注入反检测脚本和自动静音脚本
@@ -215,22 +1058,104 @@ class VideoAutomator:
             }
             """
 
+        # 媒体事件推送：关键事件发生时立即唤醒完成检测，而不是等到下一次轮询
+        await context.expose_binding(MEDIA_EVENT_BINDING, self._on_media_event)
+        media_event_script = f"""
+            ['ended', 'pause', 'play', 'seeked', 'emptied', 'error', 'durationchange', 'ratechange']
+                .forEach(type => document.addEventListener(type, (event) => {{
+                    if (event.target instanceof HTMLMediaElement && window.{MEDIA_EVENT_BINDING}) {{
+                        window.{MEDIA_EVENT_BINDING}(type).catch(() => {{}});
+                    }}
+                }}, true));
+        """
+
+        # 弹窗推送：页面内监视 DOM 变化，出现"继续"等弹窗时才通知，取代固定间隔的轮询
+        await context.expose_binding(POPUP_EVENT_BINDING, self._on_popup_event)
+        popup_watch_script = self.popup_handler.watch_script("playback", POPUP_EVENT_BINDING)
+
         await context.add_init_script(f"""
             Object.defineProperty(navigator, 'webdriver', {{
                 get: () => undefined,
             }});
             {mute_script}
+            {media_event_script}
+            {popup_watch_script}
         """)
 
         logger.info("浏览器上下文配置完成")
         return context
 
-    async def _manual_login_flow(self):
-        """手动登录流程"""
+    def _on_media_event(self, source, event_type: str):
+        """页面推送的媒体事件回调 - 唤醒正在等待的完成检测"""
+        logger.debug(f"媒体事件: {event_type}")
+        self.metrics.cdp_call("media_event")
+        self.media_event.set()
+
+    def _on_popup_event(self, source):
+        """页面内监视脚本发现弹窗时的回调 - 唤醒弹窗监控"""
+        logger.debug("页面推送: 出现弹窗")
+        self.metrics.cdp_call("popup_event")
+        self.popup_event.set()
+
+    def _next_check_interval(self, video_status: Optional[dict]) -> float:
+        """
+        根据剩余播放时间计算下一次完成检测的间隔
+
+        离结束越远间隔越长，接近结束时缩短到 VIDEO_CHECK_INTERVAL_MIN；
+        暂停或状态未知时使用 VIDEO_CHECK_INTERVAL_DEFAULT（媒体事件仍会提前唤醒）
+
+        Args:
+            video_status: 最近一次读取的视频状态
+
+        Returns:
+            float: 间隔(秒)
+        """
+        if not video_status or video_status.get('paused'):
+            return self.config.VIDEO_CHECK_INTERVAL_DEFAULT
+
+        duration = video_status.get('duration') or 0
+        current = video_status.get('currentTime') or 0
+        rate = video_status.get('playbackRate') or 1
+        if duration <= 0:
+            return self.config.VIDEO_CHECK_INTERVAL_DEFAULT
+
+        remaining = (duration - current) / rate
+        interval = remaining * self.config.VIDEO_CHECK_REMAINING_FRACTION
+        return max(self.config.VIDEO_CHECK_INTERVAL_MIN, min(interval, self.config.VIDEO_CHECK_INTERVAL_MAX))
+
+    async def _wait_for_media_event(self, timeout: float) -> bool:
+        """
+        等待媒体事件或超时
+
+        Args:
+            timeout: 最长等待时间(秒)
+
+        Returns:
+            bool: 是否被媒体事件提前唤醒
+        """
+        try:
+            await asyncio.wait_for(self.media_event.wait(), timeout=timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+        finally:
+            self.media_event.clear()
+
+    async def _manual_login_flow(self) -> bool:
+        """
+        手动登录流程
+
+        Returns:
+            bool: 是否完成登录（无人值守模式下无法手动登录，返回 False）
+        """
         logger.info("\n" + "=" * 60)
         logger.info("步骤: 手动登录")
         logger.info("=" * 60)
 
+        if not self.config.INTERACTIVE:
+            logger.error("无人值守模式下无法手动登录，请检查自动登录配置")
+            return False
+
         # 打开登录页面
         logger.info(f"正在打开登录页面: {self.config.VIDEO_SITE_URL}")
         await self.page.goto(self.config.VIDEO_SITE_URL, wait_until='networkidle')
@@ -245,67 +1170,46 @@ class VideoAutomator:
 
         logger.info("✅ 用户确认已登录，继续执行...")
         await asyncio.sleep(2)  # 等待页面稳定
+        return True
+
+    async def _handle_popups(self, phase: str) -> Optional[PopupMatch]:
+        """
+        按弹窗规则表检测并处理当前阶段的弹窗
+
+        Args:
+            phase: 阶段，见 Config.POPUP_RULES
+
+        Returns:
+            PopupMatch: 匹配到的弹窗规则，没有弹窗时返回 None
+        """
+        match = await self.popup_handler.check(self.page, phase)
+        if match is not None and match.handled:
+            self.video_popup_count += 1
+        return match
+
+    async def _before_popup_action(self, page: Page, match: PopupMatch):
+        """处理弹窗前按规则保存 DOM 快照（HAR 录制时）"""
+        if match.rule.snapshot:
+            await self.har.snapshot(page, match.rule.snapshot)
 
     async def _handle_entry_popup(self):
         """处理进入视频页面时的弹窗（如"我知道了"按钮）"""
         logger.info("检查进入视频页面时的弹窗...")
-
-        try:
-            # 遍历所有可能的关闭按钮选择器
-            for selector in self.config.POPUP_CLOSE_SELECTORS:
-                try:
-                    button = await self.page.query_selector(selector)
-                    if button:
-                        is_visible = await button.is_visible()
-                        if is_visible:
-                            logger.info(f"检测到弹窗按钮: {selector}，正在点击...")
-                            await button.click()
-                            await asyncio.sleep(1)
-                            logger.info("✅ 已点击弹窗按钮")
-                            return True
-                except Exception as e:
-                    logger.debug(f"检查按钮 {selector} 时出错: {e}")
-                    continue
-
+        if await self._handle_popups("entry") is None:
             logger.debug("未检测到进入页面时的弹窗")
-            return False
-
-        except Exception as e:
-            logger.debug(f"处理进入页面弹窗时出错: {e}")
-            return False
 
     async def _handle_completion_popup(self):
         """处理视频播放完成后的弹窗（如"我知道了"按钮）"""
         logger.info("检查视频完成后的弹窗...")
-
-        try:
-            # 遍历所有可能的关闭按钮选择器
-            for selector in self.config.POPUP_CLOSE_SELECTORS:
-                try:
-                    button = await self.page.query_selector(selector)
-                    if button:
-                        is_visible = await button.is_visible()
-                        if is_visible:
-                            logger.info(f"检测到完成弹窗按钮: {selector}，正在点击...")
-                            await button.click()
-                            await asyncio.sleep(1)
-                            logger.info("✅ 已点击完成弹窗按钮")
-                            return True
-                except Exception as e:
-                    logger.debug(f"检查按钮 {selector} 时出错: {e}")
-                    continue
-
+        if await self._handle_popups("after_complete") is None:
             logger.debug("未检测到完成弹窗按钮")
-            return False
-
-        except Exception as e:
-            logger.debug(f"处理完成弹窗时出错: {e}")
-            return False
 
     async def _play_single_video(self):
         """播放单个视频的完整流程"""
 
         # 1. 等待视频播放器加载
+        set_log_context(phase="start_playback")
+        phase_started = time.monotonic()
         logger.info("等待视频播放器加载...")
         try:
             await self.page.wait_for_selector(
@@ -313,9 +1217,9 @@ class VideoAutomator:
                 timeout=10000
             )
         except Exception as e:
-            logger.warning(f"未找到视频播放器: {e}")
-            await self._save_screenshot("no_video_player")
-            return
+            if self._on_login_page():
+                raise LoggedOutError(f"等待播放器时被重定向到登录页: {self.page.url}") from e
+            raise PlayerMissingError(f"未找到视频播放器 ({self.config.VIDEO_PLAYER_SELECTOR}): {e}") from e
 
         # 2. 尝试多种方式触发视频播放
         logger.info("点击视频触发播放...")
@@ -385,63 +1289,84 @@ class VideoAutomator:
         if not play_success:
             logger.warning("⚠️ 无法触发视频播放，将继续监控状态...")
 
+        self._record_phase("start_playback", phase_started)
+
         # 3. 启动弹窗监控并等待视频完成
         logger.info("监控视频播放状态...")
+        set_log_context(phase="playback")
+        phase_started = time.monotonic()
 
-        await asyncio.gather(
+        self.session_active = True
+        results = await asyncio.gather(
             self._monitor_and_handle_popups(),
             self._wait_for_video_complete(),
             return_exceptions=True
         )
 
+        self._record_phase("playback", phase_started)
+
+        # 等待过程中识别出的错误交给会话层按类型恢复
+        for result in results:
+            if isinstance(result, VideoAutomationError):
+                raise result
+
     async def _monitor_and_handle_popups(self):
-        """监控并处理弹窗"""
-        logger.info(f"开始监控弹窗 (检测间隔: {self.config.POPUP_CHECK_INTERVAL}秒)")
+        """
+        监控并处理播放中的弹窗
 
-        while self.session_active:
-            try:
-                # 遍历所有可能的"继续"按钮选择器
-                for selector in self.config.CONTINUE_BUTTON_SELECTORS:
-                    try:
-                        continue_button = await self.page.query_selector(selector)
-
-                        if continue_button:
-                            is_visible = await continue_button.is_visible()
-                            if is_visible:
-                                # 获取按钮文本以便日志输出
-                                button_text = await continue_button.text_content()
-                                logger.info(f"🔔 检测到弹窗按钮: '{button_text.strip()}' (选择器: {selector})")
-                                logger.info("正在点击...")
-                                await continue_button.click()
-                                await asyncio.sleep(1)
-                                logger.info("✅ 已点击弹窗按钮")
-                                break  # 找到并点击后退出循环
-                    except Exception as e:
-                        logger.debug(f"检查选择器 {selector} 时出错: {e}")
-                        continue
-
-                await asyncio.sleep(self.config.POPUP_CHECK_INTERVAL)
+        弹窗出现时由页面内的监视脚本推送唤醒；兜底轮询在没有弹窗时从 POPUP_CHECK_INTERVAL
+        逐次加倍到 POPUP_CHECK_INTERVAL_MAX，处理过弹窗后恢复。有无法在页面内匹配的选择器时
+        监视脚本看不到这些弹窗，保持 POPUP_CHECK_INTERVAL 轮询
+        """
+        watchable = self.popup_handler.watchable("playback")
+        max_interval = self.config.POPUP_CHECK_INTERVAL_MAX if watchable else self.config.POPUP_CHECK_INTERVAL
+        logger.info(
+            f"开始监控弹窗 (页面推送{'' if watchable else '不可用'}，"
+            f"检测间隔: {self.config.POPUP_CHECK_INTERVAL}-{max_interval}秒)"
+        )
 
-            except Exception as e:
-                logger.debug(f"弹窗监控异常: {e}")
-                await asyncio.sleep(self.config.POPUP_CHECK_INTERVAL)
+        interval = self.config.POPUP_CHECK_INTERVAL
+        while self.session_active:
+            if await self._handle_popups("playback") is not None:
+                interval = self.config.POPUP_CHECK_INTERVAL
+            else:
+                interval = min(interval * 2, max_interval)
+            await self._wait_for_popup_event(interval)
+
+    async def _wait_for_popup_event(self, timeout: float):
+        """等待页面推送的弹窗事件或超时"""
+        try:
+            await asyncio.wait_for(self.popup_event.wait(), timeout=timeout)
+        except asyncio.TimeoutError:
+            pass
+        finally:
+            self.popup_event.clear()
 
     async def _wait_for_video_complete(self):
         """等待视频播放完成"""
-        start_time = datetime.now()
-        check_interval = 5  # 每5秒检查一次
+        # 计时统一使用事件循环时钟，模拟运行时可由虚拟时钟驱动（见 simulation.py）
+        loop = asyncio.get_running_loop()
+        start_time = loop.time()
+        check_interval = self.config.VIDEO_CHECK_INTERVAL_DEFAULT  # 出错后的重试间隔
+        video_status = None
+        observed_duration = None  # 页面上读到的时长，用于计算超时
+        duration_recorded = False
         completion_detected = False  # 标记是否已检测到接近完成
+        last_progress_time = None  # 上次观察到的播放位置
+        last_progress_at = loop.time()  # 播放位置上次变化的时间
+        stall_reported = False
+        last_progress_log = None  # 上次输出进度日志的时间
 
-        while self.session_active:
-            try:
-                # 检查是否出现"播放完成"弹窗
-                complete_popup = await self.page.query_selector(
-                    self.config.COMPLETE_POPUP_SELECTOR
-                )
+        try:
+            while self.session_active:
+                try:
+                    if self.page_crashed:
+                        raise RendererCrashError("页面渲染进程崩溃")
+                    if self._on_login_page():
+                        raise LoggedOutError(f"播放过程中被重定向到登录页: {self.page.url}")
 
-                if complete_popup:
-                    is_visible = await complete_popup.is_visible()
-                    if is_visible:
+                    # 检查是否出现"播放完成"弹窗
+                    if await self._handle_popups("complete") is not None:
                         logger.info("🎉 检测到'视频播放完成'弹窗")
 
                         # 处理完成后的弹窗按钮（如"我知道了"）
@@ -451,105 +1376,157 @@ class VideoAutomator:
                         await asyncio.sleep(self.config.VIDEO_COMPLETE_WAIT)
                         return  # 视频完成，退出等待
 
-                # 检查视频播放状态（备用检测）
-                video_status = await self.page.evaluate(f"""
-                    () => {{
-                        const video = document.querySelector('{self.config.VIDEO_PLAYER_SELECTOR}');
-                        if (!video) return null;
-
-                        return {{
-                            currentTime: video.currentTime,
-                            duration: video.duration,
-                            ended: video.ended,
-                            paused: video.paused,
-                        }};
-                    }}
-                """)
-
-                if video_status:
-                    # 如果视频ended，也认为完成
-                    if video_status.get('ended'):
-                        logger.info("✅ 视频播放结束（通过video.ended检测）")
-
-                        # 处理完成后的弹窗按钮（如"我知道了"）
-                        await self._handle_completion_popup()
-
-                        logger.info(f"等待 {self.config.VIDEO_COMPLETE_WAIT} 秒后退出...")
-                        await asyncio.sleep(self.config.VIDEO_COMPLETE_WAIT)
-                        return
-
-                    # 检查播放进度
-                    current = video_status.get('currentTime', 0)
-                    duration = video_status.get('duration', 0)
-                    if duration > 0:
-                        progress = (current / duration) * 100
-
-                        # 定期输出播放进度
-                        logger.debug(f"播放进度: {progress:.1f}% ({current:.0f}s / {duration:.0f}s)")
+                    # 检查视频播放状态（备用检测）
+                    video_status = await self.page.evaluate(f"""
+                        () => {{
+                            const video = document.querySelector('{self.config.VIDEO_PLAYER_SELECTOR}');
+                            if (!video) return null;
+
+                            return {{
+                                currentTime: video.currentTime,
+                                duration: video.duration,
+                                ended: video.ended,
+                                paused: video.paused,
+                                playbackRate: video.playbackRate,
+                            }};
+                        }}
+                    """)
+                    self.metrics.cdp_call("evaluate")
 
-                        # 检测到99.5%以上认为即将完成(因为点击弹窗会导致页面跳转,进度归零)
-                        if progress >= 99.5 and not completion_detected:
-                            completion_detected = True
-                            logger.info(f"🎉 视频播放进度已达到 {progress:.1f}%，即将完成")
-                            logger.info("停止弹窗监控，等待10秒后退出...")
+                    if video_status:
+                        # 如果视频ended，也认为完成
+                        if video_status.get('ended'):
+                            logger.info("✅ 视频播放结束（通过video.ended检测）")
 
-                            # 停止弹窗监控(设置session_active=False会停止_monitor_and_handle_popups)
-                            # 但我们还需要继续等待,所以使用临时标志
-                            self.session_active = False
+                            # 处理完成后的弹窗按钮（如"我知道了"）
+                            await self._handle_completion_popup()
 
-                            await asyncio.sleep(20)
-                            logger.info("✅ 视频播放完成，准备退出")
+                            logger.info(f"等待 {self.config.VIDEO_COMPLETE_WAIT} 秒后退出...")
+                            await asyncio.sleep(self.config.VIDEO_COMPLETE_WAIT)
                             return
 
-                # 检查超时
-                elapsed = (datetime.now() - start_time).total_seconds()
-                if elapsed > self.config.MAX_VIDEO_DURATION:
-                    logger.warning(f"⏰ 视频播放超时 ({self.config.MAX_VIDEO_DURATION}秒)")
-                    return
-
-                await asyncio.sleep(check_interval)
-
-            except Exception as e:
-                logger.error(f"等待视频完成时出错: {e}")
-                await asyncio.sleep(check_interval)
+                        # 检查播放进度
+                        current = video_status.get('currentTime', 0)
+                        duration = video_status.get('duration', 0)
+                        if duration > 0 and math.isfinite(duration):
+                            self.metrics.set_progress(current / duration * 100, current, duration)
+
+                            if observed_duration != duration:
+                                observed_duration = duration
+                                logger.debug(
+                                    f"视频时长 {duration:.0f}s，超时调整为 "
+                                    f"{self._video_timeout(self.current_href, duration):.0f}s"
+                                )
+
+                            # 顺便把实际时长写入缓存，下次运行无需预扫描
+                            if not duration_recorded:
+                                duration_recorded = True
+                                if self.duration_cache.get(self.current_href) is None:
+                                    self.duration_cache.set(self.current_href, duration)
+                                    self.duration_cache.save()
+
+                        # 检测卡住：播放位置长时间不变，保存最近的 trace 供排查
+                        if current != last_progress_time:
+                            last_progress_time = current
+                            last_progress_at = loop.time()
+                            stall_reported = False
+                        elif not stall_reported:
+                            stalled = loop.time() - last_progress_at
+                            if stalled > self.config.VIDEO_STALL_TIMEOUT:
+                                stall_reported = True
+                                logger.warning(f"⚠️ 播放位置已 {stalled:.0f} 秒未变化 ({current:.0f}s)，疑似卡住")
+                                await self.tracer.persist(f"stall_video_{self.current_video_index}")
+                        if duration > 0:
+                            progress = (current / duration) * 100
+
+                            # 定期输出播放进度（按 LOG_PROGRESS_INTERVAL 节流）
+                            if last_progress_log is None or loop.time() - last_progress_log >= self.config.LOG_PROGRESS_INTERVAL:
+                                last_progress_log = loop.time()
+                                remaining = self._remaining_seconds(duration - current)
+                                logger.debug(
+                                    f"播放进度: {progress:.1f}% ({current:.0f}s / {duration:.0f}s)，"
+                                    f"列表剩余约 {format_seconds(remaining)}",
+                                    extra={
+                                        "progress": round(progress, 2),
+                                        "current_time": round(current, 1),
+                                        "duration": round(duration, 1),
+                                    }
+                                )
+
+                            # 检测到99.5%以上认为即将完成(因为点击弹窗会导致页面跳转,进度归零)
+                            if progress >= 99.5 and not completion_detected:
+                                completion_detected = True
+                                logger.info(f"🎉 视频播放进度已达到 {progress:.1f}%，即将完成")
+                                logger.info("停止弹窗监控，等待10秒后退出...")
+
+                                # 停止弹窗监控(设置session_active=False会停止_monitor_and_handle_popups)
+                                # 但我们还需要继续等待,所以使用临时标志
+                                self.session_active = False
+                                self.popup_event.set()
+
+                                await asyncio.sleep(20)
+                                logger.info("✅ 视频播放完成，准备退出")
+                                return
+
+                    # 检查超时
+                    elapsed = loop.time() - start_time
+                    video_timeout = self._video_timeout(self.current_href, observed_duration)
+                    if elapsed > video_timeout:
+                        logger.warning(f"⏰ 视频播放超时 ({video_timeout:.0f}秒)")
+                        raise PlaybackTimeoutError(
+                            f"播放 {elapsed:.0f} 秒仍未完成 (超时 {video_timeout:.0f} 秒)"
+                        )
+
+                    # 按剩余播放时间决定下次检测时间，媒体事件会提前唤醒
+                    await self._wait_for_media_event(self._next_check_interval(video_status))
+
+                except VideoAutomationError:
+                    raise
+                except Exception as e:
+                    error = classify_error(e)
+                    # 页面已不可用，继续轮询没有意义
+                    if isinstance(error, (RendererCrashError, BrowserClosedError)):
+                        raise error
+                    logger.error(f"等待视频完成时出错: {e}")
+                    await asyncio.sleep(check_interval)
+        finally:
+            # 无论以何种方式结束，都要停止弹窗监控（唤醒正在等待的监控循环，使其立即退出）
+            self.session_active = False
+            self.popup_event.set()
 
     async def _save_screenshot(self, name: str):
-        """保存截图"""
+        """保存截图和 DOM 快照（压缩与写盘在后台完成）"""
         if not self.config.SAVE_SCREENSHOTS or not self.page:
             return
 
-        try:
-            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-            screenshot_path = Path(self.config.SCREENSHOT_DIR) / f"{name}_{timestamp}.png"
+        await self.artifacts.capture(self.page, name)
 
-            await self.page.screenshot(path=str(screenshot_path))
-            logger.info(f"📸 截图已保存: {screenshot_path}")
+    async def _close_session(self):
+        """关闭当前视频的页面和上下文，保留浏览器进程"""
+        self.session_active = False
 
-        except Exception as e:
-            logger.error(f"保存截图失败: {e}")
+        # 关闭页面
+        if self.page:
+            try:
+                await self.page.close()
+            except Exception as e:
+                logger.debug(f"关闭页面时出错: {e}")
+            self.page = None
+
+        # 关闭上下文
+        if self.context:
+            try:
+                await self.context.close()
+            except Exception as e:
+                logger.debug(f"关闭上下文时出错: {e}")
+            self.context = None
 
     async def _cleanup(self):
         """清理资源 - 完全关闭浏览器并重置状态"""
         logger.info("正在清理资源...")
 
-        self.session_active = False
-
         try:
-            # 关闭页面
-            if self.page:
-                try:
-                    await self.page.close()
-                except Exception as e:
-                    logger.debug(f"关闭页面时出错: {e}")
-                self.page = None
-
-            # 关闭上下文
-            if self.context:
-                try:
-                    await self.context.close()
-                except Exception as e:
-                    logger.debug(f"关闭上下文时出错: {e}")
-                self.context = None
+            await self._close_session()
 
             # 关闭浏览器
             if self.browser:
@@ -561,6 +1538,8 @@ class VideoAutomator:
 
             logger.info("✅ 浏览器已完全关闭")
 
+            await self.display.stop()
+
         except Exception as e:
             logger.error(f"清理资源时出错: {e}")
 
@@ -597,6 +1576,9 @@ class VideoAutomator:
         Returns:
             str: 识别出的验证码文本，失败返回 None
         """
+        # 只有自动登录识别验证码时才需要 requests，延迟导入以加快启动
+        import requests
+
         try:
             logger.info("正在获取验证码图片 URL...")
 
@@ -673,6 +1655,38 @@ class VideoAutomator:
             return None
 
 
+    async def _check_selector_drift(self, kind: str, keys: List[str], reload: bool = False, force: bool = False):
+        """
+        本次运行第一次到达某类页面时，在真实页面上检查该页面的选择器
+
+        页面加载慢导致检查不确定时不中止运行：按 reload 重新加载一次再查，
+        仍不确定则按正常流程继续，下次到达该页面时再检查
+
+        Args:
+            kind: 页面类型（login / play_page）
+            keys: 要检查的配置项
+            reload: 检查不确定时是否重新加载页面再查一次
+            force: 本次运行已检查过该页面时也重新检查
+
+        Raises:
+            SelectorDriftError: 选择器已失效
+        """
+        if not self.config.SELECTOR_DRIFT_CHECK or (kind in self.drift_checked and not force):
+            return
+        checked = await self.drift_checker.check_live(self.page, kind, keys)
+        if not checked and reload:
+            logger.info(f"重新加载 {kind} 页面后再检查选择器...")
+            try:
+                await self.page.reload(wait_until="domcontentloaded")
+            except Exception as e:
+                logger.warning(f"重新加载 {kind} 页面失败: {e}")
+                return
+            checked = await self.drift_checker.check_live(self.page, kind, keys)
+        if not checked:
+            return
+        self.drift_checked.add(kind)
+        logger.info(f"🔎 {kind} 页面选择器检查通过")
+
     async def _auto_login_flow(self) -> bool:
         """
         自动登录流程
@@ -687,8 +1701,7 @@ class VideoAutomator:
         # 验证配置
         if not self._validate_auto_login_config():
             logger.warning("自动登录配置不完整，降级为手动登录")
-            await self._manual_login_flow()
-            return True
+            return await self._manual_login_flow()
 
         # 导航到登录页面
         try:
@@ -699,6 +1712,14 @@ class VideoAutomator:
             logger.error(f"打开登录页面失败: {e}")
             return False
 
+        await self._check_selector_drift("login", [
+            "LOGIN_USERNAME_XPATH",
+            "LOGIN_PASSWORD_XPATH",
+            "LOGIN_CAPTCHA_INPUT_XPATH",
+            "LOGIN_CAPTCHA_IMAGE_XPATH",
+            "LOGIN_SUBMIT_BUTTON_XPATH",
+        ], reload=True)
+
         # 重试登录
         for attempt in range(1, self.config.CAPTCHA_MAX_RETRIES + 1):
             try:
@@ -707,7 +1728,16 @@ class VideoAutomator:
                 # 1. 填写用户名
                 logger.info("填写用户名...")
                 username_input = self.page.locator(f"xpath={self.config.LOGIN_USERNAME_XPATH}")
-                await username_input.wait_for(state="visible", timeout=10000)
+                try:
+                    await username_input.wait_for(state="visible", timeout=10000)
+                except PlaywrightTimeoutError:
+                    # 页面加载慢时重新加载后再试；选择器是否失效由 _check_selector_drift 对照基线判断
+                    logger.warning(
+                        f"登录页 10 秒内没有出现用户名输入框，重新加载后重试 "
+                        f"({attempt}/{self.config.CAPTCHA_MAX_RETRIES})"
+                    )
+                    await self.page.reload(wait_until="domcontentloaded")
+                    continue
                 await username_input.clear()
                 await username_input.fill(self.config.LOGIN_USERNAME)
 
@@ -0,0 +1,162 @@
+"""
+虚拟显示器模块
+在没有显示器的 Linux 服务器上为非无头模式的浏览器启动 Xvfb，
+显示号由 Xvfb 自行分配（-displayfd），只通过 DISPLAY 环境变量传给启动的浏览器
+"""
+
+import asyncio
+import logging
+import os
+import shutil
+import sys
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+# 浏览器标签栏和地址栏占用的高度，虚拟屏幕在视口之外额外留出
+WINDOW_DECORATION_HEIGHT = 160
+
+# 等待 Xvfb 报告显示号的最长时间 (秒)
+START_TIMEOUT = 10
+
+# 停止 Xvfb 时等待其退出的时间 (秒)，超时则强制结束
+STOP_TIMEOUT = 5
+
+
+def _read_display_number(fd: int) -> bytes:
+    """读取 Xvfb 通过 -displayfd 写回的显示号（以换行结尾），Xvfb 退出时返回已读到的内容"""
+    data = b""
+    while not data.endswith(b"\n"):
+        chunk = os.read(fd, 16)
+        if not chunk:
+            break
+        data += chunk
+    return data
+
+
+class VirtualDisplay:
+    """Xvfb 虚拟显示器 - 浏览器启动前按需启动，浏览器关闭后停止"""
+
+    def __init__(self, config):
+        """
+        Args:
+            config: 配置对象（VIRTUAL_DISPLAY、VIRTUAL_DISPLAY_DEPTH、HEADLESS、VIEWPORT_*）
+        """
+        self.config = config
+        self.process: Optional[asyncio.subprocess.Process] = None
+        self.display: Optional[str] = None
+
+    @property
+    def pid(self) -> Optional[int]:
+        """Xvfb 进程 pid，未运行时为 None"""
+        return self.process.pid if self.process is not None and self.process.returncode is None else None
+
+    def needed(self) -> bool:
+        """当前配置下是否需要虚拟显示器"""
+        mode = self.config.VIRTUAL_DISPLAY
+        if mode == "off" or self.config.HEADLESS or not sys.platform.startswith("linux"):
+            return False
+        if mode == "on":
+            return True
+        return not (os.environ.get("DISPLAY") or os.environ.get("WAYLAND_DISPLAY"))
+
+    def browser_env(self) -> Optional[dict]:
+        """
+        启动浏览器时使用的环境变量（只对浏览器生效，不修改本进程的环境）
+
+        Returns:
+            dict: 含 DISPLAY 的环境变量，未启动虚拟显示器时返回 None（沿用本进程环境）
+        """
+        if self.display is None:
+            return None
+        return {**os.environ, "DISPLAY": self.display}
+
+    async def start(self) -> Optional[str]:
+        """
+        按需启动 Xvfb（已在运行时直接返回）
+
+        Returns:
+            str: 显示名如 ":99"，不需要虚拟显示器时返回 None
+
+        Raises:
+            OSError: 未安装 Xvfb 或 Xvfb 启动失败
+        """
+        if self.pid is not None:
+            return self.display
+        self.display = None
+        if not self.needed():
+            return None
+
+        executable = shutil.which("Xvfb")
+        if executable is None:
+            raise OSError("没有显示器且未找到 Xvfb，请安装 xvfb 或设置 HEADLESS = True")
+
+        width = self.config.VIEWPORT_WIDTH
+        height = self.config.VIEWPORT_HEIGHT + WINDOW_DECORATION_HEIGHT
+        screen = f"{width}x{height}x{self.config.VIRTUAL_DISPLAY_DEPTH}"
+
+        read_fd, write_fd = os.pipe()
+        try:
+            self.process = await asyncio.create_subprocess_exec(
+                executable, "-displayfd", str(write_fd),
+                "-screen", "0", screen,
+                "-nolisten", "tcp",
+                "-noreset",
+                stdin=asyncio.subprocess.DEVNULL,
+                stdout=asyncio.subprocess.DEVNULL,
+                stderr=asyncio.subprocess.DEVNULL,
+                pass_fds=(write_fd,),
+                # 不随终端的 Ctrl+C 一起退出，由 stop() 负责关闭
+                start_new_session=True,
+            )
+            # 关闭本进程的写端，Xvfb 退出时读取才会结束
+            os.close(write_fd)
+            write_fd = None
+
+            loop = asyncio.get_running_loop()
+            try:
+                data = await asyncio.wait_for(
+                    loop.run_in_executor(None, _read_display_number, read_fd), timeout=START_TIMEOUT
+                )
+            except asyncio.TimeoutError:
+                data = b""
+            except asyncio.CancelledError:
+                # 退出时被取消：结束 Xvfb，使 executor 中阻塞的读取返回
+                self.terminate()
+                raise
+
+            if not data.strip().isdigit():
+                # 先结束进程，executor 中阻塞的读取随之返回，再关闭读端
+                await self.stop()
+                raise OSError(f"Xvfb 启动失败（{START_TIMEOUT} 秒内没有报告显示号）")
+        finally:
+            for fd in (read_fd, write_fd):
+                if fd is not None:
+                    os.close(fd)
+
+        self.display = f":{int(data)}"
+        logger.info(f"🖥️  虚拟显示器已启动: DISPLAY={self.display} ({screen}, pid {self.process.pid})")
+        return self.display
+
+    async def stop(self):
+        """停止 Xvfb（未运行时什么都不做）"""
+        process, self.process = self.process, None
+        self.display = None
+        if process is None or process.returncode is not None:
+            return
+
+        process.terminate()
+        try:
+            await asyncio.wait_for(process.wait(), timeout=STOP_TIMEOUT)
+        except asyncio.TimeoutError:
+            process.kill()
+            await process.wait()
+        logger.info("虚拟显示器已停止")
+
+    def terminate(self):
+        """同步通知 Xvfb 退出（用于无法等待事件循环的强制退出路径）"""
+        if self.pid is not None:
+            try:
+                self.process.terminate()
+            except ProcessLookupError:
+                pass